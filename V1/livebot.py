@@ -2,25 +2,19 @@ import time
 import datetime
 import pandas as pd
 import pyotp
-import ta
+import indicators
 import joblib
 from SmartApi import SmartConnect
 from sklearn.ensemble import RandomForestClassifier
 import pytz
 import logging 
+from log_pipeline import setup_logging
 import os
 from dotenv import load_dotenv
 
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s',
-    handlers=[
-        logging.FileHandler("live_trading_log.log"),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()  # queue-backed: file/console writes happen off the trading loop
 
 PAPER_TRADE = True
 
@@ -73,8 +67,8 @@ def fetch_latest_candle(obj):
     end_t = now.replace(minute=minutes , second=0 , microsecond = 0)
     from_time = end_t - datetime.timedelta(hours=3)
 
-    print("From:", from_time)
-    print("To  :", now)
+    logging.info(f"From: {from_time}")
+    logging.info(f"To  : {now}")
 
     params = {
         "exchange": EXCHANGE,
@@ -91,9 +85,10 @@ def fetch_latest_candle(obj):
     return df
 
 def compute_features(df):
-    df['rsi'] = ta.momentum.RSIIndicator(df['close']).rsi()
-    df['macd'] = ta.trend.MACD(df['close']).macd()
-    df['sma'] = ta.trend.SMAIndicator(df['close'], window=10).sma_indicator()
+    close = df['close'].to_numpy(dtype=float)
+    df['rsi'] = indicators.rsi(close)
+    df['macd'] = indicators.macd(close)
+    df['sma'] = indicators.sma(close, 10)
     df['returns'] = df['close'].pct_change()
     df = df.dropna(subset=['rsi', 'macd', 'sma', 'returns'])
     return df
@@ -102,7 +97,6 @@ def place_market_order(obj, transaction_type):
     if PAPER_TRADE:
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_msg = f"[PAPER TRADE] {now} | {transaction_type} | Symbol: {SYMBOL} | Qty: {QUANTITY}"
-        print(log_msg)
         logging.info(log_msg)
         return {"status": "simulated", "action": transaction_type}
     else:
@@ -117,10 +111,9 @@ def place_market_order(obj, transaction_type):
             "duration": "DAY",
             "quantity": QUANTITY
         }
-        print("Sending request with:", order_params)
+        logging.info(f"Sending request with: {order_params}")
  
         order = obj.placeOrder(order_params)
-        print(f"✅ {transaction_type} order placed | Order ID: {order}")
         logging.info(f" REAL ORDER placed: {transaction_type} | ID: {order}")
         return order
 
@@ -129,7 +122,6 @@ def place_market_order(obj, transaction_type):
 def live_trading():
     global in_position, buy_price
     obj,refresh_token = create_session()
-    print("🚀 Live Trading Started for", SYMBOL)
     logging.info(f"Live Trading Started for {SYMBOL}")
 
     try:
@@ -147,7 +139,6 @@ def live_trading():
     while True:
 
         if safety_stop_triggered():
-            print("Exitted......")
             logging.warning(" Trading stopped by user (STOP file detected).")
             break
 
@@ -155,7 +146,6 @@ def live_trading():
             df = fetch_latest_candle(obj)
 
             if df.empty:
-                print("⚠️ No candle data received!")
                 logging.warning("No candle data received!")
                 time.sleep(60)
                 continue  # Skip this loop iteration
@@ -163,19 +153,18 @@ def live_trading():
             df = compute_features(df)
 
             if df.empty:
-                print("⚠️ Not enough data after feature engineering!")
                 logging.warning("Not enough data after feature engineering!")
                 time.sleep(60)
                 continue
             latest = df.iloc[-1]
 
             if df.empty:
-                print("No data received. Retrying...")
+                logging.warning("No data received. Retrying...")
                 time.sleep(1)
                 continue
 
             if len(df) < 6:
-                print("⏳ Waiting for more data...")
+                logging.info("⏳ Waiting for more data...")
                 time.sleep(60)
                 continue
 
@@ -183,10 +172,9 @@ def live_trading():
             X = latest[['rsi', 'macd', 'sma', 'returns']].values.reshape(1, -1)
             prediction = model.predict(X)[0]
             current_price = latest['close']
-            print(f"\n🕒 {latest.name} | Price: ₹{current_price:.2f} | Signal: {prediction}")
+            logging.info(f"🕒 {latest.name} | Price: ₹{current_price:.2f} | Signal: {prediction}")
 
             if not in_position and prediction == 1:
-                print("📈 BUY Signal Detected")
                 logging.info(" BUY Signal Detected")
                 place_market_order(obj, "BUY")
                 buy_price = current_price
@@ -195,18 +183,15 @@ def live_trading():
             elif in_position:
                 change = (current_price - buy_price) / buy_price
                 if change >= TARGET_PCT:
-                    print("🎯 Target hit, SELLING...")
                     logging.info(" Target hit, SELLING...")
                     place_market_order(obj, "SELL")
                     in_position = False
                 elif change <= -STOPLOSS_PCT or prediction == -1:
-                    print("🛑 Stop-loss hit or SELL signal, SELLING...")
                     logging.warning("Stop loss hit !")
                     place_market_order(obj, "SELL")
                     in_position = False
 
         except Exception as e:
-            print("❌ Error:", e)
             logging.error(e)
 
         # Wait 5 minutes before next candle
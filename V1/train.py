@@ -2,7 +2,7 @@ import datetime
 import time
 import pandas as pd
 import pyotp
-import ta
+import indicators
 import joblib
 from tqdm import tqdm
 from SmartApi import SmartConnect
@@ -67,9 +67,10 @@ def get_past_trading_days(n):
 
 # ----- Feature Engineering -----
 def add_features(df):
-    df['rsi'] = ta.momentum.RSIIndicator(df['close']).rsi()
-    df['macd'] = ta.trend.MACD(df['close']).macd()
-    df['sma'] = ta.trend.SMAIndicator(df['close'], window=10).sma_indicator()
+    close = df['close'].to_numpy(dtype=float)
+    df['rsi'] = indicators.rsi(close)
+    df['macd'] = indicators.macd(close)
+    df['sma'] = indicators.sma(close, 10)
     df['returns'] = df['close'].pct_change()
     df.dropna(inplace=True)
     return df
@@ -0,0 +1,174 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+import threading
+from collections import deque
+
+# ---- PRIORITIES ----
+ORDER = 0      # placing / modifying / cancelling orders
+SESSION = 1    # login, token renewal, profile and RMS checks, open-position quotes
+DATA = 2       # historical candles and quotes
+PRIORITY_NAMES = {ORDER: "order", SESSION: "session", DATA: "data"}
+
+# ---- QUOTAS ----
+# SmartAPI limits per endpoint as (calls, seconds) windows; every window must have room
+ENDPOINT_QUOTAS = {
+    "placeOrder":       [(20, 1), (500, 60), (1000, 3600)],
+    "modifyOrder":      [(20, 1), (500, 60), (1000, 3600)],
+    "cancelOrder":      [(20, 1), (500, 60), (1000, 3600)],
+    "generateSession":  [(1, 1)],
+    "renewAccessToken": [(1, 1)],
+    "getProfile":       [(3, 1), (1000, 3600)],
+    "getRMS":           [(2, 1)],
+    "orderBook":        [(1, 1)],
+    "getCandleData":    [(int(os.getenv("API_CALLS_PER_SEC", "3")), 1), (180, 60), (5000, 3600)],
+    "ltpData":          [(10, 1), (500, 60), (5000, 3600)],
+    "getMarketData":    [(10, 1), (500, 60), (5000, 3600)],
+}
+ENDPOINT_PRIORITY = {
+    "placeOrder": ORDER, "modifyOrder": ORDER, "cancelOrder": ORDER,
+    "generateSession": SESSION, "renewAccessToken": SESSION, "getProfile": SESSION, "getRMS": SESSION,
+    "orderBook": SESSION,
+    "getCandleData": DATA, "ltpData": DATA, "getMarketData": DATA,
+}
+API_MAX_IN_FLIGHT = int(os.getenv("API_MAX_IN_FLIGHT", "4"))   # one slot is always held back for orders
+
+
+class ApiScheduler:
+    """Single gate for every broker call in the process.
+
+    A call waits until its endpoint has room in all of its quota windows and an
+    in-flight slot is free. Waiting calls are served strictly by priority (orders,
+    then session checks, then data) and the last in-flight slot is reserved for
+    orders, so a burst of candle fetches can never hold up an exit.
+    """
+
+    def __init__(self, quotas=ENDPOINT_QUOTAS, max_in_flight=API_MAX_IN_FLIGHT):
+        self.quotas = quotas
+        self.max_in_flight = max(2, max_in_flight)
+        self.cond = threading.Condition()
+        self.history = {endpoint: deque() for endpoint in quotas}   # start times of recent calls
+        self.waiting = []          # heap of (priority, seq, endpoint)
+        self.seq = itertools.count()
+        self.in_flight = 0
+        self.stats = {p: {"calls": 0, "wait": 0.0, "max_wait": 0.0, "peak_depth": 0} for p in PRIORITY_NAMES}
+
+    # ---- QUOTA BOOKKEEPING ----
+    def set_quotas(self, quotas):
+        """Swap the quota table, e.g. {} to measure throughput without broker limits"""
+        with self.cond:
+            self.quotas = quotas
+            self.history = {endpoint: deque() for endpoint in quotas}
+            self.cond.notify_all()
+
+    def _quota_wait(self, endpoint, now):
+        """Seconds until endpoint has room in every window (0 when it can go now)"""
+        calls = self.history.get(endpoint)
+        if calls is None:
+            return 0.0
+        longest = max(seconds for _, seconds in self.quotas[endpoint])
+        while calls and now - calls[0] >= longest:
+            calls.popleft()
+        wait = 0.0
+        for limit, seconds in self.quotas[endpoint]:
+            recent = sum(1 for t in calls if now - t < seconds)
+            if recent >= limit:
+                # The oldest call inside this window has to age out first
+                wait = max(wait, calls[len(calls) - recent] + seconds - now)
+        return wait
+
+    def _slot_free(self, priority):
+        limit = self.max_in_flight if priority == ORDER else self.max_in_flight - 1
+        return self.in_flight < limit
+
+    def _wait_time(self, entry, now):
+        """0 = go now, None = wait for a notify, otherwise seconds to sleep"""
+        for ahead in sorted(self.waiting):
+            quota_wait = self._quota_wait(ahead[2], now)
+            if ahead is entry:
+                if not self._slot_free(entry[0]):
+                    return None
+                return quota_wait
+            if quota_wait == 0 and self._slot_free(ahead[0]):
+                return None   # a more urgent call can go first
+        return None
+
+    # ---- CALLS ----
+    def _acquire(self, endpoint, priority):
+        entry = (priority, next(self.seq), endpoint)
+        queued_at = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiting, entry)
+            depth = sum(1 for w in self.waiting if w[0] == priority)
+            stats = self.stats[priority]
+            stats["peak_depth"] = max(stats["peak_depth"], depth)
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(entry, now)
+                if wait == 0:
+                    break
+                self.cond.wait(wait)
+            self.waiting.remove(entry)
+            heapq.heapify(self.waiting)
+            if endpoint in self.history:
+                self.history[endpoint].append(now)
+            self.in_flight += 1
+            waited = now - queued_at
+            stats["calls"] += 1
+            stats["wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+            self.cond.notify_all()
+        return waited
+
+    def _release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def call(self, endpoint, fn, *args, priority=None, **kwargs):
+        """Run fn(*args, **kwargs) once endpoint's quota and priority allow it"""
+        if priority is None:
+            priority = ENDPOINT_PRIORITY.get(endpoint, DATA)
+        waited = self._acquire(endpoint, priority)
+        if waited > 1.0:
+            logging.info(f"API scheduler: {endpoint} waited {waited:.2f}s")
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._release()
+
+    async def call_async(self, endpoint, fn, *args, priority=None, **kwargs):
+        """call() from the event loop; the wait and the request both run in a worker thread"""
+        return await asyncio.to_thread(self.call, endpoint, fn, *args, priority=priority, **kwargs)
+
+    # ---- METRICS ----
+    def metrics(self):
+        """Queue depth and wait times per priority class"""
+        with self.cond:
+            depth = {p: sum(1 for w in self.waiting if w[0] == p) for p in PRIORITY_NAMES}
+            return {
+                PRIORITY_NAMES[p]: {
+                    "queued": depth[p],
+                    "peak_depth": s["peak_depth"],
+                    "calls": s["calls"],
+                    "avg_wait_s": s["wait"] / s["calls"] if s["calls"] else 0.0,
+                    "max_wait_s": s["max_wait"],
+                }
+                for p, s in self.stats.items()
+            } | {"in_flight": self.in_flight}
+
+    def log_metrics(self):
+        m = self.metrics()
+        parts = [
+            f"{name} {m[name]['calls']} calls, queued {m[name]['queued']} (peak {m[name]['peak_depth']}), "
+            f"wait avg {m[name]['avg_wait_s']:.2f}s max {m[name]['max_wait_s']:.2f}s"
+            for name in PRIORITY_NAMES.values()
+        ]
+        logging.info("API scheduler | " + " | ".join(parts))
+
+
+# One scheduler per process: every module that talks to the broker imports this
+scheduler = ApiScheduler()
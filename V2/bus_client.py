@@ -0,0 +1,87 @@
+import os
+import time
+import logging
+from multiprocessing.connection import Client
+import pandas as pd
+
+MARKET_DATA_BUS = os.getenv("MARKET_DATA_BUS")              # host:port of market_data_bus.py, unset = fetch directly
+MDB_AUTHKEY = os.getenv("MDB_AUTHKEY")                       # shared secret of the bus and its clients, required
+BUS_WAIT_SECS = 30           # how long a strategy waits for the bus to publish a cycle
+BUS_BUFFER_BARS = 3000       # ~40 sessions of 5-minute bars kept per symbol
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def require_authkey(authkey=MDB_AUTHKEY):
+    """The bus secret as bytes; there is no default because bus messages are unpickled"""
+    if not authkey:
+        raise RuntimeError("MDB_AUTHKEY is not set: the market-data bus and its clients need the same "
+                           "private random key (anyone holding it can run code in every bot)")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+class BusClient:
+    """Strategy-side end of the market-data bus: subscribe once, then read bars the bus fetched.
+
+    Messages are ('history', symbol, frame) once per subscription and ('bars', symbol, frame)
+    every cycle. Each frame carries OHLCV, a 'closed' flag and the shared indicator columns.
+    """
+
+    def __init__(self, address=MARKET_DATA_BUS, authkey=MDB_AUTHKEY):
+        self.address = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self.conn = Client(self.address, authkey=self.authkey)
+        self.subscriptions = {}
+        self.frames = {}
+        self.updated_at = {}
+
+    def subscribe(self, symbol, token):
+        self.subscriptions[symbol] = str(token)
+        self.conn.send(('subscribe', symbol, str(token)))
+        logging.info(f"Subscribed to {symbol} on market-data bus")
+
+    def _reconnect(self):
+        """The bus restarted: connect again and resubscribe (raises if it is still down)"""
+        logging.warning("Market-data bus connection lost, reconnecting...")
+        self.conn.close()
+        self.conn = Client(self.address, authkey=self.authkey)
+        for symbol, token in self.subscriptions.items():
+            self.conn.send(('subscribe', symbol, token))
+
+    def _merge(self, symbol, df):
+        old = self.frames.get(symbol)
+        combined = pd.concat([old, df]) if old is not None and not old.empty else df
+        combined = combined[~combined.index.duplicated(keep='last')].sort_index()
+        self.frames[symbol] = combined.iloc[-BUS_BUFFER_BARS:]
+        self.updated_at[symbol] = time.monotonic()
+
+    def poll(self, timeout=0.0):
+        """Apply every message already received (waiting up to timeout for the first one)"""
+        received = 0
+        while self.conn.poll(timeout if received == 0 else 0):
+            try:
+                kind, symbol, df = self.conn.recv()
+            except (EOFError, OSError):
+                self._reconnect()
+                continue
+            if kind in ('history', 'bars'):
+                self._merge(symbol, df)
+            received += 1
+        return received
+
+    def latest(self, symbol, timeout=BUS_WAIT_SECS):
+        """Frame for symbol after waiting (up to timeout) for the bus to publish a newer cycle"""
+        since = self.updated_at.get(symbol, 0.0)
+        deadline = time.monotonic() + timeout
+        while self.updated_at.get(symbol, 0.0) <= since and time.monotonic() < deadline:
+            self.poll(max(0.0, deadline - time.monotonic()))
+        if self.updated_at.get(symbol, 0.0) <= since:
+            logging.warning(f"Market-data bus published nothing new for {symbol} in {timeout}s")
+        frame = self.frames.get(symbol)
+        return frame.copy() if frame is not None else pd.DataFrame()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,158 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import xgboost as xgb
+from feature_store import load_arrays
+from labeling import NO_LABEL
+
+# ----- CV CONFIG -----
+N_SPLITS = 5
+EMBARGO_BARS = 12          # extra gap after the purge, ~1 hour of 5-min bars
+VALID_FRAC = 0.15          # tail of each training window used for early stopping
+MAX_BIN = 256
+MAX_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 30
+N_CANDIDATES = 24
+
+SEARCH_SPACE = {
+    'max_depth': [3, 4, 5, 6],
+    'learning_rate': [0.03, 0.05, 0.1],
+    'subsample': [0.6, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'min_child_weight': [1, 5, 10],
+    'reg_lambda': [1.0, 5.0],
+}
+
+
+def purged_walk_forward_splits(n, n_splits, horizon, embargo, valid_frac=VALID_FRAC):
+    """Expanding-window folds as (fit, valid, test) index ranges.
+
+    A label at bar i looks horizon bars ahead, so training rows within horizon + embargo
+    bars of the next block are purged. The same gap separates fit from valid.
+    """
+    gap = horizon + embargo
+    fold_size = n // (n_splits + 1)
+    folds = []
+    for k in range(1, n_splits + 1):
+        test_start = k * fold_size
+        test_end = n if k == n_splits else test_start + fold_size
+        train_end = test_start - gap
+        valid_start = int(train_end * (1 - valid_frac))
+        fit_end = valid_start - gap
+        if fit_end <= 0:
+            continue
+        folds.append(((0, fit_end), (valid_start, train_end), (test_start, test_end)))
+    return folds
+
+
+def min_rows_for_folds(n_splits, horizon, embargo, valid_frac=VALID_FRAC):
+    """Smallest series length for which purged_walk_forward_splits yields any fold."""
+    n = n_splits + 1
+    while not purged_walk_forward_splits(n, n_splits, horizon, embargo, valid_frac):
+        n += 1
+    return n
+
+
+def sample_candidates(n_candidates=N_CANDIDATES, seed=42):
+    rng = np.random.default_rng(seed)
+    return [{key: values[rng.integers(len(values))] for key, values in SEARCH_SPACE.items()}
+            for _ in range(n_candidates)]
+
+
+# ---- WORKER SIDE ----
+_worker = {}
+
+
+def _init_worker(store_name, horizon_idx, threshold_idx, nthread):
+    arrays, _ = load_arrays(store_name, keys=['features', 'label_grid'])
+    # Memory-mapped: every worker shares the same pages
+    _worker['X'] = arrays['features']
+    _worker['y'] = arrays['label_grid'][:, horizon_idx, threshold_idx]
+    _worker['nthread'] = nthread
+    _worker['dmatrix'] = {}
+
+
+def _fold_dmatrices(fold):
+    """Quantized DMatrices for one fold, built once per worker and reused by every candidate"""
+    if fold not in _worker['dmatrix']:
+        (fs, fe), (vs, ve), (ts, te) = fold
+        X, y = _worker['X'], _worker['y']
+        dfit = xgb.QuantileDMatrix(X[fs:fe], y[fs:fe], max_bin=MAX_BIN, nthread=_worker['nthread'])
+        dvalid = xgb.QuantileDMatrix(X[vs:ve], y[vs:ve], ref=dfit, nthread=_worker['nthread'])
+        dtest = xgb.QuantileDMatrix(X[ts:te], y[ts:te], ref=dfit, nthread=_worker['nthread'])
+        _worker['dmatrix'][fold] = (dfit, dvalid, dtest, np.asarray(y[ts:te]))
+    return _worker['dmatrix'][fold]
+
+
+def _evaluate(fold, candidate_ids, candidates):
+    dfit, dvalid, dtest, y_test = _fold_dmatrices(fold)
+    results = []
+    for cid in candidate_ids:
+        params = {
+            **candidates[cid],
+            'objective': 'multi:softprob',
+            'num_class': 3,
+            'eval_metric': 'mlogloss',
+            'tree_method': 'hist',
+            'max_bin': MAX_BIN,
+            'nthread': _worker['nthread'],
+        }
+        booster = xgb.train(params, dfit, num_boost_round=MAX_ROUNDS, evals=[(dvalid, 'valid')],
+                            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        proba = booster.predict(dtest, iteration_range=(0, booster.best_iteration + 1))
+        logloss = -np.mean(np.log(np.clip(proba[np.arange(len(y_test)), y_test], 1e-15, 1.0)))
+        accuracy = float((proba.argmax(axis=1) == y_test).mean())
+        results.append((cid, fold, float(logloss), accuracy, booster.best_iteration + 1))
+    return results
+
+
+# ---- DRIVER ----
+def run_search(store_name, horizon, horizon_idx, threshold_idx, n_splits=N_SPLITS,
+               n_candidates=N_CANDIDATES, workers=None):
+    """Evaluate sampled candidates on purged walk-forward folds across a process pool.
+
+    Returns (best_params, best_rounds, results) where results rows are
+    (candidate_id, fold, test_logloss, test_accuracy, best_rounds).
+    """
+    arrays, _ = load_arrays(store_name, keys=['label_grid'])
+    y = arrays['label_grid'][:, horizon_idx, threshold_idx]
+    if (y == NO_LABEL).any():
+        # Unlabelled rows are only the trailing look-ahead bars; cut them off
+        n = int(np.argmax(y == NO_LABEL))
+    else:
+        n = len(y)
+
+    folds = purged_walk_forward_splits(n, n_splits, horizon, EMBARGO_BARS)
+    if not folds:
+        need = min_rows_for_folds(n_splits, horizon, EMBARGO_BARS)
+        raise ValueError(f"{n} labelled rows is too short for purged CV with n_splits={n_splits}, "
+                         f"horizon={horizon}, embargo={EMBARGO_BARS}; need at least {need}")
+    candidates = sample_candidates(n_candidates)
+    workers = workers or os.cpu_count() or 1
+    nthread = max(1, (os.cpu_count() or 1) // workers)
+
+    # One task per (fold, slice of candidates): a worker keeps the fold's DMatrices warm
+    chunks = np.array_split(np.arange(len(candidates)), max(1, workers // len(folds)))
+    tasks = [(fold, chunk.tolist()) for fold in folds for chunk in chunks if len(chunk)]
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(store_name, horizon_idx, threshold_idx, nthread)) as pool:
+        futures = [pool.submit(_evaluate, fold, ids, candidates) for fold, ids in tasks]
+        for future in futures:
+            results.extend(future.result())
+    print(f"🔍 {len(candidates)} candidates x {len(folds)} folds in {time.perf_counter() - start:.1f}s")
+
+    scores = np.full((len(candidates), len(folds)), np.nan)
+    rounds = np.zeros((len(candidates), len(folds)))
+    fold_index = {fold: i for i, fold in enumerate(folds)}
+    for cid, fold, logloss, _, n_rounds in results:
+        scores[cid, fold_index[fold]] = logloss
+        rounds[cid, fold_index[fold]] = n_rounds
+
+    best = int(np.nanargmin(scores.mean(axis=1)))
+    best_rounds = int(np.median(rounds[best]))
+    print(f"🏆 Best CV logloss {scores[best].mean():.4f} with {candidates[best]} ({best_rounds} rounds)")
+    return candidates[best], best_rounds, results
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import glob
+import shutil
+import hashlib
+import inspect
+import datetime
+import numpy as np
+
+FEATURE_STORE_DIR = "feature_store"
+MANIFEST_FILE = "manifest.json"
+KEEP_VERSIONS = int(os.getenv("FEATURE_STORE_KEEP_VERSIONS", "5"))   # older versions of a dataset are pruned
+
+# A dataset is saved once per version as <name>@<version>/ (.npy files + manifest).
+# <name> itself is a one-line pointer file naming the current version, so readers that
+# open <name> always get the latest build and every process maps the same pages.
+
+
+def entry_path(name, root=FEATURE_STORE_DIR):
+    return os.path.join(root, name)
+
+
+def resolve(name, root=FEATURE_STORE_DIR):
+    """Follow a dataset pointer to its current versioned entry; plain entries resolve to themselves"""
+    path = entry_path(name, root)
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            return f.read().strip()
+    return name
+
+
+def entry_exists(name, root=FEATURE_STORE_DIR):
+    return os.path.isfile(os.path.join(entry_path(resolve(name, root), root), MANIFEST_FILE))
+
+
+def save_arrays(name, arrays, meta=None, root=FEATURE_STORE_DIR):
+    """Write a named set of arrays as .npy files plus a JSON manifest, replacing any previous entry"""
+    os.makedirs(root, exist_ok=True)
+    final_dir = entry_path(name, root)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        'name': name,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'meta': meta or {},
+        'arrays': {},
+    }
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(tmp_dir, f"{key}.npy"), array, allow_pickle=False)
+        manifest['arrays'][key] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    # Swap the finished directory in so readers never see a half-written entry
+    old_dir = f"{final_dir}.old-{os.getpid()}"
+    if os.path.isfile(final_dir):
+        os.remove(final_dir)      # a version pointer is superseded by a plain entry
+    elif os.path.exists(final_dir):
+        os.replace(final_dir, old_dir)
+    os.replace(tmp_dir, final_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return final_dir
+
+
+def load_manifest(name, root=FEATURE_STORE_DIR):
+    with open(os.path.join(entry_path(resolve(name, root), root), MANIFEST_FILE), "r") as f:
+        return json.load(f)
+
+
+def load_arrays(name, keys=None, root=FEATURE_STORE_DIR, mmap=True):
+    """Open stored arrays (memory-mapped by default) and return (arrays, meta)"""
+    name = resolve(name, root)
+    manifest = load_manifest(name, root)
+    keys = keys or list(manifest['arrays'])
+    mode = 'r' if mmap else None
+    arrays = {
+        key: np.load(os.path.join(entry_path(name, root), f"{key}.npy"), mmap_mode=mode, allow_pickle=False)
+        for key in keys
+    }
+    return arrays, manifest['meta']
+
+
+# ---- VERSIONED DATASETS ----
+def source_digest(*objects):
+    """Hash of the source of functions/modules that shape a dataset, so code changes mean a new version"""
+    h = hashlib.sha1()
+    for obj in objects:
+        h.update(inspect.getsource(obj).encode())
+    return h.hexdigest()[:12]
+
+
+def dataset_version(spec):
+    """Short content hash of everything a dataset is built from (symbol, range, params, code digest)"""
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def versioned_name(name, version):
+    return f"{name}@{version}"
+
+
+def set_current(name, entry, root=FEATURE_STORE_DIR):
+    """Point name at a versioned entry (atomic, so readers see the old or the new version)"""
+    path = entry_path(name, root)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(entry)
+    if os.path.isdir(path):
+        shutil.rmtree(path)       # pre-versioning entry under the bare name
+    os.replace(tmp_path, path)
+
+
+def list_versions(name, root=FEATURE_STORE_DIR):
+    """Versioned entries of name, oldest first"""
+    entries = [os.path.basename(d) for d in glob.glob(os.path.join(glob.escape(root), f"{glob.escape(name)}@*"))
+               if os.path.isfile(os.path.join(d, MANIFEST_FILE))]
+    return sorted(entries, key=lambda e: load_manifest(e, root)['created_at'])
+
+
+def prune_versions(name, keep=KEEP_VERSIONS, root=FEATURE_STORE_DIR):
+    current = resolve(name, root)
+    stale = [e for e in list_versions(name, root) if e != current]
+    for entry in stale[:max(0, len(stale) - (keep - 1))]:
+        shutil.rmtree(entry_path(entry, root), ignore_errors=True)
+
+
+def save_version(name, spec, arrays, meta=None, root=FEATURE_STORE_DIR, keep=KEEP_VERSIONS):
+    """Materialize arrays as the version of name that spec describes and make it current"""
+    version = dataset_version(spec)
+    entry = versioned_name(name, version)
+    save_arrays(entry, arrays, {**(meta or {}), 'version': version, 'spec': spec}, root)
+    set_current(name, entry, root)
+    prune_versions(name, keep, root)
+    return entry
+
+
+def open_version(name, spec, keys=None, root=FEATURE_STORE_DIR):
+    """(arrays, meta) of the version spec describes, memory-mapped; None if it was never built"""
+    entry = versioned_name(name, dataset_version(spec))
+    if not entry_exists(entry, root):
+        return None
+    if resolve(name, root) != entry:
+        set_current(name, entry, root)
+    return load_arrays(entry, keys, root)
+
+
+def list_entries(root=FEATURE_STORE_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if os.path.isfile(os.path.join(root, d, MANIFEST_FILE)))
+
+
+if __name__ == "__main__":
+    # python feature_store.py [root]  - list entries with their version, size and array shapes
+    root = sys.argv[1] if len(sys.argv) > 1 else FEATURE_STORE_DIR
+    pointers = {resolve(d, root): d for d in (os.listdir(root) if os.path.isdir(root) else [])
+                if os.path.isfile(entry_path(d, root)) and ".tmp-" not in d}
+    for entry in list_entries(root):
+        manifest = load_manifest(entry, root)
+        size = sum(os.path.getsize(f) for f in glob.glob(os.path.join(entry_path(entry, root), "*.npy")))
+        shapes = ", ".join(f"{k}{tuple(v['shape'])}" for k, v in manifest['arrays'].items())
+        current = f"  <- {pointers[entry]}" if entry in pointers else ""
+        print(f"{entry} | {manifest['created_at']} | {size / 2 ** 20:.1f}MB | {shapes}{current}")
@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import datetime
+import fcntl
+import logging
+import joblib
+import numpy as np
+import pandas as pd
+import pytz
+import xgboost as xgb
+from feature_store import load_arrays, resolve
+from model_registry import register_model
+from labeling import NO_LABEL
+from trading_calendar import is_trading_day
+from train import (
+    SYMBOL, MODEL_FILENAME, MODEL_NAME, LABEL_NAMES, FEATURE_COLUMNS, FUTURE_WINDOW, THRESHOLD,
+    LABEL_HORIZONS, LABEL_THRESHOLDS,
+    create_session, fetch_day_candles, get_trading_days, add_features, build_label_store, dataset_spec,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+
+# ----- INCREMENTAL CONFIG -----
+# "boost" = add trees for the new bars on top of the current model, "window" = refit on the sliding window
+UPDATE_MODE = os.getenv("UPDATE_MODE", "boost").lower()
+WINDOW_DAYS = int(os.getenv("WINDOW_DAYS", "30"))       # sessions kept in the store / used by "window"
+BOOST_ROUNDS_PER_UPDATE = 20
+UPDATE_TIME = datetime.time(15, 45)                   # IST, after the close and before the next 9:15
+IST = pytz.timezone("Asia/Kolkata")
+
+STORE_NAME = f"{SYMBOL}_labels"
+SCHEDULER_LOCK = "incremental_train.lock"             # held by the running scheduler, see main.py
+
+
+def load_store_frame():
+    """Stored features + closes as a frame indexed by IST timestamp, plus the training label slice"""
+    arrays, _ = load_arrays(STORE_NAME, keys=['timestamp', 'features', 'close', 'label_grid'], mmap=False)
+    index = pd.DatetimeIndex(arrays['timestamp'].view('datetime64[ns]'), tz='UTC').tz_convert(IST)
+    df = pd.DataFrame(arrays['features'], index=index, columns=FEATURE_COLUMNS)
+    df.insert(0, 'close', arrays['close'])
+    labels = arrays['label_grid'][:, LABEL_HORIZONS.index(FUTURE_WINDOW), LABEL_THRESHOLDS.index(THRESHOLD)]
+    return df, labels
+
+
+def append_new_sessions(obj, stored):
+    """Fetch only the sessions after the last stored bar and compute their features"""
+    last_date = stored.index[-1].date()
+    today = datetime.datetime.now(IST).date()
+    new_days = get_trading_days(last_date + datetime.timedelta(days=1), today)
+    frames = []
+    for date in new_days:
+        df = fetch_day_candles(obj, date)
+        if not df.empty:
+            frames.append(df[['close']])
+    if not frames:
+        return stored
+
+    new_close = pd.concat(frames)
+    new_close.index = new_close.index.tz_convert(IST) if new_close.index.tz is not None else new_close.index.tz_localize(IST)
+    # RSI and MACD are recursive (EWM), so a short tail would leave the new bars' values off from a
+    # full build. Recompute over every stored close instead: the whole window is the same history a
+    # rebuild of it sees, and the seed's weight has decayed to float noise long before the new bars.
+    combined = pd.concat([stored[['close']], new_close])
+    combined = add_features(combined)
+    new_rows = combined[combined.index > stored.index[-1]]
+    logging.info(f"Appended {len(new_rows)} bars from {len(frames)} new session(s)")
+    return pd.concat([stored, new_rows[['close'] + FEATURE_COLUMNS]])
+
+
+def trim_to_window(df):
+    sessions = df.index.normalize().unique()
+    if len(sessions) <= WINDOW_DAYS:
+        return df
+    return df[df.index >= sessions[-WINDOW_DAYS]]
+
+
+def save_model(model):
+    # Write then rename so a bot loading the model never sees a partial pickle
+    tmp_path = f"{MODEL_FILENAME}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, MODEL_FILENAME)
+
+
+def new_xgb_model(n_estimators=100):
+    return xgb.XGBClassifier(
+        n_estimators=n_estimators,
+        max_depth=4,
+        learning_rate=0.1,
+        objective='multi:softmax',
+        num_class=3,
+        eval_metric='mlogloss',
+        tree_method='hist',
+    )
+
+
+def update_model():
+    """Append the newest session(s) to the store and update the model from it"""
+    stored, old_labels = load_store_frame()
+    labeled_until = stored.index[old_labels != NO_LABEL][-1] if (old_labels != NO_LABEL).any() else None
+
+    obj = create_session()
+    df = trim_to_window(append_new_sessions(obj, stored))
+    if df.index[-1] == stored.index[-1]:
+        logging.info("No new sessions since the last update")
+        return False
+
+    grid = build_label_store(df, dataset_spec(df.index[0].date(), df.index[-1].date()))
+    labels = grid[:, LABEL_HORIZONS.index(FUTURE_WINDOW), LABEL_THRESHOLDS.index(THRESHOLD)]
+    usable = labels != NO_LABEL
+
+    model = joblib.load(MODEL_FILENAME) if os.path.exists(MODEL_FILENAME) else None
+    fresh = usable & ((df.index > labeled_until) if labeled_until is not None else True)
+    y_fresh = labels[fresh]
+
+    if UPDATE_MODE == "boost" and model is not None and set(np.unique(y_fresh)) == {0, 1, 2}:
+        # Continue boosting: only the newly labelled bars are seen, the old trees are kept
+        n_trees = model.get_booster().num_boosted_rounds()
+        model.set_params(n_estimators=BOOST_ROUNDS_PER_UPDATE)
+        model.fit(df.loc[fresh, FEATURE_COLUMNS], y_fresh, xgb_model=model.get_booster())
+        logging.info(f"Boosted {n_trees} -> {model.get_booster().num_boosted_rounds()} trees on {fresh.sum()} new bars")
+    else:
+        if UPDATE_MODE == "boost":
+            logging.info("Not all classes present in the new bars (or no model yet) - refitting on the window")
+        model = new_xgb_model()
+        model.fit(df.loc[usable, FEATURE_COLUMNS], labels[usable])
+        logging.info(f"Refit on sliding window of {usable.sum()} bars")
+
+    save_model(model)
+    version = register_model(model, MODEL_NAME, FEATURE_COLUMNS, LABEL_NAMES, feature_set=resolve(STORE_NAME),
+                             params={'update_mode': UPDATE_MODE, 'fresh_bars': int(fresh.sum()), 'window_bars': int(usable.sum())})
+    logging.info(f"Model saved as {MODEL_FILENAME} and registered as {MODEL_NAME} {version}")
+    return True
+
+
+def seconds_until_next_update(now):
+    target = now.replace(hour=UPDATE_TIME.hour, minute=UPDATE_TIME.minute, second=0, microsecond=0)
+    if now >= target:
+        target += datetime.timedelta(days=1)
+    while not is_trading_day(target.date()):
+        target += datetime.timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def run_scheduler():
+    """Run update_model every trading day after market close"""
+    # The lock is released by the OS when this process exits, so a crash never leaves it stale
+    lock = open(SCHEDULER_LOCK, "a+")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logging.error("Another incremental update scheduler is already running, exiting")
+        sys.exit(1)
+    lock.seek(0)
+    lock.truncate()
+    lock.write(str(os.getpid()))
+    lock.flush()
+    while True:
+        wait = seconds_until_next_update(datetime.datetime.now(IST))
+        logging.info(f"Next incremental update in {wait / 3600:.1f}h")
+        time.sleep(wait)
+        try:
+            update_model()
+        except Exception as e:
+            logging.error(f"Incremental update failed: {e}")
+
+
+if __name__ == "__main__":
+    if "--once" in sys.argv:
+        update_model()
+    else:
+        run_scheduler()
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:  # optional: the recursive smoothing falls back to pandas' C ewm
+    numba = None
+
+# Drop-in numpy replacements for the ta indicators used by the bots. Every function
+# takes a 1-D array (one symbol) or a 2-D symbols x time matrix and returns the same
+# shape, matching ta's output (including its warm-up NaNs/zeros) within float tolerance.
+
+
+def _as_2d(x):
+    x = np.asarray(x, dtype=np.float64)
+    return (x[None, :], True) if x.ndim == 1 else (x, False)
+
+
+def _smooth_loop(x, alpha, out):
+    """y[t] = (1 - alpha) * y[t-1] + alpha * x[t] per row, pandas ewm(adjust=False) semantics"""
+    decay = 1.0 - alpha
+    for s in range(x.shape[0]):
+        y = np.nan
+        old_weight = 1.0
+        for t in range(x.shape[1]):
+            v = x[s, t]
+            if np.isnan(v):
+                if not np.isnan(y):
+                    old_weight *= decay
+                out[s, t] = y
+                continue
+            if np.isnan(y):
+                y = v
+            else:
+                old_weight *= decay
+                y = (old_weight * y + alpha * v) / (old_weight + alpha)
+            old_weight = 1.0
+            out[s, t] = y
+    return out
+
+
+_smooth_jit = numba.njit(cache=True)(_smooth_loop) if numba is not None else None
+
+
+def _smooth(x, alpha):
+    """Exponential smoothing along the time axis of a 2-D matrix"""
+    if _smooth_jit is not None:
+        return _smooth_jit(x, alpha, np.empty_like(x))
+    # One C-level pass over every symbol at once
+    return pd.DataFrame(x.T).ewm(alpha=alpha, adjust=False).mean().to_numpy().T
+
+
+def _warmup_mask(x, window):
+    """True where fewer than window valid observations have been seen (pandas min_periods)"""
+    return np.cumsum(~np.isnan(x), axis=1) < window
+
+
+def _shift(x, n=1):
+    out = np.full_like(x, np.nan)
+    out[:, n:] = x[:, :-n]
+    return out
+
+
+def ema(close, window):
+    """ta.trend.EMAIndicator(close, window).ema_indicator()"""
+    x, flat = _as_2d(close)
+    out = _smooth(x, 2.0 / (window + 1))
+    out[_warmup_mask(x, window)] = np.nan
+    return out[0] if flat else out
+
+
+def sma(close, window):
+    """ta.trend.SMAIndicator(close, window).sma_indicator()"""
+    x, flat = _as_2d(close)
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    count = np.cumsum(valid, axis=1)
+    total = csum.copy()
+    total[:, window:] -= csum[:, :-window]
+    n = count.copy()
+    n[:, window:] -= count[:, :-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = total / n
+    out[n < window] = np.nan
+    return out[0] if flat else out
+
+
+def rsi(close, window=14):
+    """ta.momentum.RSIIndicator(close, window).rsi()"""
+    x, flat = _as_2d(close)
+    diff = x - _shift(x)
+    # ta turns the first (undefined) difference into 0 rather than NaN
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+    up[np.isnan(x)] = np.nan
+    down[np.isnan(x)] = np.nan
+    ema_up = _smooth(up, 1.0 / window)
+    ema_down = _smooth(down, 1.0 / window)
+    warm = _warmup_mask(up, window)
+    ema_up[warm] = np.nan
+    ema_down[warm] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = np.where(ema_down == 0, 100.0, 100 - 100 / (1 + ema_up / ema_down))
+    return out[0] if flat else out
+
+
+def macd(close, window_fast=12, window_slow=26):
+    """ta.trend.MACD(close).macd()"""
+    return ema(close, window_fast) - ema(close, window_slow)
+
+
+def _wilder_sum(first, rest, window):
+    """s[0] = first, s[i] = s[i-1] * (1 - 1/window) + rest[i-1]"""
+    z = np.concatenate([first[:, None] / window, rest], axis=1)
+    return _smooth(z, 1.0 / window) * window
+
+
+def adx(high, low, close, window=14):
+    """(adx, adx_pos, adx_neg) of ta.trend.ADXIndicator(high, low, close, window).
+
+    ta fills the warm-up with zeros rather than NaN; that is kept so rows dropped
+    by a later dropna() are the same as before.
+    """
+    h, flat = _as_2d(high)
+    l, _ = _as_2d(low)
+    c, _ = _as_2d(close)
+    n_rows, n = c.shape
+    w = window
+    adx_out = np.zeros_like(c)
+    pos_out = np.zeros_like(c)
+    neg_out = np.zeros_like(c)
+    if n < 2 * w + 1:
+        return (adx_out[0], pos_out[0], neg_out[0]) if flat else (adx_out, pos_out, neg_out)
+
+    close_prev = _shift(c)
+    tr = np.maximum(h, close_prev) - np.minimum(l, close_prev)
+    diff_up = h - _shift(h)
+    diff_down = _shift(l) - l
+    pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+    neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+
+    # Smoothed sums over length L = n - w + 1; like ta, the last slot is left at 0
+    length = n - w + 1
+    trs = np.zeros((n_rows, length))
+    dip = np.zeros((n_rows, length))
+    din = np.zeros((n_rows, length))
+    trs[:, :-1] = _wilder_sum(tr[:, 1:w + 1].sum(axis=1), tr[:, w + 1:n], w)
+    dip[:, :-1] = _wilder_sum(pos[:, 1:w + 1].sum(axis=1), pos[:, w + 1:n], w)
+    din[:, :-1] = _wilder_sum(neg[:, 1:w + 1].sum(axis=1), neg[:, w + 1:n], w)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        di_plus = np.where(trs != 0, 100 * dip / trs, 0.0)
+        di_minus = np.where(trs != 0, 100 * din / trs, 0.0)
+        di_sum = di_plus + di_minus
+        dx = np.where(di_sum != 0, 100 * np.abs(di_plus - di_minus) / di_sum, 0.0)
+
+    adx_series = np.zeros((n_rows, length))
+    seed = dx[:, :w].mean(axis=1)
+    adx_series[:, w:] = _smooth(np.concatenate([seed[:, None], dx[:, w:length - 1]], axis=1), 1.0 / w)
+    adx_out[:, w - 1:] = adx_series
+    pos_out[:, w + 1:] = di_plus[:, 1:length - 1]
+    neg_out[:, w + 1:] = di_minus[:, 1:length - 1]
+    return (adx_out[0], pos_out[0], neg_out[0]) if flat else (adx_out, pos_out, neg_out)
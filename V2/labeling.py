@@ -0,0 +1,96 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 2 = up, 1 = flat, 0 = down (XGBoost needs non-negative classes)
+LABEL_DOWN, LABEL_FLAT, LABEL_UP = 0, 1, 2
+NO_LABEL = -1  # not enough future bars (or the horizon crosses a session boundary)
+
+
+def forward_returns(close, horizons, session_ids=None):
+    """(n, len(horizons)) matrix of close-to-close returns h bars ahead, NaN where unavailable"""
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    out = np.full((n, len(horizons)), np.nan)
+    for j, h in enumerate(horizons):
+        if h >= n:
+            continue
+        out[:n - h, j] = close[h:] / close[:-h] - 1.0
+        if session_ids is not None:
+            out[:n - h, j][session_ids[h:] != session_ids[:-h]] = np.nan
+    return out
+
+
+def label_grid(close, horizons, thresholds, session_ids=None):
+    """Fixed-horizon labels for every (horizon, threshold) pair in one pass.
+
+    Returns an int8 array of shape (n, len(horizons), len(thresholds)); row i,
+    [j, k] labels bar i by its return horizons[j] bars ahead against +/- thresholds[k].
+    """
+    returns = forward_returns(close, horizons, session_ids)[:, :, None]
+    thresholds = np.asarray(thresholds, dtype=np.float64)[None, None, :]
+    labels = np.full(returns.shape[:2] + (thresholds.shape[2],), LABEL_FLAT, dtype=np.int8)
+    labels[returns > thresholds] = LABEL_UP
+    labels[returns < -thresholds] = LABEL_DOWN
+    labels[np.broadcast_to(np.isnan(returns), labels.shape)] = NO_LABEL
+    return labels
+
+
+def triple_barrier_labels(close, target_pct, stop_pct, max_holding, session_ids=None, high=None, low=None):
+    """Label each bar by which of target, stop or time limit a long entry there hits first.
+
+    Mirrors the bots' exit rules: by default target/stop are checked on closes, as the
+    bots do once per candle; pass high/low to check intra-bar extremes instead (a bar
+    touching both counts as a stop). Positions never carry past the session end.
+    Returns (labels, exit_offset, exit_return): UP = target, DOWN = stop, FLAT = time/session exit.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    if n < 2:
+        return np.full(n, NO_LABEL, np.int8), np.zeros(n, np.int64), np.full(n, np.nan)
+    window = min(max_holding, n - 1)
+    intrabar = high is not None and low is not None
+    high = close if high is None else np.asarray(high, dtype=np.float64)
+    low = close if low is None else np.asarray(low, dtype=np.float64)
+
+    # Pad so every bar has a full look-ahead window; padded slots are masked below
+    pad = np.full(window, np.nan)
+    fwd_high = sliding_window_view(np.concatenate((high, pad)), window + 1)[:n, 1:]
+    fwd_low = sliding_window_view(np.concatenate((low, pad)), window + 1)[:n, 1:]
+    fwd_close = sliding_window_view(np.concatenate((close, pad)), window + 1)[:n, 1:]
+
+    valid = ~np.isnan(fwd_close)
+    if session_ids is not None:
+        session_ids = np.asarray(session_ids)
+        fwd_session = sliding_window_view(np.concatenate((session_ids, np.full(window, session_ids[-1]))), window + 1)[:n, 1:]
+        valid &= fwd_session == session_ids[:, None]
+
+    target = close * (1 + target_pct)
+    stop = close * (1 - stop_pct)
+    hit_target = valid & (fwd_high >= target[:, None])
+    hit_stop = valid & (fwd_low <= stop[:, None])
+
+    never = window + 1
+    first_target = np.where(hit_target.any(axis=1), hit_target.argmax(axis=1), never)
+    first_stop = np.where(hit_stop.any(axis=1), hit_stop.argmax(axis=1), never)
+    # Time/session exit: last valid bar of the window (valid bars are always a prefix)
+    n_valid = valid.sum(axis=1)
+    last_valid = np.maximum(n_valid - 1, 0)
+
+    labels = np.full(n, LABEL_FLAT, dtype=np.int8)
+    exit_offset = last_valid.copy()
+    is_stop = (first_stop <= first_target) & (first_stop < never)
+    is_target = (first_target < first_stop)
+    labels[is_stop] = LABEL_DOWN
+    labels[is_target] = LABEL_UP
+    exit_offset[is_stop] = first_stop[is_stop]
+    exit_offset[is_target] = first_target[is_target]
+    labels[n_valid == 0] = NO_LABEL
+
+    rows = np.arange(n)
+    exit_price = np.where(n_valid > 0, fwd_close[rows, exit_offset], np.nan)
+    if intrabar:
+        # Barrier touched inside the bar: assume a fill at the barrier price
+        exit_price[is_target] = target[is_target]
+        exit_price[is_stop] = stop[is_stop]
+    exit_return = exit_price / close - 1.0
+    return labels, exit_offset + 1, exit_return
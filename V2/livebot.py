@@ -2,25 +2,23 @@ import time
 import datetime
 import pandas as pd
 import pyotp
-import ta
-import joblib
+import indicators
 from SmartApi import SmartConnect
-from sklearn.ensemble import RandomForestClassifier
 import pytz
 import logging 
+from log_pipeline import setup_logging
 import os
 from dotenv import load_dotenv
+from position_sizing import PositionSizer
+from trading_calendar import is_trading_day
+from bus_client import BusClient, MARKET_DATA_BUS
+from api_scheduler import scheduler
+from labeling import LABEL_UP, LABEL_FLAT, LABEL_DOWN
+from model_registry import ModelWatcher, current_version, import_model_file
 
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s',
-    handlers=[
-        logging.FileHandler("live_trading_log.log"),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()  # queue-backed: file/console writes happen off the trading loop
 
 
 
@@ -30,6 +28,7 @@ API_KEY = os.environ["API_KEY"]
 USER_ID = os.environ["USER_ID"]
 PASSWORD = os.environ["PASSWORD"]
 TOTP_SECRET = os.environ["TOTP_SECRET"]
+SMARTAPI_ROOT = os.getenv("SMARTAPI_ROOT")  # e.g. http://127.0.0.1:8765 for V3/mock_smartapi.py
 SYMBOL = os.environ["SYMBOL"]
 SYMBOL_TOKEN = os.environ["SYMBOL_TOKEN"]
 STOPLOSS_PCT = float(os.environ["STOPLOSS_PCT"])
@@ -39,34 +38,46 @@ AUTO_QTY = os.environ.get("AUTO_QTY", "1") == "1"
 
 QUANTITY = int(os.environ["QUANTITY"]) if not AUTO_QTY else None
 
+# ---- AUTO QTY RISK CAPS ----
+RMS_REFRESH_SECS = int(os.environ.get("RMS_REFRESH_SECS", "30"))
+MAX_SYMBOL_EXPOSURE_PCT = float(os.environ.get("MAX_SYMBOL_EXPOSURE_PCT", "100"))
+MAX_PORTFOLIO_EXPOSURE_PCT = float(os.environ.get("MAX_PORTFOLIO_EXPOSURE_PCT", "100"))
+RISK_PER_TRADE_PCT = float(os.environ.get("RISK_PER_TRADE_PCT", "0"))  # 0 disables the risk cap
+# e.g. "RELIANCE-EQ:50000,TCS-EQ:30000" (max INR notional per symbol)
+SYMBOL_EXPOSURE_CAPS = {
+    sym.strip(): float(cap)
+    for sym, cap in (item.split(":") for item in os.environ.get("SYMBOL_EXPOSURE_CAPS", "").split(",") if item)
+}
+
 EXCHANGE = "NSE"
 TRADE_TYPE = "INTRADAY"  # or DELIVERY
 ORDER_TYPE = "MARKET"
 PRODUCT_TYPE = "MIS"     # use "CNC" for DELIVERY
 INTERVAL = "FIVE_MINUTE"
 
+# ---- MODEL ----
+MODEL_NAME = os.environ.get("MODEL_NAME", "xgb_intraday")
+MODEL_FILENAME = "xgb_intraday_model.pkl"   # what train.py used to leave behind; imported once if the registry is empty
+FEATURE_COLUMNS = ['rsi', 'macd', 'sma', 'returns']
+LABEL_NAMES = {LABEL_DOWN: "down", LABEL_FLAT: "flat", LABEL_UP: "up"}
+
 
 
 # ---- STATE ----
 in_position = False
 buy_price = None
+position_qty = None
+bus = None  # BusClient when MARKET_DATA_BUS is set
 
 # ---- SETUP ----
-model = joblib.load("rf_intraday_model.pkl")
+def load_models():
+    """Watcher over the registry's current model (hot-swapped between candles)"""
+    if current_version(MODEL_NAME) is None and os.path.exists(MODEL_FILENAME):
+        version = import_model_file(MODEL_FILENAME, MODEL_NAME, FEATURE_COLUMNS, LABEL_NAMES)
+        logging.info(f"Imported {MODEL_FILENAME} into the model registry as {MODEL_NAME} {version}")
+    return ModelWatcher(MODEL_NAME, FEATURE_COLUMNS).start()
 
 
-def fetch_available_quantity(obj, symbol_price):
-    try:
-        profile = obj.getRMS()
-        available_margin = float(profile['data']['availablecash'])  # or 'net' depending on your API
-        approx_qty = int(available_margin // symbol_price)
-        logging.info(f"Auto Quantity: Margin = {available_margin:.2f}, Price = {symbol_price:.2f}, Qty = {approx_qty}")
-        return max(1, approx_qty)
-    except Exception as e:
-        logging.error("❌ Error calculating auto quantity: %s", e)
-        return 1
-    
-
 def safety_stop_triggered():
     try:
         with open("stop.txt", "r") as f:
@@ -76,18 +87,23 @@ def safety_stop_triggered():
 
 def create_session():
     totp = pyotp.TOTP(TOTP_SECRET).now()
-    obj = SmartConnect(api_key=API_KEY)
-    session = obj.generateSession(USER_ID, PASSWORD, totp)
+    obj = SmartConnect(api_key=API_KEY, root=SMARTAPI_ROOT)
+    session = scheduler.call('generateSession', obj.generateSession, USER_ID, PASSWORD, totp)
     refresh_token = session['data']['refreshToken']
     return obj,refresh_token
 
 def get_last_trading_day(today):
-    while today.weekday() >= 5:  # skip Sat/Sun
+    while not is_trading_day(today.date()):  # skip weekends and NSE holidays
         today -= datetime.timedelta(days=1)
     return today
 
 
 def fetch_latest_candle(obj):
+    if bus is not None:
+        # The market-data bus already fetched this cycle's bars for every strategy
+        df = bus.latest(SYMBOL)
+        return df[['open', 'high', 'low', 'close', 'volume']].tail(36) if not df.empty else df
+
     ist = pytz.timezone('Asia/Kolkata')
     now = datetime.datetime.now(ist)
 
@@ -116,7 +132,7 @@ def fetch_latest_candle(obj):
         }
 
         try:
-            yday_data = obj.getCandleData(yday_params)['data']
+            yday_data = scheduler.call('getCandleData', obj.getCandleData, yday_params)['data']
             yday_df = pd.DataFrame(yday_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
             yday_df['timestamp'] = pd.to_datetime(yday_df['timestamp'])
             yday_df.set_index('timestamp', inplace=True)
@@ -134,7 +150,7 @@ def fetch_latest_candle(obj):
     }
 
     try:
-        today_data = obj.getCandleData(today_params)['data']
+        today_data = scheduler.call('getCandleData', obj.getCandleData, today_params)['data']
         today_df = pd.DataFrame(today_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         today_df['timestamp'] = pd.to_datetime(today_df['timestamp'])
         today_df.set_index('timestamp', inplace=True)
@@ -156,18 +172,18 @@ def fetch_latest_candle(obj):
     return full_df
 
 def compute_features(df):
-    df['rsi'] = ta.momentum.RSIIndicator(df['close']).rsi()
-    df['macd'] = ta.trend.MACD(df['close']).macd()
-    df['sma'] = ta.trend.SMAIndicator(df['close'], window=10).sma_indicator()
+    close = df['close'].to_numpy(dtype=float)
+    df['rsi'] = indicators.rsi(close)
+    df['macd'] = indicators.macd(close)
+    df['sma'] = indicators.sma(close, 10)
     df['returns'] = df['close'].pct_change()
     df = df.dropna(subset=['rsi', 'macd', 'sma', 'returns'])
     return df
 
-def place_market_order(obj, transaction_type):
+def place_market_order(obj, transaction_type, quantity):
     if PAPER_TRADE:
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_msg = f"[PAPER TRADE] {now} | {transaction_type} | Symbol: {SYMBOL} | Qty: {QUANTITY}"
-        print(log_msg)
+        log_msg = f"[PAPER TRADE] {now} | {transaction_type} | Symbol: {SYMBOL} | Qty: {quantity}"
         logging.info(log_msg)
         return {"status": "simulated", "action": transaction_type}
     else:
@@ -180,39 +196,55 @@ def place_market_order(obj, transaction_type):
             "ordertype": ORDER_TYPE,
             "producttype": "INTRADAY",
             "duration": "DAY",
-            "quantity": QUANTITY
+            "quantity": quantity
         }
-        print("Sending request with:", order_params)
+        logging.info(f"Sending request with: {order_params}")
  
-        order = obj.placeOrder(order_params)
-        print(f"✅ {transaction_type} order placed | Order ID: {order}")
+        order = scheduler.call('placeOrder', obj.placeOrder, order_params)
         logging.info(f" REAL ORDER placed: {transaction_type} | ID: {order}")
         return order
 
 
 # ---- MAIN LOOP ----
 def live_trading():
-    global in_position, buy_price
+    global in_position, buy_price, position_qty, bus
+    models = load_models()
+    logging.info(f"Model {MODEL_NAME} {models.version} loaded")
     obj,refresh_token = create_session()
-    print("🚀 Live Trading Started for", SYMBOL)
+    if MARKET_DATA_BUS:
+        bus = BusClient()
+        bus.subscribe(SYMBOL, SYMBOL_TOKEN)
     logging.info(f"Live Trading Started for {SYMBOL}")
 
     try:
-        obj.getProfile(refresh_token)
+        scheduler.call('getProfile', obj.getProfile, refresh_token)
     except Exception as e:
         logging.warning("🔁 Session expired. Renewing...") 
         try:
-            new_session = obj.renewAccessToken(refresh_token)
+            new_session = scheduler.call('renewAccessToken', obj.renewAccessToken, refresh_token)
             logging.info("✅ Session renewed.")
         except Exception as e:
             logging.error(f"❌ Could not renew session: {e}")
             logging.info("🔄 Attempting full login again...")
             obj, refresh_token = create_session()
 
+    sizer = None
+    if AUTO_QTY:
+        # Paper fills never reach the broker, so only the initial RMS snapshot is used
+        sizer = PositionSizer(
+            obj,
+            refresh_secs=None if PAPER_TRADE else RMS_REFRESH_SECS,
+            max_symbol_pct=MAX_SYMBOL_EXPOSURE_PCT,
+            max_portfolio_pct=MAX_PORTFOLIO_EXPOSURE_PCT,
+            risk_per_trade_pct=RISK_PER_TRADE_PCT,
+            stoploss_pct=STOPLOSS_PCT,
+            symbol_caps=SYMBOL_EXPOSURE_CAPS,
+        )
+        sizer.start()
+
     while True:
 
         if safety_stop_triggered():
-            print("Exitted......")
             logging.warning(" Trading stopped by user (STOP file detected).")
             break
 
@@ -220,7 +252,6 @@ def live_trading():
             df = fetch_latest_candle(obj)
 
             if df.empty:
-                print("⚠️ No candle data received!")
                 logging.warning("No candle data received!")
                 time.sleep(60)
                 continue  # Skip this loop iteration
@@ -228,58 +259,64 @@ def live_trading():
             df = compute_features(df)
 
             if df.empty:
-                print("⚠️ Not enough data after feature engineering!")
                 logging.warning("Not enough data after feature engineering!")
                 time.sleep(60)
                 continue
             latest = df.iloc[-1]
 
             if df.empty:
-                print("No data received. Retrying...")
+                logging.warning("No data received. Retrying...")
                 time.sleep(1)
                 continue
 
             if len(df) < 6:
-                print("⏳ Waiting for more data...")
+                logging.info("⏳ Waiting for more data...")
                 time.sleep(60)
                 continue
 
 
-            X = latest[['rsi', 'macd', 'sma', 'returns']].values.reshape(1, -1)
-            prediction = model.predict(X)[0]
+            X = df[FEATURE_COLUMNS].iloc[[-1]]
+            predictions, model_meta = models.predict(X)
+            prediction = int(predictions[0])
             current_price = latest['close']
-            print(f"\n🕒 {latest.name} | Price: ₹{current_price:.2f} | Signal: {prediction}")
-
-            if not in_position and prediction == 1:
-                if AUTO_QTY :
-                    QUANTITY = fetch_available_quantity(obj, current_price)
-                print("📈 BUY Signal Detected")
-                logging.info(" BUY Signal Detected")
-                place_market_order(obj, "BUY")
-                buy_price = current_price
-                in_position = True
+            logging.info(f"🕒 {latest.name} | Price: ₹{current_price:.2f} | Signal: {LABEL_NAMES.get(prediction, prediction)} "
+                         f"| Model: {model_meta['version']}")
+
+            # Classes follow labeling.py: 2 = up (buy), 1 = flat, 0 = down (exit)
+            if not in_position and prediction == LABEL_UP:
+                qty = sizer.size(SYMBOL, current_price) if AUTO_QTY else QUANTITY
+                if qty < 1:
+                    logging.warning("BUY Signal skipped: position size capped to 0")
+                else:
+                    logging.info(" BUY Signal Detected")
+                    place_market_order(obj, "BUY", qty)
+                    if sizer:
+                        sizer.on_fill(SYMBOL, "BUY", qty, current_price)
+                    buy_price = current_price
+                    position_qty = qty
+                    in_position = True
 
             elif in_position:
                 change = (current_price - buy_price) / buy_price
                 if change >= TARGET_PCT:
-                    print("🎯 Target hit, SELLING...")
                     logging.info(" Target hit, SELLING...")
-                    place_market_order(obj, "SELL")
+                    place_market_order(obj, "SELL", position_qty)
+                    if sizer:
+                        sizer.on_fill(SYMBOL, "SELL", position_qty, current_price)
                     in_position = False
-                    if AUTO_QTY:
-                        QUANTITY = None
-                elif change <= -STOPLOSS_PCT or prediction == -1:
-                    print("🛑 Stop-loss hit or SELL signal, SELLING...")
+                    position_qty = None
+                elif change <= -STOPLOSS_PCT or prediction == LABEL_DOWN:
                     logging.warning("Stop loss hit !")
-                    place_market_order(obj, "SELL")
+                    place_market_order(obj, "SELL", position_qty)
+                    if sizer:
+                        sizer.on_fill(SYMBOL, "SELL", position_qty, current_price)
                     in_position = False
-                    if AUTO_QTY:
-                        QUANTITY = None
+                    position_qty = None
 
         except Exception as e:
-            print("❌ Error:", e)
             logging.error(e)
 
+        scheduler.log_metrics()
         # Wait 5 minutes before next candle
         time.sleep(300)
 
@@ -0,0 +1,86 @@
+import os
+import gzip
+import queue
+import atexit
+import shutil
+import datetime
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = os.getenv("LOG_FILE", "live_trading_log.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "14"))
+LOG_FORMAT = '%(asctime)s | %(levelname)s | %(message)s'
+TAIL_BYTES = 256 * 1024
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class SegmentedFileHandler(RotatingFileHandler):
+    """Rotates when the file passes max_bytes or the day changes; old segments are gzipped"""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = _gzip_rotator
+        # A segment left over from an earlier day is rotated on the first record
+        exists = os.path.exists(self.baseFilename)
+        self.day = datetime.date.fromtimestamp(os.path.getmtime(self.baseFilename)) if exists else datetime.date.today()
+
+    def shouldRollover(self, record):
+        if datetime.date.today() != self.day and self.stream is not None and self.stream.tell() > 0:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.day = datetime.date.today()
+
+
+def setup_logging(log_file=LOG_FILE, level=logging.INFO, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """Replace basicConfig: the caller only enqueues records, a background thread writes them.
+
+    File rotation, gzip compression and console output all happen on the listener
+    thread, so a slow disk or terminal never stalls the trading loop.
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = SegmentedFileHandler(log_file, max_bytes, backup_count)
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    # Drain whatever is still queued when the bot exits
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener):
+    if listener._thread is not None:
+        listener.stop()
+
+
+def read_log_tail(log_file=LOG_FILE, max_bytes=TAIL_BYTES):
+    """Last max_bytes of the current log segment, starting at a line boundary"""
+    try:
+        with open(log_file, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if size > max_bytes:
+        data = data.split(b"\n", 1)[-1]
+    return data.decode("utf-8", errors="replace")
@@ -3,6 +3,8 @@ import subprocess
 import os
 import json
 import time
+import fcntl
+from log_pipeline import read_log_tail
 
 def update_env_var(key, value):
     # Safely read and update/create .env keys
@@ -27,6 +29,9 @@ def update_env_var(key, value):
 
 
 CREDENTIALS_FILE = "users.json"
+MODEL_FILENAME = "xgb_intraday_model.pkl"
+FEATURE_STORE_DIR = "feature_store"
+SCHEDULER_LOCK = "incremental_train.lock"  # locked by incremental_train.py while its scheduler runs
 LOG_FILE = "live_trading_log.log"
 st.set_page_config(page_title="Smart Trading App", layout="centered")
 
@@ -73,6 +78,19 @@ def save_user(username, password):
         json.dump(users, f)
 
 
+def scheduler_running():
+    """The update scheduler holds an exclusive lock for its lifetime; failing to take it means one is up"""
+    if not os.path.exists(SCHEDULER_LOCK):
+        return False
+    with open(SCHEDULER_LOCK) as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    return False
+
+
 # Initialize auth and training states
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -122,6 +140,8 @@ with tabs[0]:
     st.markdown("Fill in the details below to start trading:")
 
     qty_mode = st.radio("Quantity Mode", ["Auto", "Manual"], horizontal=True)
+    train_mode = st.radio("Training Mode", ["Incremental", "Full Retrain"], horizontal=True,
+                          help="Incremental only fetches sessions since the last run and updates the saved model")
     with st.form("trading_form"):
         api_key = st.text_input("API Key", type="password")
         user_id = st.text_input("Client ID")
@@ -166,9 +186,14 @@ with tabs[0]:
         }
         st.success("✅ Model training started...")
 
-        with st.spinner("Training Model:"):
+        # Incremental updates need a previous full run (model + feature store entry)
+        incremental = (train_mode == "Incremental" and os.path.exists(MODEL_FILENAME)
+                       and os.path.exists(os.path.join(FEATURE_STORE_DIR, f"{symbol}_labels")))
+        train_cmd = ["python", "incremental_train.py", "--once"] if incremental else ["python", "train.py"]
+
+        with st.spinner("Updating Model:" if incremental else "Training Model:"):
             try:
-                subprocess.run(["python", "train.py"], check=True)
+                subprocess.run(train_cmd, check=True)
                 st.success("Model trained successfully!")
                 st.session_state.training_done = True  # Mark training done here
             except subprocess.CalledProcessError as e:
@@ -183,6 +208,12 @@ with tabs[0]:
 
     # Button to launch live trading bot after training
     if st.session_state.training_done:
+        if st.button("⏰ Schedule Daily Model Update"):
+            if scheduler_running():
+                st.info("ℹ️ Daily model update is already scheduled")
+            else:
+                subprocess.Popen(["python", "incremental_train.py"])
+                st.success("✅ Model will be updated every trading day after market close")
         if st.button("Launch Live Trading Bot"):
             st.success("✅ Starting live trading bot...")
             subprocess.Popen(["python", "livebot.py"], env={**os.environ, **st.session_state.env_vars})
@@ -197,10 +228,9 @@ with tabs[1]:
         refresh_rate = st.slider("Refresh logs every (seconds):", min_value=2, max_value=30, value=5)
 
         # Read and show log file content
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r") as f:
-                logs = f.read()
-        else:
+        # Only the tail of the current segment; rotated segments are gzipped alongside it
+        logs = read_log_tail(LOG_FILE)
+        if logs is None:
             logs = "No trading logs available yet."
 
         st.text_area("Trading Logs", value=logs, height=500, key="log_area")
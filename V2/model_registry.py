@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import logging
+import datetime
+import threading
+import joblib
+import pandas as pd
+from results_store import code_version
+
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "model_registry")
+MODEL_POLL_SECS = float(os.getenv("MODEL_POLL_SECS", "30"))     # how often a running bot looks for a new model
+CURRENT_FILE = "CURRENT"
+MODEL_FILE = "model.pkl"
+META_FILE = "meta.json"
+
+# <root>/<name>/<version>/{model.pkl, meta.json}; <root>/<name>/CURRENT names the version
+# bots should run. Versions are never modified after they are written, so promoting or
+# rolling back is a one-line pointer swap.
+
+
+def model_dir(name, root=MODEL_REGISTRY_DIR):
+    return os.path.join(root, name)
+
+
+def current_version(name, root=MODEL_REGISTRY_DIR):
+    try:
+        with open(os.path.join(model_dir(name, root), CURRENT_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def promote(name, version, root=MODEL_REGISTRY_DIR):
+    """Make version the one running bots swap to (atomic pointer write)"""
+    if not os.path.isfile(os.path.join(model_dir(name, root), version, MODEL_FILE)):
+        raise FileNotFoundError(f"{name} has no version {version}")
+    path = os.path.join(model_dir(name, root), CURRENT_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(version)
+    os.replace(f"{path}.tmp", path)
+
+
+def register_model(model, name, feature_columns, labels=None, feature_set=None, metrics=None, params=None,
+                   promote_now=True, root=MODEL_REGISTRY_DIR):
+    """Store a trained model as a new immutable version with what it needs to be served; returns the version.
+
+    labels maps class ids to meanings ({0: 'down', 1: 'flat', 2: 'up'}), feature_set names the
+    dataset version it was trained on, metrics holds its validation scores.
+    """
+    version = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    final_dir = os.path.join(model_dir(name, root), version)
+    tmp_dir = f"{final_dir}.tmp"
+    os.makedirs(tmp_dir)
+    meta = {
+        'name': name,
+        'version': version,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'model_class': type(model).__name__,
+        'feature_columns': list(feature_columns),
+        'labels': {str(k): v for k, v in (labels or {}).items()},
+        'feature_set': feature_set,
+        'metrics': metrics or {},
+        'params': params or {},
+        'code_version': code_version(),
+    }
+    joblib.dump(model, os.path.join(tmp_dir, MODEL_FILE))
+    with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+    os.replace(tmp_dir, final_dir)
+    if promote_now:
+        promote(name, version, root)
+    return version
+
+
+def load_model(name, version=None, root=MODEL_REGISTRY_DIR):
+    """(model, meta) for version, or for the current one"""
+    version = version or current_version(name, root)
+    if version is None:
+        raise FileNotFoundError(f"No model registered as {name} in {root}")
+    path = os.path.join(model_dir(name, root), version)
+    with open(os.path.join(path, META_FILE), "r") as f:
+        meta = json.load(f)
+    return joblib.load(os.path.join(path, MODEL_FILE)), meta
+
+
+def list_versions(name, root=MODEL_REGISTRY_DIR):
+    """meta of every version of name, oldest first"""
+    folder = model_dir(name, root)
+    if not os.path.isdir(folder):
+        return []
+    metas = []
+    for version in sorted(os.listdir(folder)):
+        meta_path = os.path.join(folder, version, META_FILE)
+        if os.path.isfile(meta_path):
+            with open(meta_path, "r") as f:
+                metas.append(json.load(f))
+    return metas
+
+
+def import_model_file(path, name, feature_columns, labels=None, root=MODEL_REGISTRY_DIR):
+    """Register a pickle trained before the registry existed, so a bot can start from it"""
+    return register_model(joblib.load(path), name, feature_columns, labels, params={'imported_from': path}, root=root)
+
+
+class ModelWatcher:
+    """The model a live bot predicts with, swapped in place when the registry's CURRENT moves.
+
+    A background thread loads the new version, checks its feature columns and runs a
+    warm-up prediction on the bot's latest feature row; only then is it swapped in with
+    one reference assignment. The bar loop never waits on a load, so no bar is missed,
+    and a candidate that fails any check is skipped while the old model keeps serving.
+    """
+
+    def __init__(self, name, feature_columns, poll_secs=MODEL_POLL_SECS, root=MODEL_REGISTRY_DIR):
+        self.name = name
+        self.feature_columns = list(feature_columns)
+        self.poll_secs = poll_secs
+        self.root = root
+        self.rejected = set()
+        self.last_features = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        model, meta = load_model(name, root=root)
+        self._check_columns(meta)
+        self.current = (model, meta)     # swapped as one tuple so model and meta always match
+
+    @property
+    def version(self):
+        return self.current[1]['version']
+
+    def _check_columns(self, meta):
+        if meta['feature_columns'] != self.feature_columns:
+            raise ValueError(f"{self.name} {meta['version']} expects {meta['feature_columns']}, bot computes {self.feature_columns}")
+
+    def predict(self, X):
+        """(predictions, meta) from the current model; X's last row is kept for warm-ups"""
+        model, meta = self.current
+        self.last_features = X[-1:].copy()
+        return model.predict(X), meta
+
+    def check_for_update(self):
+        """Load, validate and warm the CURRENT version if it is new; True when it was swapped in"""
+        version = current_version(self.name, self.root)
+        if version is None or version == self.version or version in self.rejected:
+            return False
+        started = time.perf_counter()
+        try:
+            model, meta = load_model(self.name, version, self.root)
+            self._check_columns(meta)
+            warm = self.last_features
+            if warm is None:
+                warm = pd.DataFrame([[0.0] * len(self.feature_columns)], columns=self.feature_columns)
+            model.predict(warm)
+        except Exception as e:
+            self.rejected.add(version)
+            logging.error(f"Model {self.name} {version} rejected, keeping {self.version}: {e}")
+            return False
+        previous = self.version
+        self.current = (model, meta)
+        logging.info(f"🔄 Model {self.name} swapped {previous} -> {version} "
+                     f"(loaded and warmed in {time.perf_counter() - started:.2f}s, metrics {meta.get('metrics')})")
+        return True
+
+    def _run(self):
+        while not self.stop_event.wait(self.poll_secs):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                logging.warning(f"Model registry check failed: {e}")
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    # python model_registry.py list <name>
+    # python model_registry.py promote <name> <version>   (also how to roll back)
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "promote":
+        promote(sys.argv[2], sys.argv[3])
+        print(f"✅ {sys.argv[2]} -> {sys.argv[3]}")
+    else:
+        name = sys.argv[2] if len(sys.argv) > 2 else "xgb_intraday"
+        current = current_version(name)
+        for meta in list_versions(name):
+            marker = "*" if meta['version'] == current else " "
+            print(f"{marker} {meta['version']} | {meta['model_class']} | features {meta['feature_set']} | {meta['metrics']}")
@@ -0,0 +1,109 @@
+import threading
+import logging
+from api_scheduler import scheduler
+
+
+class PositionSizer:
+    """Sizes entries from a local margin/exposure cache that getRMS refreshes in the background.
+
+    Fills adjust the cache locally, so sizing never waits on an RMS round trip.
+    All caps are in percent of capital; symbol_caps maps a symbol to a max notional in INR.
+    """
+
+    def __init__(self, obj, refresh_secs=30, max_symbol_pct=100.0, max_portfolio_pct=100.0,
+                 risk_per_trade_pct=0.0, stoploss_pct=None, symbol_caps=None):
+        self.obj = obj
+        self.refresh_secs = refresh_secs
+        self.max_symbol_pct = max_symbol_pct
+        self.max_portfolio_pct = max_portfolio_pct
+        self.risk_per_trade_pct = risk_per_trade_pct
+        self.stoploss_pct = stoploss_pct
+        self.symbol_caps = symbol_caps or {}
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.available_cash = None
+        self.positions = {}   # symbol -> [qty, cost]
+        self.generation = 0   # bumped on every local fill
+        self.unsynced = []    # (generation, cash_delta) not yet confirmed by RMS
+
+    # ---- CACHE MAINTENANCE ----
+    def refresh(self):
+        """Pull availablecash from RMS, replaying fills the response may not include yet"""
+        with self.lock:
+            start_generation = self.generation
+        rms = scheduler.call('getRMS', self.obj.getRMS)
+        cash = float(rms['data']['availablecash'])
+        with self.lock:
+            # Fills recorded before the request started are already in the broker's number
+            self.unsynced = [(g, d) for g, d in self.unsynced if g > start_generation]
+            self.available_cash = cash + sum(d for _, d in self.unsynced)
+        logging.info(f"RMS cache refreshed: available cash = {self.available_cash:.2f}")
+
+    def _refresh_loop(self):
+        while not self.stop_event.wait(self.refresh_secs):
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.warning(f"RMS refresh failed, keeping cached margin: {e}")
+
+    def start(self):
+        """Prime the cache once, then keep it fresh from a daemon thread"""
+        try:
+            self.refresh()
+        except Exception as e:
+            logging.error(f"❌ Initial RMS fetch failed: {e}")
+        if self.refresh_secs:
+            self.thread = threading.Thread(target=self._refresh_loop, name="rms-refresh", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def on_fill(self, symbol, transaction_type, qty, price):
+        """Apply a fill to the local cache immediately"""
+        notional = qty * price
+        with self.lock:
+            held_qty, cost = self.positions.get(symbol, [0, 0.0])
+            if transaction_type == "BUY":
+                cash_delta = -notional
+                held_qty, cost = held_qty + qty, cost + notional
+            else:
+                cash_delta = notional
+                avg_cost = cost / held_qty if held_qty else 0.0
+                held_qty = max(0, held_qty - qty)
+                cost = avg_cost * held_qty
+            self.positions[symbol] = [held_qty, cost]
+            self.generation += 1
+            self.unsynced.append((self.generation, cash_delta))
+            if self.available_cash is not None:
+                self.available_cash += cash_delta
+
+    # ---- SIZING ----
+    def size(self, symbol, price):
+        """Largest quantity allowed by cash, exposure caps and per-trade risk; 0 means skip"""
+        with self.lock:
+            cash = self.available_cash
+            exposure = {s: cost for s, (_, cost) in self.positions.items()}
+
+        if cash is None or price <= 0:
+            logging.warning("No margin data cached yet, cannot size position")
+            return 0
+
+        total_exposure = sum(exposure.values())
+        capital = cash + total_exposure
+
+        budget = cash
+        budget = min(budget, capital * self.max_portfolio_pct / 100 - total_exposure)
+        symbol_cap = self.symbol_caps.get(symbol, capital * self.max_symbol_pct / 100)
+        budget = min(budget, symbol_cap - exposure.get(symbol, 0.0))
+        qty = int(max(budget, 0) // price)
+
+        if self.risk_per_trade_pct and self.stoploss_pct:
+            risk_budget = capital * self.risk_per_trade_pct / 100
+            qty = min(qty, int(risk_budget // (price * self.stoploss_pct)))
+
+        logging.info(f"Auto Quantity: Cash = {cash:.2f}, Exposure = {total_exposure:.2f}, "
+                     f"Price = {price:.2f}, Qty = {qty}")
+        return qty
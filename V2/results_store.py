@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import datetime
+import operator
+import subprocess
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: runs fall back to pickle + a JSON sidecar (dtypes kept, filters applied after load)
+    pa = None
+    pq = None
+
+RESULTS_DIR = os.getenv("RESULTS_DIR", "results")
+RUN_METADATA_KEY = b"run_metadata"
+ROW_GROUP_SIZE = 50_000          # rows per Parquet row group; the unit filters can skip
+FILTER_OPS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    'in': lambda s, v: s.isin(v), 'not in': lambda s, v: ~s.isin(v),
+}
+
+
+def code_version():
+    """Short git commit of this checkout ('+dirty' with local edits), 'unknown' outside git"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}+dirty" if dirty else commit
+
+
+def _run_base(root, kind, name):
+    return os.path.join(root, kind, name)
+
+
+def write_run(df, kind, name, params=None, start=None, end=None, root=RESULTS_DIR, index=False):
+    """Write a backtest log or training frame as <root>/<kind>/<name>.parquet with its run metadata.
+
+    The metadata (strategy params, data range, code version) lives in the Parquet footer,
+    so list_runs can compare hundreds of runs without reading any rows.
+    """
+    meta = {
+        'kind': kind,
+        'name': name,
+        'params': params or {},
+        'start': str(start) if start is not None else None,
+        'end': str(end) if end is not None else None,
+        'code_version': code_version(),
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'rows': len(df),
+        'columns': [str(c) for c in df.columns],
+    }
+    base = _run_base(root, kind, name)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    if pq is not None:
+        table = pa.Table.from_pandas(df, preserve_index=index)
+        schema_meta = dict(table.schema.metadata or {})
+        schema_meta[RUN_METADATA_KEY] = json.dumps(meta, default=str).encode()
+        table = table.replace_schema_metadata(schema_meta)
+        path = f"{base}.parquet"
+        pq.write_table(table, f"{path}.tmp", compression="zstd", row_group_size=ROW_GROUP_SIZE)
+    else:
+        path = f"{base}.pkl"
+        (df if index else df.reset_index(drop=True)).to_pickle(f"{path}.tmp")
+        with open(f"{base}.json", "w") as f:
+            json.dump(meta, f, indent=1, default=str)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def read_run_metadata(path):
+    if path.endswith(".parquet"):
+        return json.loads(pq.read_schema(path).metadata[RUN_METADATA_KEY])
+    with open(f"{os.path.splitext(path)[0]}.json", "r") as f:
+        return json.load(f)
+
+
+def _run_paths(root, kind=None):
+    if kind:
+        kinds = [kind]
+    elif os.path.isdir(root):
+        kinds = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    else:
+        kinds = []
+    ext = ".parquet" if pq is not None else ".pkl"
+    paths = []
+    for k in kinds:
+        folder = os.path.join(root, k)
+        if os.path.isdir(folder):
+            paths.extend(os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(ext))
+    return paths
+
+
+def list_runs(root=RESULTS_DIR, kind=None):
+    """One row per stored run with its metadata; params are flattened to param.<key> columns"""
+    rows = []
+    for path in _run_paths(root, kind):
+        meta = read_run_metadata(path)
+        row = {k: v for k, v in meta.items() if k not in ('params', 'columns')}
+        row['path'] = path
+        for key, value in meta.get('params', {}).items():
+            row[f"param.{key}"] = json.dumps(value) if isinstance(value, (dict, list)) else value
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _apply_filters(df, filters):
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        values = df[column] if column in df.columns else pd.Series(df.index.get_level_values(column), index=df.index)
+        mask &= FILTER_OPS[op](values, value)
+    return df[mask.to_numpy()]
+
+
+def load_run(path, columns=None, filters=None):
+    """Read one run; with Parquet only the requested columns and the row groups that can match are read.
+
+    filters are (column, op, value) tuples ANDed together, e.g. [('action', '==', 'SELL')].
+    """
+    if path.endswith(".parquet"):
+        return pq.read_table(path, columns=columns, filters=filters or None, use_pandas_metadata=True).to_pandas()
+    if path.endswith(".csv"):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_pickle(path)
+    df = _apply_filters(df, filters)
+    return df[columns] if columns else df
+
+
+def load_runs(paths=None, columns=None, filters=None, root=RESULTS_DIR, kind=None):
+    """Concatenate many runs (default: every run under root/kind) with a 'run' column naming each"""
+    paths = list(paths) if paths is not None else _run_paths(root, kind)
+    frames = []
+    for path in paths:
+        df = load_run(path, columns, filters)
+        df['run'] = os.path.splitext(os.path.basename(path))[0]
+        frames.append(df)
+    return pd.concat(frames) if frames else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    # python results_store.py list [kind]
+    # python results_store.py convert <trade_log.csv> <name> [kind]
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "convert":
+        csv_path, name = sys.argv[2], sys.argv[3]
+        kind = sys.argv[4] if len(sys.argv) > 4 else "backtest"
+        df = pd.read_csv(csv_path)
+        if 'timestamp' in df.columns:
+            df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
+        start, end = (df['timestamp'].min(), df['timestamp'].max()) if 'timestamp' in df.columns else (None, None)
+        path = write_run(df, kind, name, params={'source': os.path.basename(csv_path)}, start=start, end=end)
+        print(f"💾 {len(df)} rows -> {path}")
+    else:
+        runs = list_runs(kind=sys.argv[2] if len(sys.argv) > 2 else None)
+        print(runs.to_string() if not runs.empty else f"No runs under {RESULTS_DIR}")
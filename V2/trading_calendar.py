@@ -0,0 +1,159 @@
+import os
+import logging
+import datetime
+from functools import lru_cache
+import pandas as pd
+import pytz
+
+IST = pytz.timezone("Asia/Kolkata")
+SESSION_OPEN = datetime.time(9, 15)
+SESSION_CLOSE = datetime.time(15, 30)
+BAR_MINUTES = 5
+
+# ---- NSE EQUITY HOLIDAYS (weekday closures) ----
+# Update every December from the NSE circular; extra dates can be added through
+# NSE_HOLIDAYS_FILE (one YYYY-MM-DD per line) without touching the code. A year
+# with no entries here is not covered: dates in it are flagged as unreliable.
+NSE_HOLIDAYS = {
+    # 2020
+    "2020-02-21", "2020-03-10", "2020-04-02", "2020-04-06", "2020-04-10", "2020-04-14",
+    "2020-05-01", "2020-05-25", "2020-10-02", "2020-11-16", "2020-11-30", "2020-12-25",
+    # 2021
+    "2021-01-26", "2021-03-11", "2021-03-29", "2021-04-02", "2021-04-14", "2021-04-21",
+    "2021-05-13", "2021-07-21", "2021-08-19", "2021-09-10", "2021-10-15", "2021-11-04",
+    "2021-11-05", "2021-11-19",
+    # 2022
+    "2022-01-26", "2022-03-01", "2022-03-18", "2022-04-14", "2022-04-15", "2022-05-03",
+    "2022-08-09", "2022-08-15", "2022-08-31", "2022-10-05", "2022-10-24", "2022-10-26",
+    "2022-11-08",
+    # 2023
+    "2023-01-26", "2023-03-07", "2023-03-30", "2023-04-04", "2023-04-07", "2023-04-14",
+    "2023-05-01", "2023-06-29", "2023-08-15", "2023-09-19", "2023-10-02", "2023-10-24",
+    "2023-11-14", "2023-11-27", "2023-12-25",
+    # 2024
+    "2024-01-22", "2024-01-26", "2024-03-08", "2024-03-25", "2024-03-29", "2024-04-11",
+    "2024-04-17", "2024-05-01", "2024-05-20", "2024-06-17", "2024-07-17", "2024-08-15",
+    "2024-10-02", "2024-11-01", "2024-11-15", "2024-11-20", "2024-12-25",
+    # 2025
+    "2025-02-26", "2025-03-14", "2025-03-31", "2025-04-10", "2025-04-14", "2025-04-18",
+    "2025-05-01", "2025-08-15", "2025-08-27", "2025-10-02", "2025-10-21", "2025-10-22",
+    "2025-11-05", "2025-12-25",
+    # 2026
+    "2026-01-15", "2026-01-26", "2026-03-03", "2026-03-26", "2026-03-31", "2026-04-03",
+    "2026-04-14", "2026-05-01", "2026-05-28", "2026-06-26", "2026-09-14", "2026-10-02",
+    "2026-10-20", "2026-11-10", "2026-11-24", "2026-12-25",
+}
+
+# ---- SPECIAL SESSIONS ----
+# Dates that trade outside the normal Mon-Fri 9:15-15:30 pattern (Muhurat trading,
+# Saturday budget / DR-drill sessions). Each maps to a list of (open, close) windows.
+SPECIAL_SESSIONS = {
+    "2020-02-01": [(SESSION_OPEN, SESSION_CLOSE)],
+    "2020-11-14": [(datetime.time(18, 15), datetime.time(19, 15))],
+    "2021-11-04": [(datetime.time(18, 15), datetime.time(19, 15))],
+    "2022-10-24": [(datetime.time(18, 15), datetime.time(19, 15))],
+    "2023-11-12": [(datetime.time(18, 15), datetime.time(19, 15))],
+    "2024-01-20": [(SESSION_OPEN, SESSION_CLOSE)],
+    "2024-03-02": [(datetime.time(9, 15), datetime.time(10, 0)), (datetime.time(11, 30), datetime.time(12, 30))],
+    "2024-11-01": [(datetime.time(18, 0), datetime.time(19, 0))],
+    "2025-02-01": [(SESSION_OPEN, SESSION_CLOSE)],
+    "2025-10-21": [(datetime.time(13, 45), datetime.time(14, 45))],
+}
+
+
+def _load_extra_holidays():
+    path = os.getenv("NSE_HOLIDAYS_FILE")
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r") as f:
+        return {line.strip() for line in f if line.strip() and not line.startswith("#")}
+
+
+HOLIDAYS = {datetime.date.fromisoformat(d) for d in NSE_HOLIDAYS | _load_extra_holidays()}
+SPECIAL = {datetime.date.fromisoformat(d): windows for d, windows in SPECIAL_SESSIONS.items()}
+COVERED_YEARS = range(min(d.year for d in HOLIDAYS), max(d.year for d in HOLIDAYS) + 1)
+_warned_years = set()
+
+
+def _check_covered(date):
+    if date.year not in COVERED_YEARS and date.year not in _warned_years:
+        _warned_years.add(date.year)
+        logging.error(f"NSE holiday calendar has no entries for {date.year} (covers {COVERED_YEARS.start}-"
+                      f"{COVERED_YEARS.stop - 1}); only weekends are treated as closed. Add the year to "
+                      f"trading_calendar.py or NSE_HOLIDAYS_FILE.")
+
+
+def session_windows(date):
+    """List of (open, close) IST datetimes for a date; empty when the exchange is shut"""
+    _check_covered(date)
+    if date in SPECIAL:
+        windows = SPECIAL[date]
+    elif date.weekday() >= 5 or date in HOLIDAYS:
+        return []
+    else:
+        windows = [(SESSION_OPEN, SESSION_CLOSE)]
+    return [(IST.localize(datetime.datetime.combine(date, o)), IST.localize(datetime.datetime.combine(date, c)))
+            for o, c in windows]
+
+
+def is_trading_day(date):
+    return bool(session_windows(date))
+
+
+def trading_days(start, end):
+    """All trading dates in [start, end]"""
+    days = []
+    curr = start
+    while curr <= end:
+        if is_trading_day(curr):
+            days.append(curr)
+        curr += datetime.timedelta(days=1)
+    return days
+
+
+def previous_trading_day(date):
+    """Latest trading date strictly before date"""
+    date -= datetime.timedelta(days=1)
+    while not is_trading_day(date):
+        date -= datetime.timedelta(days=1)
+    return date
+
+
+def trading_days_back(end, n):
+    """The n trading dates up to and including end (if end trades)"""
+    days = []
+    curr = end
+    while len(days) < n:
+        if is_trading_day(curr):
+            days.append(curr)
+        curr -= datetime.timedelta(days=1)
+    return days[::-1]
+
+
+@lru_cache(maxsize=4096)
+def expected_timestamps(date, bar_minutes=BAR_MINUTES):
+    """Start times of every bar the broker should return for date"""
+    stamps = []
+    for open_dt, close_dt in session_windows(date):
+        stamps.extend(pd.date_range(open_dt, close_dt, freq=f"{bar_minutes}min", inclusive='left'))
+    return pd.DatetimeIndex(stamps, name='timestamp').tz_convert(IST)
+
+
+def missing_ranges(date, present_index, until=None, bar_minutes=BAR_MINUTES):
+    """Contiguous runs of expected bars absent from present_index, as (first_bar, last_bar) pairs.
+
+    until limits the expectation to bars that have closed by then (for today's session).
+    """
+    expected = expected_timestamps(date, bar_minutes)
+    if until is not None:
+        expected = expected[expected + datetime.timedelta(minutes=bar_minutes) <= until]
+    if len(present_index):
+        expected = expected.difference(present_index.tz_convert(IST))
+    if expected.empty:
+        return []
+    # Break the run wherever consecutive missing bars are more than one bar apart
+    step = pd.Timedelta(minutes=bar_minutes)
+    breaks = (expected[1:] - expected[:-1]) != step
+    starts = [0] + [i + 1 for i, b in enumerate(breaks) if b]
+    ends = [i for i, b in enumerate(breaks) if b] + [len(expected) - 1]
+    return [(expected[s], expected[e]) for s, e in zip(starts, ends)]
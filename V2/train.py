@@ -1,8 +1,8 @@
 import datetime
-import time
 import pandas as pd
 import pyotp
-import ta
+import indicators
+import labeling
 import joblib
 from tqdm import tqdm
 from SmartApi import SmartConnect
@@ -10,6 +10,14 @@ from sklearn.ensemble import RandomForestClassifier
 import xgboost as xgb
 from dotenv import load_dotenv
 import os
+import numpy as np
+from labeling import label_grid, triple_barrier_labels, NO_LABEL, LABEL_DOWN, LABEL_FLAT, LABEL_UP
+from feature_store import save_version, open_version, versioned_name, dataset_version, source_digest
+from results_store import write_run
+from cv_search import run_search
+from model_registry import register_model
+from trading_calendar import trading_days
+from api_scheduler import scheduler
 
 # ----- CREDENTIALS -----
 load_dotenv()
@@ -17,6 +25,7 @@ API_KEY = os.getenv("API_KEY")
 USER_ID = os.getenv("USER_ID")
 PASSWORD = os.getenv("PASSWORD")
 TOTP_SECRET = os.getenv("TOTP_SECRET")
+SMARTAPI_ROOT = os.getenv("SMARTAPI_ROOT")  # e.g. http://127.0.0.1:8765 for V3/mock_smartapi.py
 
 
 # ----- CONFIG -----
@@ -29,12 +38,26 @@ START_DATE = datetime.date.today() - datetime.timedelta(days=30)
 FUTURE_WINDOW = 3
 THRESHOLD = 0.001  # 0.1% move
 MODEL_FILENAME = "xgb_intraday_model.pkl"
+MODEL_NAME = os.getenv("MODEL_NAME", "xgb_intraday")   # registry entry V2/livebot.py serves
+LABEL_NAMES = {LABEL_DOWN: "down", LABEL_FLAT: "flat", LABEL_UP: "up"}
+FEATURE_COLUMNS = ['rsi', 'macd', 'sma', 'returns']
+
+# ----- LABEL GRID CONFIG -----
+LABEL_HORIZONS = sorted({1, 3, 6, 12, FUTURE_WINDOW})
+LABEL_THRESHOLDS = sorted({0.0005, 0.001, 0.002, 0.005, THRESHOLD})
+# Triple-barrier labels use the target/stop the live bot reads (as fractions, like livebot.py)
+TARGET_PCT = float(os.getenv("TARGET_PCT", "0.003"))
+STOPLOSS_PCT = float(os.getenv("STOPLOSS_PCT", "0.002"))
+MAX_HOLDING_BARS = 12
+
+# "holdout" = single chronological split, "cv" = purged walk-forward hyperparameter search
+TRAIN_MODE = os.getenv("TRAIN_MODE", "holdout").lower()
 
 # ----- SmartAPI Login -----
 def create_session():
     totp = pyotp.TOTP(TOTP_SECRET).now()
-    obj = SmartConnect(api_key=API_KEY)
-    session = obj.generateSession(USER_ID, PASSWORD, totp)
+    obj = SmartConnect(api_key=API_KEY, root=SMARTAPI_ROOT)
+    session = scheduler.call('generateSession', obj.generateSession, USER_ID, PASSWORD, totp)
     return obj
 
 # ----- Fetch intraday data for 1 day -----
@@ -51,7 +74,7 @@ def fetch_day_candles(obj, date):
     }
 
     try:
-        candles = obj.getCandleData(params)['data']
+        candles = scheduler.call('getCandleData', obj.getCandleData, params)['data']
         df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         df['timestamp'] = pd.to_datetime(df['timestamp'])
         df.set_index('timestamp', inplace=True)
@@ -61,93 +84,168 @@ def fetch_day_candles(obj, date):
 
 # ----- Generate all past trading days (excluding weekends) -----
 def get_trading_days(start, end):
-    days = []
-    curr = start
-    while curr <= end:
-        if curr.weekday() < 5:  # Mon–Fri
-            days.append(curr)
-        curr += datetime.timedelta(days=1)
-    return days
+    # NSE calendar: skips weekends and exchange holidays, keeps special sessions
+    return trading_days(start, end)
 
 # ----- Feature Engineering -----
 def add_features(df):
-    df['rsi'] = ta.momentum.RSIIndicator(df['close']).rsi()
-    df['macd'] = ta.trend.MACD(df['close']).macd()
-    df['sma'] = ta.trend.SMAIndicator(df['close'], window=10).sma_indicator()
+    close = df['close'].to_numpy(dtype=float)
+    df['rsi'] = indicators.rsi(close)
+    df['macd'] = indicators.macd(close)
+    df['sma'] = indicators.sma(close, 10)
     df['returns'] = df['close'].pct_change()
     df.dropna(inplace=True)
     return df
 
-# ----- Labeling -----
-def label_data_intraday(df, future_window=3, threshold=0.001):
-    df['future_price'] = df['close'].shift(-future_window)
-    df['future_return'] = (df['future_price'] - df['close']) / df['close']
-    df['label'] = 1
-    df.loc[df['future_return'] > threshold, 'label'] = 2
-    df.loc[df['future_return'] < -threshold, 'label'] = 0
-    df.dropna(inplace=True)
-    return df
-
-
-# ----- MAIN -----
-def main():
-    print("🔐 Logging into SmartAPI...")
-    obj = create_session()
-
-    print(f"📦 Collecting 5-min {SYMBOL} data for 365 trading days...")
-    trading_days = get_trading_days(START_DATE, datetime.date.today())
-
-    all_data = []
-
-    for date in tqdm(trading_days):
-        df = fetch_day_candles(obj, date)
-        if not df.empty:
-            all_data.append(df)
-        time.sleep(1.1)  # avoid rate limits
-
-    full_df = pd.concat(all_data)
-    print("✅ Data shape:", full_df.shape)
+# ----- Label grid + triple barrier, saved to the feature store -----
+def dataset_spec(start, end):
+    """Everything the label store is built from; its hash is the dataset version"""
+    return {
+        'symbol': SYMBOL,
+        'token': SYMBOL_TOKEN,
+        'interval': INTERVAL,
+        'start': str(start),
+        'end': str(end),
+        'feature_columns': FEATURE_COLUMNS,
+        'horizons': LABEL_HORIZONS,
+        'thresholds': LABEL_THRESHOLDS,
+        'target_pct': TARGET_PCT,
+        'stoploss_pct': STOPLOSS_PCT,
+        'max_holding_bars': MAX_HOLDING_BARS,
+        'code': source_digest(add_features, build_label_store, indicators, labeling),
+    }
 
-    print("🧠 Adding features...")
-    full_df = add_features(full_df)
 
-    print("🏷️ Labeling...")
-    full_df = label_data_intraday(full_df, FUTURE_WINDOW, THRESHOLD)
-    full_df.to_csv("csv2.csv")
-    
-    print("🎯 Training XGBoost model...")
-
-    full_df = full_df.sample(frac=1, random_state=42).reset_index(drop=True)
-
-    # Split data
-    from sklearn.model_selection import train_test_split
-    X = full_df[['rsi', 'macd', 'sma', 'returns']]
-    y = full_df['label']
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
-
-    # Train model
-    model = xgb.XGBClassifier(
-        n_estimators=100,
-        max_depth=4,
-        learning_rate=0.1,
-        objective='multi:softmax',
-        num_class=3,
-        use_label_encoder=False,
-        eval_metric='mlogloss'
+def build_label_store(df, spec):
+    close = df['close'].to_numpy(dtype=np.float64)
+    sessions = df.index.normalize().asi8
+    grid = label_grid(close, LABEL_HORIZONS, LABEL_THRESHOLDS)
+    tb_labels, tb_exit_offset, tb_exit_return = triple_barrier_labels(
+        close, TARGET_PCT, STOPLOSS_PCT, MAX_HOLDING_BARS, session_ids=sessions
     )
-    model.fit(X_train, y_train)
+    meta = {
+        'symbol': SYMBOL,
+        'interval': INTERVAL,
+        'start': str(df.index[0]),
+        'end': str(df.index[-1]),
+        'feature_columns': FEATURE_COLUMNS,
+        'horizons': LABEL_HORIZONS,
+        'thresholds': LABEL_THRESHOLDS,
+        'target_pct': TARGET_PCT,
+        'stoploss_pct': STOPLOSS_PCT,
+        'max_holding_bars': MAX_HOLDING_BARS,
+    }
+    save_version(f"{SYMBOL}_labels", spec, {
+        'timestamp': df.index.asi8,
+        'features': df[FEATURE_COLUMNS].to_numpy(dtype=np.float64),
+        'close': close,
+        'label_grid': grid,
+        'tb_label': tb_labels,
+        'tb_exit_offset': tb_exit_offset,
+        'tb_exit_return': tb_exit_return,
+    }, meta)
+    return grid
 
-    # Evaluate
-    print("📊 Accuracy on holdout set:", model.score(X_test, y_test))
 
-    # Save model
-    joblib.dump(model, MODEL_FILENAME)
-    print(f"✅ Model saved as {MODEL_FILENAME}")
-    print("🚀 Ready for live trading!")
+# ----- MAIN -----
+def main():
+    # Training label = the (FUTURE_WINDOW, THRESHOLD) slice of the label grid
+    horizon_idx = LABEL_HORIZONS.index(FUTURE_WINDOW)
+    threshold_idx = LABEL_THRESHOLDS.index(THRESHOLD)
+    spec = dataset_spec(START_DATE, datetime.date.today())
+    store_name = versioned_name(f"{SYMBOL}_labels", dataset_version(spec))
+    stored = open_version(f"{SYMBOL}_labels", spec, keys=['features', 'label_grid'])
+
+    if stored is not None:
+        print(f"♻️ Reusing dataset {store_name} (no download, no feature rebuild)")
+    else:
+        print("🔐 Logging into SmartAPI...")
+        obj = create_session()
+
+        print(f"📦 Collecting 5-min {SYMBOL} data for 365 trading days...")
+        trading_days = get_trading_days(START_DATE, datetime.date.today())
+
+        all_data = []
+
+        for date in tqdm(trading_days):
+            df = fetch_day_candles(obj, date)
+            if not df.empty:
+                all_data.append(df)
+
+        full_df = pd.concat(all_data)
+        print("✅ Data shape:", full_df.shape)
+
+        print("🧠 Adding features...")
+        full_df = add_features(full_df)
+
+        print("🏷️ Labeling...")
+        grid = build_label_store(full_df, spec)
+        print(f"💾 Stored {len(LABEL_HORIZONS)}x{len(LABEL_THRESHOLDS)} label grid + triple-barrier labels as {store_name}")
+        full_df['label'] = grid[:, horizon_idx, threshold_idx]
+        full_df = full_df[full_df['label'] != NO_LABEL]
+        # Columnar training set with its labelling params; dtypes and the IST index survive a round trip
+        write_run(full_df, "training_data", f"{SYMBOL}_{START_DATE:%Y%m%d}_{datetime.date.today():%Y%m%d}",
+                  params={'symbol': SYMBOL, 'token': SYMBOL_TOKEN, 'interval': INTERVAL, 'future_window': FUTURE_WINDOW,
+                          'threshold': THRESHOLD, 'target_pct': TARGET_PCT, 'stoploss_pct': STOPLOSS_PCT,
+                          'features': FEATURE_COLUMNS, 'dataset': store_name},
+                  start=full_df.index[0], end=full_df.index[-1], index=True)
+        stored = open_version(f"{SYMBOL}_labels", spec, keys=['features', 'label_grid'])
 
+    print("🎯 Training XGBoost model...")
 
+    # Memory-mapped matrices: unlabelled rows are only the trailing look-ahead bars,
+    # so a prefix slice keeps X a view of the mapped pages instead of a copy
+    arrays, _ = stored
+    labels = arrays['label_grid'][:, horizon_idx, threshold_idx]
+    n = int(np.argmax(labels == NO_LABEL)) if (labels == NO_LABEL).any() else len(labels)
+    X = pd.DataFrame(arrays['features'][:n], columns=FEATURE_COLUMNS, copy=False)
+    y = labels[:n]
+
+    if TRAIN_MODE == "cv":
+        best_params, best_rounds, cv_results = run_search(store_name, FUTURE_WINDOW, horizon_idx, threshold_idx)
+        cv_scores = pd.DataFrame(cv_results, columns=['candidate', 'fold', 'logloss', 'accuracy', 'rounds'])
+        cv_scores = cv_scores.groupby('candidate')[['logloss', 'accuracy']].mean()
+        best = cv_scores['logloss'].idxmin()
+        metrics = {'cv_logloss': float(cv_scores.loc[best, 'logloss']), 'cv_accuracy': float(cv_scores.loc[best, 'accuracy'])}
+        params = {**best_params, 'n_estimators': best_rounds}
+        model = xgb.XGBClassifier(
+            n_estimators=best_rounds,
+            objective='multi:softmax',
+            num_class=3,
+            eval_metric='mlogloss',
+            tree_method='hist',
+            **best_params
+        )
+        model.fit(X, y)
+    else:
+        # Chronological split: the test set is strictly after the training bars
+        from sklearn.model_selection import train_test_split
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+
+        # Train model
+        model = xgb.XGBClassifier(
+            n_estimators=100,
+            max_depth=4,
+            learning_rate=0.1,
+            objective='multi:softmax',
+            num_class=3,
+            use_label_encoder=False,
+            eval_metric='mlogloss'
+        )
+        model.fit(X_train, y_train)
+
+        # Evaluate
+        accuracy = model.score(X_test, y_test)
+        print("📊 Accuracy on holdout set:", accuracy)
+        metrics = {'holdout_accuracy': float(accuracy)}
+        params = {'n_estimators': 100, 'max_depth': 4, 'learning_rate': 0.1}
+
+    # Save model: the plain pickle for incremental_train, a registry version for the live bot
     joblib.dump(model, MODEL_FILENAME)
-    print(f"✅ Model saved as {MODEL_FILENAME}")
+    version = register_model(model, MODEL_NAME, FEATURE_COLUMNS, LABEL_NAMES, feature_set=store_name,
+                             metrics=metrics, params={**params, 'train_mode': TRAIN_MODE,
+                                                      'future_window': FUTURE_WINDOW, 'threshold': THRESHOLD})
+    print(f"✅ Model saved as {MODEL_FILENAME} and registered as {MODEL_NAME} {version}")
     print("🚀 Ready for live trading!")
 
 if __name__ == "__main__":
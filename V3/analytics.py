@@ -0,0 +1,142 @@
+import sys
+import numpy as np
+import pandas as pd
+from results_store import load_run
+
+IST_OFFSET_NS = np.int64(int(5.5 * 3600 * 1e9))
+TRADING_DAYS_PER_YEAR = 252
+
+
+def load_trade_log(path):
+    """Load a BUY/SELL/pnl trade log into per-trade numpy arrays.
+
+    Rows are expected as alternating BUY then SELL for a long-only strategy, the
+    format written by the V3 backtest. A trailing unmatched BUY (open position) is dropped.
+    An optional 'reason' column provides exit reasons. path may be a CSV or a results_store run.
+    """
+    df = load_run(path)
+    return trades_from_frame(df)
+
+
+def trades_from_frame(df):
+    """Pair BUY/SELL rows of a trade-log frame into entry/exit arrays"""
+    actions = df['action'].to_numpy()
+    entries = np.flatnonzero(actions == 'BUY')
+    exits = np.flatnonzero(actions == 'SELL')
+    n = min(len(entries), len(exits))
+    entries, exits = entries[:n], exits[:n]
+    if n and not (exits > entries).all():
+        raise ValueError("Trade log is not in BUY -> SELL order")
+
+    timestamps = pd.DatetimeIndex(pd.to_datetime(df['timestamp'], utc=True, format='ISO8601')).asi8
+    prices = df['price'].to_numpy(dtype=np.float64)
+    trades = {
+        'entry_time': timestamps[entries],
+        'exit_time': timestamps[exits],
+        'entry_price': prices[entries],
+        'exit_price': prices[exits],
+        'pnl': df['pnl'].to_numpy(dtype=np.float64)[exits],
+    }
+    if 'reason' in df.columns:
+        trades['reason'] = df['reason'].to_numpy(dtype=object)[exits].astype(str)
+    return trades
+
+
+def _group_sums(keys, pnl):
+    """Count, total and winning trades of pnl grouped by keys"""
+    labels, inverse = np.unique(keys, return_inverse=True)
+    return pd.DataFrame({
+        'trades': np.bincount(inverse),
+        'total_pnl': np.bincount(inverse, weights=pnl),
+        'winning_trades': np.bincount(inverse, weights=pnl > 0).astype(np.int64),
+    }, index=labels)
+
+
+def daily_pnl_array(exit_time, pnl):
+    """P&L per IST business day between the first and last exit; days without trades are 0"""
+    exit_days = ((exit_time + IST_OFFSET_NS) // np.int64(86_400 * 10**9)).astype('datetime64[D]')
+    all_days = np.arange(exit_days.min(), exit_days.max() + np.timedelta64(1, 'D'))
+    all_days = all_days[np.is_busday(all_days)]
+    return np.bincount(np.searchsorted(all_days, exit_days), weights=pnl, minlength=len(all_days))
+
+
+def compute_metrics(trades):
+    """Compute summary metrics and breakdowns for a set of trades in one vectorized pass"""
+    exit_time = trades['exit_time']
+    # Backtest logs are already chronological; only sort merged sweep outputs
+    if len(exit_time) and (np.diff(exit_time) >= 0).all():
+        order = slice(None)
+    else:
+        order = np.argsort(exit_time, kind='stable')
+    pnl = trades['pnl'][order]
+    entry_time = trades['entry_time'][order]
+    exit_time = trades['exit_time'][order]
+    n = len(pnl)
+    if n == 0:
+        return {'total_trades': 0}, {}
+
+    # ---- EQUITY & DRAWDOWN ----
+    equity = np.cumsum(pnl)
+    curve = np.concatenate(([0.0], equity))
+    peaks = np.maximum.accumulate(curve)
+    drawdown = curve - peaks
+    curve_time = np.concatenate(([entry_time.min()], exit_time))
+    positions = np.arange(n + 1)
+    last_peak = np.maximum.accumulate(np.where(curve >= peaks, positions, 0))
+    dd_duration_ns = curve_time - curve_time[last_peak]
+
+    # ---- TRADE STATS ----
+    wins = pnl > 0
+    gross_profit = pnl[wins].sum()
+    gross_loss = -pnl[pnl < 0].sum()
+    pnl_std = pnl.std(ddof=1) if n > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(pnl, 0.0) ** 2))
+
+    daily_pnl = daily_pnl_array(exit_time, pnl)
+    daily_std = daily_pnl.std(ddof=1) if len(daily_pnl) > 1 else 0.0
+    daily_downside = np.sqrt(np.mean(np.minimum(daily_pnl, 0.0) ** 2))
+
+    span_ns = exit_time.max() - entry_time.min()
+    metrics = {
+        'total_pnl': round(float(equity[-1]), 2),
+        'total_trades': int(n),
+        'winning_trades': int(wins.sum()),
+        'win_rate': round(float(wins.mean() * 100), 2),
+        'avg_pnl': round(float(pnl.mean()), 2),
+        'sharpe_ratio': round(float(pnl.mean() / pnl_std), 2) if pnl_std else 0.0,
+        'sortino_ratio': round(float(pnl.mean() / downside), 2) if downside else 0.0,
+        'annual_sharpe': round(float(daily_pnl.mean() / daily_std * np.sqrt(TRADING_DAYS_PER_YEAR)), 2) if daily_std else 0.0,
+        'annual_sortino': round(float(daily_pnl.mean() / daily_downside * np.sqrt(TRADING_DAYS_PER_YEAR)), 2) if daily_downside else 0.0,
+        'profit_factor': round(float(gross_profit / gross_loss), 2) if gross_loss else float('inf'),
+        'max_drawdown': round(float(drawdown.min()), 2),
+        'max_drawdown_duration_days': round(float(dd_duration_ns.max() / (86_400 * 1e9)), 1),
+        'exposure_pct': round(float((exit_time - entry_time).astype(np.float64).sum() / span_ns * 100), 2) if span_ns else 0.0,
+    }
+
+    months = ((exit_time + IST_OFFSET_NS).astype('datetime64[ns]')).astype('datetime64[M]')
+    breakdowns = {
+        'equity_curve': pd.Series(equity, index=pd.DatetimeIndex(exit_time.view('datetime64[ns]'), tz='UTC').tz_convert('Asia/Kolkata')),
+        'by_month': _group_sums(months, pnl),
+    }
+    if 'reason' in trades:
+        breakdowns['by_exit_reason'] = _group_sums(trades['reason'][order], pnl)
+    for table in breakdowns.values():
+        if isinstance(table, pd.DataFrame):
+            table['win_rate'] = (table['winning_trades'] / table['trades'] * 100).round(2)
+    return metrics, breakdowns
+
+
+def print_report(metrics, breakdowns):
+    print("  BACKTEST RESULTS:")
+    for key, value in metrics.items():
+        print(f"  {key}: {value}")
+    for name in ('by_exit_reason', 'by_month'):
+        if name in breakdowns:
+            print(f"\n  {name.upper()}:")
+            print(breakdowns[name].to_string())
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "backtest_results_20200101_20250101.csv"
+    metrics, breakdowns = compute_metrics(load_trade_log(path))
+    print_report(metrics, breakdowns)
@@ -0,0 +1,83 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from ta.trend import EMAIndicator, SMAIndicator, MACD, ADXIndicator
+from ta.momentum import RSIIndicator
+import indicators
+
+BARS_PER_DAY = 75
+TRADING_DAYS_PER_YEAR = 252
+YEARS = 5
+TOLERANCE = 1e-6
+
+
+def synthetic_bars(n_symbols, n_bars, seed=7):
+    """Random-walk OHLC for n_symbols x n_bars"""
+    rng = np.random.default_rng(seed)
+    close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.002, (n_symbols, n_bars)), axis=1))
+    open_ = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    high = np.maximum(open_, close) * (1 + rng.random((n_symbols, n_bars)) * 0.002)
+    low = np.minimum(open_, close) * (1 - rng.random((n_symbols, n_bars)) * 0.002)
+    return high, low, close
+
+
+def run_ta(high, low, close):
+    out = {}
+    h, l, c = pd.Series(high), pd.Series(low), pd.Series(close)
+    for window in (5, 20, 50, 200):
+        out[f'ema{window}'] = EMAIndicator(c, window=window).ema_indicator().to_numpy()
+    out['sma10'] = SMAIndicator(c, window=10).sma_indicator().to_numpy()
+    out['rsi14'] = RSIIndicator(c, window=14).rsi().to_numpy()
+    out['macd'] = MACD(c).macd().to_numpy()
+    adx = ADXIndicator(h, l, c, window=14)
+    out['adx14'], out['di_plus'], out['di_minus'] = adx.adx().to_numpy(), adx.adx_pos().to_numpy(), adx.adx_neg().to_numpy()
+    return out
+
+
+def run_library(high, low, close):
+    out = {}
+    for window in (5, 20, 50, 200):
+        out[f'ema{window}'] = indicators.ema(close, window)
+    out['sma10'] = indicators.sma(close, 10)
+    out['rsi14'] = indicators.rsi(close, 14)
+    out['macd'] = indicators.macd(close)
+    out['adx14'], out['di_plus'], out['di_minus'] = indicators.adx(high, low, close, 14)
+    return out
+
+
+def max_relative_error(a, b):
+    both = ~np.isnan(a) & ~np.isnan(b)
+    if (np.isnan(a) != np.isnan(b)).any():
+        return np.inf
+    return float(np.max(np.abs(a[both] - b[both]) / np.maximum(np.abs(b[both]), 1.0), initial=0.0))
+
+
+if __name__ == "__main__":
+    # python bench_indicators.py [n_symbols] [n_symbols_checked_against_ta]
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_checked = min(n_symbols, int(sys.argv[2]) if len(sys.argv) > 2 else 2)
+    n_bars = YEARS * TRADING_DAYS_PER_YEAR * BARS_PER_DAY
+    high, low, close = synthetic_bars(n_symbols, n_bars)
+    print(f"📐 {n_symbols} symbols x {n_bars} bars ({YEARS}y of 5-min), numba: {indicators.numba is not None}")
+
+    # ta is timed on a few symbols and scaled up; its ADX loops in Python per bar
+    start = time.perf_counter()
+    reference = [run_ta(high[i], low[i], close[i]) for i in range(n_checked)]
+    ta_secs = (time.perf_counter() - start) / n_checked * n_symbols
+
+    run_library(high[:1, :BARS_PER_DAY * 10], low[:1, :BARS_PER_DAY * 10], close[:1, :BARS_PER_DAY * 10])  # JIT warm-up
+    start = time.perf_counter()
+    batched = run_library(high, low, close)
+    lib_secs = time.perf_counter() - start
+
+    print(f"  ta (per symbol)      {ta_secs:8.2f}s")
+    print(f"  indicators (batched) {lib_secs:8.2f}s")
+    print(f"  speedup              {ta_secs / lib_secs:8.1f}x")
+
+    worst = {name: max(max_relative_error(batched[name][i], reference[i][name]) for i in range(n_checked))
+             for name in batched}
+    for name, err in worst.items():
+        print(f"  {name:<9} max rel err {err:.2e} {'✅' if err <= TOLERANCE else '❌'}")
+    if max(worst.values()) > TOLERANCE:
+        sys.exit(1)
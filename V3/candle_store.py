@@ -0,0 +1,147 @@
+import os
+import json
+import datetime
+import logging
+import pandas as pd
+from trading_calendar import IST, BAR_MINUTES, expected_timestamps, missing_ranges, trading_days
+
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", "candle_store")
+GAP_INDEX_FILE = "gaps.json"
+
+
+class CandleStore:
+    """Local 5-minute candles, one pickle per token per session, plus an index of gaps.
+
+    The gap index records which sessions are complete and which bar ranges are still
+    missing, so fetchers ask the broker for real sessions and missing bars only.
+    """
+
+    def __init__(self, root=CANDLE_STORE_DIR, bar_minutes=BAR_MINUTES):
+        self.root = root
+        self.bar_minutes = bar_minutes
+
+    def _token_dir(self, token):
+        return os.path.join(self.root, str(token))
+
+    def _day_path(self, token, date):
+        return os.path.join(self._token_dir(token), f"{date.isoformat()}.pkl")
+
+    # ---- CANDLES ----
+    def load_day(self, token, date):
+        path = self._day_path(token, date)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_pickle(path)
+
+    def load(self, token, start, end):
+        """All stored candles for token between two dates, IST-indexed and sorted"""
+        frames = [self.load_day(token, d) for d in trading_days(start, end)]
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames).sort_index()
+
+    def save_day(self, token, date, df):
+        """Merge candles for one session into the store (newer values win) and refresh its gap entry"""
+        if df.empty:
+            return self.load_day(token, date)
+        os.makedirs(self._token_dir(token), exist_ok=True)
+        df = df.copy()
+        df.index = df.index.tz_convert(IST)
+        # A bar that is still forming would otherwise be stored with partial values for good
+        now = datetime.datetime.now(IST)
+        df = df[df.index + datetime.timedelta(minutes=self.bar_minutes) <= now]
+        existing = self.load_day(token, date)
+        merged = pd.concat([existing, df]) if not existing.empty else df
+        merged = merged.sort_index()
+        merged = merged[~merged.index.duplicated(keep='last')]
+        # Only keep bars belonging to the exchange session grid
+        merged = merged[merged.index.isin(expected_timestamps(date, self.bar_minutes))]
+
+        path = self._day_path(token, date)
+        merged.to_pickle(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        self._update_gap_index(token, date, merged.index)
+        return merged
+
+    # ---- GAP INDEX ----
+    def _load_gap_index(self, token):
+        path = os.path.join(self._token_dir(token), GAP_INDEX_FILE)
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_gap_index(self, token, index):
+        os.makedirs(self._token_dir(token), exist_ok=True)
+        path = os.path.join(self._token_dir(token), GAP_INDEX_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+
+    def mark_fetched(self, token, date):
+        """Record that the broker was asked for every gap of a closed session"""
+        self._update_gap_index(token, date, self.load_day(token, date).index, fetched=True)
+
+    def _update_gap_index(self, token, date, present_index, fetched=False):
+        index = self._load_gap_index(token)
+        gaps = missing_ranges(date, present_index, bar_minutes=self.bar_minutes)
+        index[date.isoformat()] = {
+            'missing': [[a.isoformat(), b.isoformat()] for a, b in gaps],
+            # Set once the broker has been asked for the gaps of a closed session;
+            # bars still missing after that simply never traded, so stop asking
+            'fetched': fetched or index.get(date.isoformat(), {}).get('fetched', False),
+        }
+        self._write_gap_index(token, index)
+
+    def gaps(self, token, start, end, now=None):
+        """{date: [(first_missing_bar, last_missing_bar), ...]} for sessions in [start, end].
+
+        Sessions the index marks complete are skipped without touching their files;
+        today's session only expects bars that have closed by now.
+        """
+        now = now or datetime.datetime.now(IST)
+        index = self._load_gap_index(token)
+        result = {}
+        for date in trading_days(start, end):
+            key = date.isoformat()
+            if date == now.date():
+                ranges = missing_ranges(date, self.load_day(token, date).index, until=now, bar_minutes=self.bar_minutes)
+            elif key in index:
+                if index[key]['fetched']:
+                    continue
+                ranges = [(pd.Timestamp(a), pd.Timestamp(b)) for a, b in index[key]['missing']]
+            else:
+                ranges = missing_ranges(date, self.load_day(token, date).index, bar_minutes=self.bar_minutes)
+            if ranges:
+                result[date] = ranges
+        return result
+
+    def fill_gaps(self, token, start, end, fetch_range, now=None):
+        """Call fetch_range(start, end) for each missing run and store what comes back.
+
+        fetch_range returns None when the request failed, an empty frame when the broker
+        has no bars for the range. A closed session is marked fetched only when every one
+        of its requests got an answer, so a failed one is asked for again next time.
+        Returns the number of broker requests made.
+        """
+        now = now or datetime.datetime.now(IST)
+        requests = 0
+        bar = datetime.timedelta(minutes=self.bar_minutes)
+        for date, ranges in self.gaps(token, start, end, now).items():
+            answered = True
+            for first_bar, last_bar in ranges:
+                df = fetch_range(first_bar, last_bar + bar)
+                requests += 1
+                if df is None:
+                    answered = False
+                    logging.warning(f"Fetch failed for {token} {first_bar} - {last_bar}; gap kept for the next run")
+                    continue
+                if df.empty:
+                    logging.info(f"No candles returned for {token} {first_bar} - {last_bar}")
+                    continue
+                self.save_day(token, date, df)
+            if date < now.date() and answered:
+                self.mark_fetched(token, date)
+        return requests
@@ -1,24 +1,30 @@
 import time
+import math
 import datetime
+import asyncio
+import threading
 import pandas as pd
 import pyotp
-import ta
-from ta.trend import EMAIndicator, ADXIndicator
-from ta.momentum import RSIIndicator
 from SmartApi import SmartConnect
 import pytz
 import logging 
+from log_pipeline import setup_logging
 import os
 from dotenv import load_dotenv
+from state_snapshot import save_snapshot, load_snapshot
+from resampler import BarResampler, align_to_base
+from trading_calendar import session_windows, is_trading_day, previous_trading_day, trading_days_back
+from candle_store import CandleStore
+from paper_broker import PaperBroker
+from strategy_dsl import EMA_RSI_STRATEGY, compile_strategy
+import indicators
+from bus_client import BusClient, MARKET_DATA_BUS
+from api_scheduler import scheduler
+from resilient_fetch import candle_fetcher, fetch_candle_rows
+from position_monitor import PositionMonitor, fetch_ltp, ltp_min_interval
+from protective_orders import ProtectiveOrders, PROTECTIVE_ORDERS
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s',
-    handlers=[
-        logging.FileHandler("live_trading_log.log"),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()  # queue-backed: file/console writes happen off the trading loop
 
 PAPER_TRADE = False
 
@@ -28,6 +34,7 @@ API_KEY = os.getenv("API_KEY")
 USER_ID = os.getenv("USER_ID")
 PASSWORD = os.getenv("PASSWORD")
 TOTP_SECRET = os.getenv("TOTP_SECRET")
+SMARTAPI_ROOT = os.getenv("SMARTAPI_ROOT")  # e.g. http://127.0.0.1:8765 for mock_smartapi.py
 
 # ---- TRADE CONFIG ----
 # SYMBOLS = [('HINDUNILVR-EQ','1394')]  # Using same as backtest
@@ -57,6 +64,24 @@ if not all(required_vars):
 TARGET_PROFIT_PCT = 1.8
 STOP_LOSS_PCT = 0.5
 MAX_DAILY_TRADES = 2
+# Entry/exit rules live in strategy_dsl so the backtest evaluates the same definition
+STRATEGY = compile_strategy(EMA_RSI_STRATEGY, target_pct=TARGET_PROFIT_PCT, stop_pct=STOP_LOSS_PCT,
+                            max_daily_trades=MAX_DAILY_TRADES)
+
+# ---- ASYNC LOOP CONFIG ----
+ASYNC_LOOP = os.getenv("ASYNC_LOOP", "False").lower() == "true"
+SESSION_CHECK_INTERVAL = 240  # seconds between background session checks
+
+# ---- SNAPSHOT CONFIG ----
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "bot_state.snapshot")
+CANDLE_BUFFER_DAYS = 5  # same window the loop used to re-download every cycle
+
+# ---- HIGHER TIMEFRAME CONFIG ----
+HTF_EMA_TIMEFRAMES = [15, 60]  # minutes; adds ema200_15m / ema200_60m to the features
+HTF_EMA_WINDOW = 200
+# Sessions of stored 5-minute history replayed into the resampler on a cold start, so the
+# slowest timeframe already has HTF_EMA_WINDOW bars (a session makes ceil(375 / tf) of them)
+HTF_SEED_DAYS = math.ceil(HTF_EMA_WINDOW / math.ceil(375 / max(HTF_EMA_TIMEFRAMES))) + 1
 
 # ---- STATE ----
 in_position = False
@@ -67,6 +92,16 @@ prev_ema5 = None
 prev_ema20 = None
 prev_close = None
 last_reset_date = None
+candle_buffer = pd.DataFrame()
+mtf_bars = BarResampler()
+htf_seeded = False
+candle_store = CandleStore()
+paper_broker = PaperBroker() if PAPER_TRADE else None
+bus = None  # BusClient when MARKET_DATA_BUS is set
+monitor = None  # PositionMonitor exiting on LTP between candles
+position_lock = threading.RLock()  # the bar loop and the LTP monitor both change the position
+protection = None  # ProtectiveOrders: stop/target legs resting at the exchange (live orders only)
+restored_protective_orders = {}
 
 def safety_stop_triggered():
     try:
@@ -77,41 +112,212 @@ def safety_stop_triggered():
 
 def create_session():
     totp = pyotp.TOTP(TOTP_SECRET).now()
-    obj = SmartConnect(api_key=API_KEY)
-    session = obj.generateSession(USER_ID, PASSWORD, totp)
+    obj = SmartConnect(api_key=API_KEY, root=SMARTAPI_ROOT)
+    session = scheduler.call('generateSession', obj.generateSession, USER_ID, PASSWORD, totp)
     refresh_token = session['data']['refreshToken']
     return obj, refresh_token
 
 def fetch_accumulated_data(obj, current_date, symbol, token, days_back=25):
-    """Fetch accumulated data for proper EMA calculation - same as backtest"""
-    all_data = []
-    successful_days = 0
-    
-    for i in range(days_back, -1, -1):
-        date = current_date - datetime.timedelta(days=i)
-        if date.weekday() >= 5:  # Skip weekends
-            continue
-            
-        logging.info(f"Fetching data for {date.strftime('%Y-%m-%d')} {symbol}...")
-        df_day = fetch_intraday_data(obj, date, symbol, token)
-        if not df_day.empty:
-            all_data.append(df_day)
-            successful_days += 1
-            logging.info(f"{len(df_day)} candles")
-        else:
-            logging.info("No data")
-        
-        time.sleep(0.5)
+    """Fetch accumulated data for proper EMA calculation - same as backtest.
+
+    Closed sessions come from the local candle store, which only asks the broker
+    for bars it is missing; holidays and weekends are never requested.
+    """
+    start = current_date - datetime.timedelta(days=days_back)
+    last_closed = previous_trading_day(current_date)
+
+    def fetch_range(start_time, end_time):
+        logging.info(f"Fetching {symbol} {start_time.strftime('%Y-%m-%d %H:%M')} - {end_time.strftime('%H:%M')}...")
+        return fetch_candle_range(obj, symbol, token, start_time, end_time)
+
+    requests = candle_store.fill_gaps(token, start, last_closed, fetch_range) if start <= last_closed else 0
+    all_data = [candle_store.load(token, start, last_closed)]
+    if is_trading_day(current_date):
+        logging.info(f"Fetching data for {current_date.strftime('%Y-%m-%d')} {symbol}...")
+        all_data.append(fetch_intraday_data(obj, current_date, symbol, token))
+    all_data = [df for df in all_data if not df.empty]
     
     if not all_data:
         return pd.DataFrame()
     
     combined_df = pd.concat(all_data, axis=0)
     combined_df = combined_df.sort_index()
-    combined_df = combined_df[~combined_df.index.duplicated(keep='first')]
+    combined_df = combined_df[~combined_df.index.duplicated(keep='last')]
     
-    logging.info(f"Total accumulated: {len(combined_df)} candles from {successful_days} days")
+    logging.info(f"Total accumulated: {len(combined_df)} candles ({requests} gap requests to broker)")
     return combined_df
+
+def merge_candles(buffer, new_df, current_date, days_back=CANDLE_BUFFER_DAYS):
+    """Merge fresh candles into the buffer (newest wins) and keep only the last days_back days"""
+    combined = pd.concat([buffer, new_df]) if not buffer.empty else new_df
+    if combined.empty:
+        return combined
+    combined = combined.sort_index()
+    combined = combined[~combined.index.duplicated(keep='last')]
+    cutoff = current_date - datetime.timedelta(days=days_back)
+    return combined[combined.index.date >= cutoff]
+
+def candle_buffer_is_warm(current_date):
+    """True if the buffer has enough history and no trading session missing before today"""
+    if len(candle_buffer) < 200:
+        return False
+    day = candle_buffer.index[-1].date() + datetime.timedelta(days=1)
+    while day < current_date:
+        if is_trading_day(day):
+            return False
+        day += datetime.timedelta(days=1)
+    return True
+
+def connect_bus(symbol, token):
+    """Take candles from the market-data bus instead of the broker when one is configured"""
+    global bus
+    if MARKET_DATA_BUS:
+        bus = BusClient()
+        bus.subscribe(symbol, token)
+
+def fetch_from_bus(symbol):
+    df = bus.latest(symbol)
+    return df[['open', 'high', 'low', 'close', 'volume']] if not df.empty else df
+
+def refresh_candle_buffer(obj, current_date, symbol, token):
+    """Full fetch on a cold start, otherwise only today's session is re-fetched"""
+    global candle_buffer
+    if bus is not None:
+        new_df = fetch_from_bus(symbol)
+    elif candle_buffer_is_warm(current_date):
+        new_df = fetch_intraday_data(obj, current_date, symbol, token)
+    else:
+        new_df = fetch_accumulated_data(obj, current_date, symbol, token, days_back=CANDLE_BUFFER_DAYS)
+    candle_buffer = merge_candles(candle_buffer, new_df, current_date)
+    seed_resampler(obj, current_date, symbol, token)
+    feed_resampler()
+    feed_paper_broker()
+    return candle_buffer.copy()
+
+def htf_ready(resampler):
+    return all(len(resampler.bars[tf]) >= HTF_EMA_WINDOW for tf in HTF_EMA_TIMEFRAMES)
+
+def seed_resampler(obj, current_date, symbol, token):
+    """Rebuild the resampler from HTF_SEED_DAYS stored sessions once per run if its EMAs can't be computed yet.
+
+    The candle buffer only spans CANDLE_BUFFER_DAYS, far less than 200 hourly bars; the
+    candle store holds the rest (missing sessions are fetched once when a broker session
+    is available, as for the buffer).
+    """
+    global mtf_bars, htf_seeded
+    if htf_seeded:
+        return
+    htf_seeded = True
+    if htf_ready(mtf_bars):
+        return
+    last_closed = previous_trading_day(current_date)
+    start = trading_days_back(last_closed, HTF_SEED_DAYS)[0]
+    if obj is not None and bus is None:
+        fetch_range = lambda a, b: fetch_candle_range(obj, symbol, token, a, b)
+        try:
+            candle_store.fill_gaps(token, start, last_closed, fetch_range)
+        except Exception as e:
+            logging.warning(f"Could not fill candle history for the higher timeframes: {e}")
+    history = candle_store.load(token, start, last_closed)
+    resampler = BarResampler(max_bars=max(500, HTF_EMA_WINDOW + 50))
+    if not history.empty:
+        resampler.update_from_frame(history[['open', 'high', 'low', 'close', 'volume']])
+    mtf_bars = resampler
+    counts = {tf: len(resampler.bars[tf]) for tf in HTF_EMA_TIMEFRAMES}
+    logging.info(f"Higher-timeframe bars seeded from {len(history)} stored candles since {start}: {counts}")
+
+def feed_resampler():
+    """Pass newly closed 5-minute candles to the higher-timeframe resampler"""
+    if candle_buffer.empty:
+        return
+    now = datetime.datetime.now(pytz.timezone("Asia/Kolkata"))
+    closed = candle_buffer[candle_buffer.index + datetime.timedelta(minutes=5) <= now]
+    mtf_bars.update_from_frame(closed)
+
+def feed_paper_broker():
+    """Let the paper broker fill pending orders from candles that closed since the last cycle"""
+    if paper_broker is None or candle_buffer.empty:
+        return
+    now = datetime.datetime.now(pytz.timezone("Asia/Kolkata"))
+    closed = candle_buffer[candle_buffer.index + datetime.timedelta(minutes=5) <= now]
+    if paper_broker.last_time is None:
+        closed = closed.iloc[-1:]
+    else:
+        closed = closed[closed.index >= paper_broker.last_time]
+    for ts, row in closed.iterrows():
+        paper_broker.on_bar(ts, row['open'], row['high'], row['low'], row['close'], row['volume'])
+
+def close_paper_session():
+    """Square off unfilled paper orders, log the signal-vs-fill report and save the fills"""
+    if paper_broker is None:
+        return
+    paper_broker.square_off()
+    summary = paper_broker.summary()
+    logging.info(f"Paper broker session summary: {summary}")
+    paper_broker.save_fills()
+
+def snapshot_state():
+    """Persist position, counters, indicator state and the candle buffer"""
+    try:
+        # Built under the lock so the LTP monitor cannot change the position halfway through
+        with position_lock:
+            state = {
+                'symbol': TRADING_SYMBOL,
+                'token': TRADING_TOKEN,
+                'in_position': in_position,
+                'buy_price': buy_price,
+                'entry_time': entry_time,
+                'daily_trade_count': daily_trade_count,
+                'last_reset_date': last_reset_date,
+                'prev_ema5': prev_ema5,
+                'prev_ema20': prev_ema20,
+                'prev_close': prev_close,
+                'mtf_bars': mtf_bars,
+                'protective_orders': dict(protection.orders) if protection is not None else {},
+            }
+            save_snapshot(SNAPSHOT_FILE, state, candle_buffer)
+    except Exception as e:
+        logging.error(f"Could not save snapshot: {e}")
+
+def restore_state():
+    """Warm-start from the last snapshot if it belongs to the configured symbol"""
+    global in_position, buy_price, entry_time, daily_trade_count, last_reset_date
+    global prev_ema5, prev_ema20, prev_close, candle_buffer, mtf_bars, restored_protective_orders
+
+    state, candles = load_snapshot(SNAPSHOT_FILE)
+    if state is None:
+        return False
+
+    if state['symbol'] != TRADING_SYMBOL or state['token'] != TRADING_TOKEN:
+        if state['in_position']:
+            logging.warning(f"Snapshot holds an OPEN position in {state['symbol']} bought at "
+                            f"INR {state['buy_price']:.2f} - check it manually, not restoring for {TRADING_SYMBOL}")
+        return False
+
+    # Intraday positions are squared off by the broker at the close, so one from an earlier session is gone
+    today = datetime.datetime.now(pytz.timezone("Asia/Kolkata")).date()
+    if state['in_position'] and (state['entry_time'] is None or state['entry_time'].date() != today):
+        logging.warning(f"Snapshot holds an OPEN position from {state['entry_time']} bought at "
+                        f"INR {state['buy_price']:.2f} - earlier session, restoring as flat")
+        state.update(in_position=False, buy_price=None, entry_time=None, protective_orders={})
+
+    in_position = state['in_position']
+    buy_price = state['buy_price']
+    entry_time = state['entry_time']
+    daily_trade_count = state['daily_trade_count']
+    last_reset_date = state['last_reset_date']
+    prev_ema5 = state['prev_ema5']
+    prev_ema20 = state['prev_ema20']
+    prev_close = state['prev_close']
+    candle_buffer = candles
+    mtf_bars = state.get('mtf_bars') or BarResampler()
+    restored_protective_orders = state.get('protective_orders') or {}
+
+    logging.info(f"Warm restart: {len(candle_buffer)} buffered candles, daily trades {daily_trade_count}")
+    if in_position:
+        logging.warning(f"Restored OPEN position: entry INR {buy_price:.2f} at {entry_time}")
+    return True
+
 def wait_for_next_5min_candle():
     """Wait until the next 5-minute candle formation time"""
     now = datetime.datetime.now(pytz.timezone("Asia/Kolkata"))
@@ -137,10 +343,18 @@ def wait_for_next_5min_candle():
     time.sleep(seconds_to_wait)
     logging.info("Synchronized with 5-minute candles!")
 
-def fetch_intraday_data(obj, date, symbol, token):
-    """Fetch intraday data for a specific date - same as backtest"""
-    start_time = datetime.datetime.combine(date, datetime.time(9, 15))
-    end_time = datetime.datetime.combine(date, datetime.time(15, 30))
+def fetch_intraday_data(obj, date, symbol, token, start_time=None, end_time=None):
+    """Fetch intraday data for a specific date (whole session unless a range is given)"""
+    if start_time is None:
+        windows = session_windows(date)
+        if not windows:
+            return pd.DataFrame()
+        start_time, end_time = windows[0][0], windows[-1][1]
+    df = fetch_candle_range(obj, symbol, token, start_time, end_time)
+    return pd.DataFrame() if df is None else df
+
+def fetch_candle_range(obj, symbol, token, start_time, end_time):
+    """Candles between two times; None if the request failed, an empty frame if nothing traded"""
     params = {
         "exchange": EXCHANGE,
         "symboltoken": token,
@@ -148,39 +362,55 @@ def fetch_intraday_data(obj, date, symbol, token):
         "fromdate": start_time.strftime("%Y-%m-%d %H:%M"),
         "todate": end_time.strftime("%Y-%m-%d %H:%M")
     }
+    candles = fetch_candle_rows(obj, params)
+    if candles is None:
+        logging.warning(f"No data for {start_time:%Y-%m-%d %H:%M} - {end_time:%H:%M} {symbol}: fetch failed")
+        return None
     try:
-        candles = obj.getCandleData(params)['data']
         df = pd.DataFrame(candles, columns=['timestamp','open','high','low','close','volume'])
         df['timestamp'] = pd.to_datetime(df['timestamp'])
         df['timestamp'] = df['timestamp'].dt.tz_convert('Asia/Kolkata')
         df.set_index('timestamp', inplace=True)
         return df
     except Exception as e:
-        logging.info(f"Error fetching data for {date} {symbol}: {e}")
-        return pd.DataFrame()
+        logging.info(f"Error fetching data for {start_time:%Y-%m-%d} {symbol}: {e}")
+        return None
 
-def compute_features(df):
+def add_htf_features(df, htf):
+    """Add EMA200 of completed higher-timeframe bars, aligned without lookahead"""
+    for tf in HTF_EMA_TIMEFRAMES:
+        bars = htf.frame(tf)
+        column = f"ema{HTF_EMA_WINDOW}_{tf}m"
+        if len(bars) < HTF_EMA_WINDOW:
+            logging.warning(f"{column} not ready: {len(bars)}/{HTF_EMA_WINDOW} {tf}-minute bars, column is NaN")
+            df[column] = float('nan')
+            continue
+        ema = pd.Series(indicators.ema(bars['close'].to_numpy(dtype=float), HTF_EMA_WINDOW), index=bars.index)
+        df[column] = align_to_base(ema, bars['end'], df.index).to_numpy()
+    return df
+
+def compute_features(df, htf=None):
     """Compute features exactly like backtest"""
     if len(df) < 200:
         return pd.DataFrame()
 
+    close = df['close'].to_numpy(dtype=float)
+
     # Calculate ADX and directional indicators
-    adx_indicator = ADXIndicator(df['high'], df['low'], df['close'], window=14)
-    df['adx14'] = adx_indicator.adx()
-    df['di_plus'] = adx_indicator.adx_pos()
-    df['di_minus'] = adx_indicator.adx_neg()
+    df['adx14'], df['di_plus'], df['di_minus'] = indicators.adx(
+        df['high'].to_numpy(dtype=float), df['low'].to_numpy(dtype=float), close, window=14)
     
     # Calculate EMAs
-    df['ema5'] = EMAIndicator(df['close'], window=5).ema_indicator()
-    df['ema20'] = EMAIndicator(df['close'], window=20).ema_indicator()
-    df['ema50'] = EMAIndicator(df['close'], window=50).ema_indicator()
-    df['ema100'] = EMAIndicator(df['close'], window=100).ema_indicator()
-    df['ema200'] = EMAIndicator(df['close'], window=200).ema_indicator()
-    df['ema9'] = EMAIndicator(df['close'], window=9).ema_indicator()
-    df['ema21'] = EMAIndicator(df['close'], window=21).ema_indicator()
+    df['ema5'] = indicators.ema(close, 5)
+    df['ema20'] = indicators.ema(close, 20)
+    df['ema50'] = indicators.ema(close, 50)
+    df['ema100'] = indicators.ema(close, 100)
+    df['ema200'] = indicators.ema(close, 200)
+    df['ema9'] = indicators.ema(close, 9)
+    df['ema21'] = indicators.ema(close, 21)
     
     # Calculate RSI(14)
-    df['rsi14'] = RSIIndicator(close=df['close'], window=14).rsi()
+    df['rsi14'] = indicators.rsi(close, 14)
     
     # Calculate % difference from close price for convergence checks
     df['ema5_diff_pct'] = abs(df['ema5'] - df['close']) / df['close'] * 100
@@ -199,6 +429,9 @@ def compute_features(df):
     )
     
     df.dropna(inplace=True)
+    # Higher-timeframe columns may still be warming up, so they are added after dropna
+    if htf is not None:
+        df = add_htf_features(df, htf)
     return df
 
 def place_market_order(obj, transaction_type, symbol, token):
@@ -206,10 +439,16 @@ def place_market_order(obj, transaction_type, symbol, token):
     if PAPER_TRADE:
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_msg = f"[PAPER TRADE] {now} | {transaction_type} | Symbol: {symbol} | Qty: {QUANTITY}"
-        print(log_msg)
         logging.info(log_msg)
-        return {"status": "simulated", "action": transaction_type}
+        return paper_broker.submit(transaction_type, QUANTITY, symbol=symbol)
     else:
+        if transaction_type == "SELL" and protection is not None:
+            # The stop/target legs come down first so the position can't be sold twice
+            closed = protection.release()
+            if closed is not None:
+                reason, price = closed
+                logging.info(f"SELL skipped: {reason} at INR {price:.2f} already closed the position")
+                return None
         order_params = {
             "variety": "NORMAL",
             "tradingsymbol": symbol,
@@ -222,67 +461,24 @@ def place_market_order(obj, transaction_type, symbol, token):
             "quantity": QUANTITY
         }
         
-        order = obj.placeOrder(order_params)
-        print(f"✅ {transaction_type} order placed | Order ID: {order}")
+        try:
+            order = scheduler.call('placeOrder', obj.placeOrder, order_params)
+        except Exception:
+            if transaction_type == "SELL" and protection is not None:
+                protection.rearm()
+            raise
         logging.info(f"REAL ORDER placed: {transaction_type} | ID: {order}")
+        if transaction_type == "BUY" and protection is not None:
+            protection.attach(STOP_LOSS_PCT, TARGET_PROFIT_PCT, entry_order_id=order)
         return order
 
 def check_entry_signal(current_row, prev_row):
     """Check entry condition exactly like backtest"""
-    if prev_row is None:
-        return False
-    
-    current_close = current_row['close']
-    current_rsi = current_row['rsi14']
-    current_ema5 = current_row['ema5']
-    current_ema20 = current_row['ema20']
-    current_ema50 = current_row['ema50']
-    
-    prev_close = prev_row['close']
-    prev_ema20 = prev_row['ema20']
-    
-    # Entry condition from backtest
-    entry_condition = (
-        ((current_rsi > 20 and current_rsi <= 30) or 
-         (current_close > current_ema20 and prev_close <= prev_ema20)) and
-        ((current_ema5 > current_ema20) and 
-        (current_close > current_ema50))
-    )# 
-    
-    return entry_condition
+    return STRATEGY.entry_signal(current_row, prev_row)
 
 def check_exit_signal(current_row, prev_row, entry_price, current_time):
     """Check exit conditions exactly like backtest"""
-    global prev_ema5, prev_ema20
-    
-    current_close = current_row['close']
-    current_rsi = current_row['rsi14']
-    current_ema5 = current_row['ema5']
-    current_ema20 = current_row['ema20']
-    
-    # Calculate profit percentage
-    profit_pct = ((current_close - entry_price) / entry_price) * 100
-    
-    # EMA cross down condition
-    ema_cross_down = False
-    if prev_ema5 is not None and prev_ema20 is not None:
-        ema_cross_down = (prev_ema5 >= prev_ema20 and current_ema5 < current_ema20)
-    
-    # Exit conditions from backtest
-    exit_reasons = []
-    
-    if profit_pct >= TARGET_PROFIT_PCT:
-        exit_reasons.append("1.8% Profit Target")
-    elif profit_pct <= -STOP_LOSS_PCT:
-        exit_reasons.append("Stop Loss")
-    elif ema_cross_down and profit_pct > 0:
-        exit_reasons.append("EMA Cross Down")
-    elif current_rsi >= 70:
-        exit_reasons.append("RSI 70+")
-    elif current_time >= datetime.time(15, 0):
-        exit_reasons.append("EOD Exit")
-    
-    return exit_reasons, profit_pct
+    return STRATEGY.exit_reasons(current_row, prev_row, entry_price, current_time)
 
 def reset_daily_counters():
     """Reset daily trade count"""
@@ -293,33 +489,169 @@ def reset_daily_counters():
         last_reset_date = today
         logging.info(f"Daily counters reset for {today}")
 
-def live_trading():
-    """Main live trading loop with backtest strategy"""
+def handle_candle(df, ist_now, current_time, send_order):
+    """Run entry/exit rules on the last closed candle and update position state"""
     global in_position, buy_price, entry_time, daily_trade_count
     global prev_ema5, prev_ema20, prev_close
+
+    # Get current and previous data points
+    current_row = df.iloc[-2]
+    prev_row = df.iloc[-3] if len(df) >= 3 else None
+    
+    current_price = current_row['close']
+    current_rsi = current_row['rsi14']
+    
+    logging.info(f"\n[{ist_now.strftime('%H:%M:%S')}] Price: INR {current_price:.2f} | "
+          f"RSI: {current_rsi:.1f} | "
+          f"EMA5: {current_row['ema5']:.2f} | "
+          f"EMA20: {current_row['ema20']:.2f} | "
+          f"Position: {'YES' if in_position else 'NO'} | "
+          f"Daily Trades: {daily_trade_count}")
+    
+    # Entry Logic
+    if not in_position and daily_trade_count < MAX_DAILY_TRADES:
+        if check_entry_signal(current_row, prev_row):
+            logging.info(f"BUY Signal: RSI={current_rsi:.1f}, EMA5={current_row['ema5']:.2f}, EMA20={current_row['ema20']:.2f}")
+            
+            send_order("BUY")
+            buy_price = current_price
+            entry_time = ist_now
+            in_position = True
+            daily_trade_count += 1
+    
+    # Exit Logic
+    elif in_position:
+        exit_reasons, profit_pct = check_exit_signal(current_row, prev_row, buy_price, current_time)
+        
+        logging.info(f"📊 Position P&L: {profit_pct:.2f}%")
+        
+        if exit_reasons:
+            exit_reason = exit_reasons[0]  # Take first reason
+            profit_amount = (current_price - buy_price) * QUANTITY - BROKERAGE_PER_TRADE
+            
+            logging.info(f"SELL Signal: {exit_reason} | Entry: INR {buy_price:.2f} | Exit: INR {current_price:.2f} | P&L: INR {profit_amount:.2f}")
+            
+            send_order("SELL")
+            in_position = False
+            buy_price = None
+            entry_time = None
     
+    # Update previous values for next iteration
+    prev_ema5 = current_row['ema5']
+    prev_ema20 = current_row['ema20']
+    prev_close = current_price
+    return current_row
+
+def force_exit_at_close(final_price, send_order):
+    """Square off any open position at market close"""
+    global in_position, buy_price, entry_time
+    if in_position:
+        profit_amount = (final_price - buy_price) * QUANTITY - BROKERAGE_PER_TRADE
+        logging.warning(f"Forced Exit at Market Close | P&L: ₹{profit_amount:.2f}")
+        send_order("SELL")
+        in_position = False
+        buy_price = None
+        entry_time = None
+
+# ---- LTP MONITOR / EXCHANGE LEGS ----
+def exit_between_candles(ltp, reason, send_order):
+    """Close the position between candles: an LTP crossing (SELL sent) or an exchange leg fill (nothing to send)"""
+    global in_position, buy_price, entry_time
+    with position_lock:
+        if not in_position:
+            return
+        profit_amount = (ltp - buy_price) * QUANTITY - BROKERAGE_PER_TRADE
+        logging.info(f"SELL Signal: {reason} | Entry: INR {buy_price:.2f} | Exit: INR {ltp:.2f} | P&L: INR {profit_amount:.2f}")
+        send_order("SELL")
+        in_position = False
+        buy_price = None
+        entry_time = None
+        sync_position_monitor(TRADING_SYMBOL, TRADING_TOKEN)
+        snapshot_state()
+
+def abandon_position():
+    """The entry order died at the exchange after the bot had booked it: go flat without selling"""
+    global in_position, buy_price, entry_time
+    with position_lock:
+        if not in_position:
+            return
+        logging.error("Entry order was not filled - position dropped, no SELL sent")
+        in_position = False
+        buy_price = None
+        entry_time = None
+        sync_position_monitor(TRADING_SYMBOL, TRADING_TOKEN)
+        snapshot_state()
+
+def start_position_monitor(get_obj, send_order):
+    """Poll LTP for the open position in the background; get_obj returns the current session"""
+    global monitor
+    monitor = PositionMonitor(
+        lambda positions: fetch_ltp(get_obj(), positions, EXCHANGE),
+        lambda symbol, token, ltp, reason: exit_between_candles(ltp, reason, send_order),
+        min_interval=lambda positions: ltp_min_interval(get_obj(), positions),
+    )
+    return monitor.start()
+
+def sync_position_monitor(symbol, token):
+    """Arm the monitor for the open position, disarm it once flat"""
+    if monitor is None:
+        return
+    if in_position and buy_price is not None:
+        monitor.watch(symbol, token, buy_price, STOP_LOSS_PCT, TARGET_PROFIT_PCT)
+    else:
+        monitor.unwatch(token)
+
+def start_protection(get_obj, symbol, token):
+    """Exchange-side stop/target legs for real orders; a restored position gets its legs back"""
+    global protection
+    if PAPER_TRADE or PROTECTIVE_ORDERS != "SL":
+        return None
+    protection = ProtectiveOrders(
+        get_obj, symbol, token, EXCHANGE, QUANTITY,
+        lambda reason, price: exit_between_candles(price, reason, lambda side: None),
+        abandon_position,
+    )
+    if in_position and restored_protective_orders:
+        protection.orders.update(restored_protective_orders)
+    elif in_position:
+        protection.attach(STOP_LOSS_PCT, TARGET_PROFIT_PCT, entry_price=buy_price)
+    return protection.start()
+
+def stop_position_monitor():
+    if monitor is not None:
+        monitor.stop()
+    if protection is not None:
+        protection.stop()
+
+def live_trading():
+    """Main live trading loop with backtest strategy"""
     obj, refresh_token = create_session()
     symbol = TRADING_SYMBOL
     token = TRADING_TOKEN
     
-    print(f"🚀 Live Trading Started for {symbol}")
     logging.info(f"Live Trading Started for {symbol} (QTY : {QUANTITY},paper trade : {PAPER_TRADE})")
+    restore_state()
+    connect_bus(symbol, token)
+    start_position_monitor(lambda: obj, lambda side: place_market_order(obj, side, symbol, token))
+    start_protection(lambda: obj, symbol, token)
+    sync_position_monitor(symbol, token)
 
-    prev_row = None
+    current_row = None
     
     while True:
         if safety_stop_triggered():
-            print("Exiting...")
             logging.warning("Trading stopped by user (STOP file detected).")
+            stop_position_monitor()
+            close_paper_session()
             break
         
         # Check session validity
         try:
-            obj.getProfile(refresh_token)
+            scheduler.call('getProfile', obj.getProfile, refresh_token)
         except Exception as e:
             logging.warning("🔁 Session expired. Renewing...")
             try:
-                new_session = obj.renewAccessToken(refresh_token)
+                new_session = scheduler.call('renewAccessToken', obj.renewAccessToken, refresh_token)
                 logging.info("Session renewed.")
             except Exception as e:
                 logging.error(f"Could not renew session: {e}")
@@ -347,95 +679,260 @@ def live_trading():
         try:
             # Get accumulated data for proper EMA calculation
             current_date = ist_now.date()
-            df = fetch_accumulated_data(obj, current_date, symbol, token, days_back=5)
+            df = refresh_candle_buffer(obj, current_date, symbol, token)
             
             if df.empty or len(df) < 200:
-                print("⚠️ Not enough accumulated data for EMAs")
                 logging.warning("Not enough accumulated data for EMAs")
                 time.sleep(60)
                 continue
             
-            df = compute_features(df)
+            df = compute_features(df, mtf_bars)
             
             if df.empty:
-                print("⚠️ No computed features")
                 logging.warning("No computed features")
                 time.sleep(60)
                 continue
             
-            # Get current and previous data points
-            current_row = df.iloc[-2]
-            if len(df) >= 3:
-                prev_row = df.iloc[-3]
-            
-            current_price = current_row['close']
-            current_rsi = current_row['rsi14']
-            
-            logging.info(f"\n[{ist_now.strftime('%H:%M:%S')}] Price: INR {current_price:.2f} | "
-                  f"RSI: {current_rsi:.1f} | "
-                  f"EMA5: {current_row['ema5']:.2f} | "
-                  f"EMA20: {current_row['ema20']:.2f} | "
-                  f"Position: {'YES' if in_position else 'NO'} | "
-                  f"Daily Trades: {daily_trade_count}")
-            
-            # Entry Logic
-            if not in_position and daily_trade_count < MAX_DAILY_TRADES:
-                if check_entry_signal(current_row, prev_row):
-                    print(f"📈 BUY Signal Detected at {current_price:.2f}")
-                    logging.info(f"BUY Signal: RSI={current_rsi:.1f}, EMA5={current_row['ema5']:.2f}, EMA20={current_row['ema20']:.2f}")
-                    
-                    place_market_order(obj, "BUY", symbol, token)
-                    buy_price = current_price
-                    entry_time = ist_now
-                    in_position = True
-                    daily_trade_count += 1
-            
-            # Exit Logic
-            elif in_position:
-                exit_reasons, profit_pct = check_exit_signal(current_row, prev_row, buy_price, current_time)
-                
-                print(f"📊 Position P&L: {profit_pct:.2f}%")
-                
-                if exit_reasons:
-                    exit_reason = exit_reasons[0]  # Take first reason
-                    profit_amount = (current_price - buy_price) * QUANTITY - BROKERAGE_PER_TRADE
-                    
-                    print(f"🔴 SELL Signal: {exit_reason} at {current_price:.2f} | P&L: ₹{profit_amount:.2f}")
-                    logging.info(f"SELL Signal: {exit_reason} | Entry: INR {buy_price:.2f} | Exit: INR {current_price:.2f} | P&L: INR {profit_amount:.2f}")
-                    
-                    place_market_order(obj, "SELL", symbol, token)
-                    in_position = False
-                    buy_price = None
-                    entry_time = None
-            
-            # Update previous values for next iteration
-            prev_ema5 = current_row['ema5']
-            prev_ema20 = current_row['ema20']
-            prev_close = current_price
-            #prev_row = current_row
+            with position_lock:
+                current_row = handle_candle(
+                    df, ist_now, current_time,
+                    lambda side: place_market_order(obj, side, symbol, token)
+                )
+                sync_position_monitor(symbol, token)
             
         except Exception as e:
-            print(f"❌ Error: {e}")
             logging.error(f"Error in main loop: {e}")
         
         # Forced exit at market close
         if ist_now.hour == 15 and ist_now.minute >= 29:
-            if in_position:
-                final_price = current_row['close']
-                profit_amount = (final_price - buy_price) * QUANTITY - BROKERAGE_PER_TRADE
-                print(f"⏹️ Forced Exit at Market Close | Final Price: ₹{final_price:.2f} | P&L: ₹{profit_amount:.2f}")
-                logging.warning(f"Forced Exit at Market Close | P&L: ₹{profit_amount:.2f}")
-                place_market_order(obj, "SELL", symbol, token)
-                in_position = False
-                buy_price = None
-                entry_time = None
+            stop_position_monitor()
+            if current_row is not None:
+                try:
+                    with position_lock:
+                        force_exit_at_close(current_row['close'], lambda side: place_market_order(obj, side, symbol, token))
+                except Exception as e:
+                    logging.error(f"Forced exit failed, position still open: {e}")
+            close_paper_session()
+            snapshot_state()
             break
         
+        snapshot_state()
+        
+        scheduler.log_metrics()
+        candle_fetcher.log_metrics()
+
         # Wait 5 minutes before next iteration
-        print("Waiting for next 5-minute candle ...")
         logging.info("Waiting for next 5-minute candle ...")
 
         wait_for_next_5min_candle()
 
+# ---- ASYNC LIVE LOOP ----
+async def fetch_accumulated_data_async(obj, current_date, instruments, days_back=5):
+    """Fill store gaps and fetch today's session for every symbol concurrently; returns {symbol: df}"""
+    start = current_date - datetime.timedelta(days=days_back)
+    last_closed = previous_trading_day(current_date)
+
+    async def fetch_one(date, symbol, token):
+        # Quota and concurrency are enforced by the scheduler inside fetch_intraday_data
+        return await asyncio.to_thread(fetch_intraday_data, obj, date, symbol, token)
+
+    async def fetch_gap(symbol, token, start_time, end_time):
+        return await asyncio.to_thread(fetch_candle_range, obj, symbol, token, start_time, end_time)
+
+    bar = datetime.timedelta(minutes=5)
+    tasks = {}
+    for symbol, token in instruments:
+        gaps = candle_store.gaps(token, start, last_closed) if start <= last_closed else {}
+        gap_tasks = [
+            (date, asyncio.create_task(fetch_gap(symbol, token, first_bar, last_bar + bar)))
+            for date, ranges in gaps.items() for first_bar, last_bar in ranges
+        ]
+        today_task = asyncio.create_task(fetch_one(current_date, symbol, token)) if is_trading_day(current_date) else None
+        tasks[symbol] = (token, gap_tasks, today_task)
+
+    results = {}
+    for symbol, (token, gap_tasks, today_task) in tasks.items():
+        failed_dates = set()
+        for date, task in gap_tasks:
+            df = await task
+            if df is None:
+                failed_dates.add(date)
+            elif not df.empty:
+                candle_store.save_day(token, date, df)
+        # A session with a failed request keeps its gaps so the next start asks again
+        for date in {date for date, _ in gap_tasks} - failed_dates:
+            candle_store.mark_fetched(token, date)
+
+        frames = [candle_store.load(token, start, last_closed)] if start <= last_closed else []
+        if today_task is not None:
+            frames.append(await today_task)
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            results[symbol] = pd.DataFrame()
+            continue
+        combined_df = pd.concat(frames, axis=0).sort_index()
+        combined_df = combined_df[~combined_df.index.duplicated(keep='last')]
+        logging.info(f"{symbol}: accumulated {len(combined_df)} candles ({len(gap_tasks)} gap requests)")
+        results[symbol] = combined_df
+    return results
+
+async def refresh_candle_buffer_async(obj, current_date, symbol, token):
+    """Async counterpart of refresh_candle_buffer"""
+    global candle_buffer
+    if bus is not None:
+        new_df = await asyncio.to_thread(fetch_from_bus, symbol)
+    else:
+        days_back = 0 if candle_buffer_is_warm(current_date) else CANDLE_BUFFER_DAYS
+        frames = await fetch_accumulated_data_async(obj, current_date, [(symbol, token)], days_back=days_back)
+        new_df = frames[symbol]
+    candle_buffer = merge_candles(candle_buffer, new_df, current_date)
+    await asyncio.to_thread(seed_resampler, obj, current_date, symbol, token)
+    feed_resampler()
+    feed_paper_broker()
+    return candle_buffer.copy()
+
+async def session_refresher(session):
+    """Background task keeping the SmartAPI session alive between candles"""
+    while True:
+        await asyncio.sleep(SESSION_CHECK_INTERVAL)
+        try:
+            await scheduler.call_async('getProfile', session['obj'].getProfile, session['refresh_token'])
+        except Exception:
+            logging.warning("🔁 Session expired. Renewing...")
+            try:
+                await scheduler.call_async('renewAccessToken', session['obj'].renewAccessToken, session['refresh_token'])
+                logging.info("Session renewed.")
+            except Exception as e:
+                logging.error(f"Could not renew session: {e}")
+                session['obj'], session['refresh_token'] = await asyncio.to_thread(create_session)
+
+async def submit_order_async(session, transaction_type, symbol, token, entry_price=None, entry_at=None):
+    """Place an order off the event loop and log the acknowledgement when it arrives"""
+    global in_position, buy_price, entry_time, daily_trade_count
+    try:
+        ack = await asyncio.to_thread(place_market_order, session['obj'], transaction_type, symbol, token)
+        logging.info(f"Order acknowledged: {transaction_type} {symbol} | {ack}")
+    except Exception as e:
+        logging.error(f"Order failed: {transaction_type} {symbol} | {e}")
+        # Roll back the optimistic state change so the book matches the broker
+        with position_lock:
+            if transaction_type == "BUY" and in_position:
+                in_position = False
+                buy_price = None
+                entry_time = None
+                daily_trade_count -= 1
+            elif transaction_type == "SELL" and not in_position:
+                logging.warning("Exit not confirmed - keeping position open")
+                in_position = True
+                buy_price = entry_price
+                entry_time = entry_at
+            sync_position_monitor(symbol, token)
+        snapshot_state()
+
+async def wait_for_next_5min_candle_async():
+    """Non-blocking version of wait_for_next_5min_candle"""
+    now = datetime.datetime.now(pytz.timezone("Asia/Kolkata"))
+    seconds_to_wait = (5 - now.minute % 5) * 60 - now.second - now.microsecond / 1e6
+    if seconds_to_wait >= 300:
+        return
+    logging.info(f"Waiting {seconds_to_wait:.0f} seconds for next 5-min candle...")
+    await asyncio.sleep(seconds_to_wait)
+
+async def live_trading_async():
+    """Async live loop: concurrent fetches, background session refresh and order acks"""
+    obj, refresh_token = await asyncio.to_thread(create_session)
+    session = {'obj': obj, 'refresh_token': refresh_token}
+    symbol = TRADING_SYMBOL
+    token = TRADING_TOKEN
+    pending_orders = set()
+
+    def send_order(side, entry_price=None, entry_at=None):
+        # Entry price and time are captured now, before handle_candle clears them on exits
+        if entry_price is None:
+            entry_price, entry_at = buy_price, entry_time
+        task = asyncio.create_task(submit_order_async(session, side, symbol, token, entry_price, entry_at))
+        pending_orders.add(task)
+        task.add_done_callback(pending_orders.discard)
+
+    logging.info(f"Live Trading (async) Started for {symbol} (QTY : {QUANTITY},paper trade : {PAPER_TRADE})")
+
+    restore_state()
+    connect_bus(symbol, token)
+    loop = asyncio.get_running_loop()
+    # LTP exits come from the monitor thread; the order task has to be created on the loop
+    start_position_monitor(lambda: session['obj'],
+                           lambda side: loop.call_soon_threadsafe(send_order, side, buy_price, entry_time))
+    sync_position_monitor(symbol, token)
+    await asyncio.to_thread(start_protection, lambda: session['obj'], symbol, token)
+    refresher = asyncio.create_task(session_refresher(session))
+    current_row = None
+
+    try:
+        while True:
+            if safety_stop_triggered():
+                logging.warning("Trading stopped by user (STOP file detected).")
+                break
+
+            reset_daily_counters()
+
+            ist_now = datetime.datetime.now(pytz.timezone("Asia/Kolkata"))
+            current_time = ist_now.time()
+
+            if current_time < datetime.time(9, 15) or current_time >= datetime.time(15, 30):
+                logging.info("Market closed. Sleeping for 60s...")
+                await asyncio.sleep(60)
+                continue
+
+            if current_time >= datetime.time(14, 30) and not in_position:
+                logging.info("No new entries after 2:30 PM. Sleeping for 60s...")
+                await asyncio.sleep(60)
+                continue
+
+            try:
+                cycle_start = time.perf_counter()
+                df = await refresh_candle_buffer_async(session['obj'], ist_now.date(), symbol, token)
+                logging.info(f"Fetch stage took {time.perf_counter() - cycle_start:.2f}s")
+
+                if df.empty or len(df) < 200:
+                    logging.warning("Not enough accumulated data for EMAs")
+                    await asyncio.sleep(60)
+                    continue
+
+                df = await asyncio.to_thread(compute_features, df, mtf_bars)
+
+                if df.empty:
+                    logging.warning("No computed features")
+                    await asyncio.sleep(60)
+                    continue
+
+                with position_lock:
+                    current_row = handle_candle(df, ist_now, current_time, send_order)
+                    sync_position_monitor(symbol, token)
+
+            except Exception as e:
+                logging.error(f"Error in async main loop: {e}")
+            scheduler.log_metrics()
+            candle_fetcher.log_metrics()
+
+            if ist_now.hour == 15 and ist_now.minute >= 29:
+                stop_position_monitor()
+                if current_row is not None:
+                    with position_lock:
+                        force_exit_at_close(current_row['close'], send_order)
+                snapshot_state()
+                break
+
+            snapshot_state()
+            await wait_for_next_5min_candle_async()
+    finally:
+        stop_position_monitor()
+        refresher.cancel()
+        if pending_orders:
+            await asyncio.gather(*pending_orders, return_exceptions=True)
+        close_paper_session()
+
 if __name__ == "__main__":
-    live_trading()
+    if ASYNC_LOOP:
+        asyncio.run(live_trading_async())
+    else:
+        live_trading()
@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import datetime
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import numpy as np
+from mock_smartapi import SYNTHETIC_TOKEN_BASE
+
+try:
+    import resource
+except ImportError:  # Windows: memory falls back to n/a
+    resource = None
+
+# ---- LOAD TEST CONFIG ----
+LOAD_START_SYMBOLS = int(os.getenv("LOAD_START_SYMBOLS", "10"))
+LOAD_MAX_SYMBOLS = int(os.getenv("LOAD_MAX_SYMBOLS", "1000"))
+LOAD_GROWTH = float(os.getenv("LOAD_GROWTH", "1.5"))          # symbols multiply by this each step
+LOAD_CYCLES = int(os.getenv("LOAD_CYCLES", "3"))              # bars simulated per step
+LOAD_SLO_SECS = float(os.getenv("LOAD_SLO_SECS", "60"))       # p95 decision time after the bar closes
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "8"))
+LOAD_ORDER_RATE = float(os.getenv("LOAD_ORDER_RATE", "0.05")) # extra orders so the order path is always exercised
+LOAD_NO_QUOTAS = os.getenv("LOAD_NO_QUOTAS", "0") == "1"      # measure the box, not the broker's quotas
+LOAD_SPAWN_MOCK = os.getenv("LOAD_SPAWN_MOCK", "1") == "1"
+LOAD_TOKENS = [t for t in os.getenv("LOAD_TOKENS", "").split(",") if t]   # recorded tokens in the candle store
+LOAD_REPORT = os.getenv("LOAD_REPORT", "load_test_report.json")
+LOAD_MOCK_ROOT = os.getenv("LOAD_MOCK_ROOT", "http://127.0.0.1:8765")
+
+# livebot reads its configuration at import time. The harness always talks to the mock
+# broker (orders included), whatever SMARTAPI_ROOT the shell has set.
+os.environ["SMARTAPI_ROOT"] = LOAD_MOCK_ROOT
+os.environ["PAPER_TRADE"] = "False"
+for key, value in {
+    "TRADING_SYMBOL": "MOCK000-EQ", "TRADING_TOKEN": str(SYNTHETIC_TOKEN_BASE),
+    "API_KEY": "load-test", "USER_ID": "LOAD", "PASSWORD": "load", "TOTP_SECRET": "JBSWY3DPEHPK3PXP",
+    "LOG_FILE": "load_test.log", "API_MAX_IN_FLIGHT": str(LOAD_WORKERS + 1),
+}.items():
+    os.environ.setdefault(key, value)
+
+import livebot
+from api_scheduler import scheduler
+from resilient_fetch import candle_fetcher
+from trading_calendar import session_windows, previous_trading_day, trading_days_back
+
+
+def rss_mb():
+    """Resident memory of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def start_mock():
+    """Run mock_smartapi.py in its own process so its CPU is not billed to the bot path"""
+    address = urlparse(LOAD_MOCK_ROOT).netloc
+    env = dict(os.environ, MOCK_SMARTAPI_ADDRESS=address, MOCK_LOG_FILE="mock_smartapi.log")
+    if LOAD_NO_QUOTAS:
+        env["MOCK_RATE_LIMITS"] = "0"
+    proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_smartapi.py")],
+                            env=env, stdout=subprocess.DEVNULL)
+    host, port = address.rsplit(":", 1)
+    for _ in range(100):
+        try:
+            socket.create_connection((host, int(port)), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"mock broker did not come up on {address}")
+
+
+def make_symbol(i):
+    if LOAD_TOKENS:
+        token = LOAD_TOKENS[i % len(LOAD_TOKENS)]
+        return {"name": f"{token}-{i}", "token": token}
+    return {"name": f"MOCK{i:03d}-EQ", "token": str(SYNTHETIC_TOKEN_BASE + i)}
+
+
+def warm_up(obj, symbol, replay_date):
+    """The closed sessions a live bot holds in its candle buffer (untimed)"""
+    days = trading_days_back(previous_trading_day(replay_date), livebot.CANDLE_BUFFER_DAYS)
+    start, end = session_windows(days[0])[0][0], session_windows(days[-1])[-1][1]
+    symbol["history"] = livebot.fetch_intraday_data(obj, days[0], symbol["name"], symbol["token"], start, end)
+    symbol["in_position"] = False
+    symbol["entry_price"] = None
+
+
+def decide(obj, symbol, replay_date, rng):
+    """One bar of the live path for one symbol: fetch, features, signal, order"""
+    t0 = time.perf_counter()
+    fresh = livebot.fetch_intraday_data(obj, replay_date, symbol["name"], symbol["token"])
+    t1 = time.perf_counter()
+    df = livebot.merge_candles(symbol["history"], fresh, replay_date)
+    df = livebot.compute_features(df)
+    side = None
+    if len(df) >= 3:
+        row, prev_row = df.iloc[-2], df.iloc[-3]
+        if symbol["in_position"]:
+            reasons, _ = livebot.check_exit_signal(row, prev_row, symbol["entry_price"], datetime.time(12, 0))
+            side = "SELL" if reasons else None
+        elif livebot.check_entry_signal(row, prev_row):
+            side = "BUY"
+        if side is None and rng.random() < LOAD_ORDER_RATE:
+            side = "SELL" if symbol["in_position"] else "BUY"
+    t2 = time.perf_counter()
+    if side is not None:
+        livebot.place_market_order(obj, side, symbol["name"], symbol["token"])
+        symbol["in_position"] = side == "BUY"
+        symbol["entry_price"] = df['close'].iloc[-2] if side == "BUY" else None
+    t3 = time.perf_counter()
+    return {"fetch": t1 - t0, "features": t2 - t1, "order": t3 - t2, "orders": int(side is not None)}
+
+
+def run_cycle(pool, obj, symbols, replay_date, rng):
+    """All symbols decide on the same bar; done_at is when each decision landed"""
+    start = time.perf_counter()
+
+    def timed(symbol):
+        try:
+            stages = decide(obj, symbol, replay_date, rng)
+        except Exception as e:
+            stages = {"error": str(e)}
+        stages["done_at"] = time.perf_counter() - start
+        return stages
+
+    return list(pool.map(timed, symbols))
+
+
+def run_step(pool, obj, symbols, replay_date, rng):
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    timings = []
+    for _ in range(LOAD_CYCLES):
+        timings.extend(run_cycle(pool, obj, symbols, replay_date, rng))
+    cpu = (time.process_time() - cpu_start) / LOAD_CYCLES
+    ok = [t for t in timings if "error" not in t]
+    done = np.array([t["done_at"] if "error" not in t else np.inf for t in timings])
+    stage_mean = {k: float(np.mean([t[k] for t in ok])) if ok else None for k in ("fetch", "features", "order")}
+    return {
+        "symbols": len(symbols),
+        "p95_decision_s": float(np.percentile(done, 95)),
+        "max_decision_s": float(done.max()),
+        "cycle_wall_s": (time.perf_counter() - wall_start) / LOAD_CYCLES,
+        "cpu_s_per_cycle": cpu,
+        "cpu_ms_per_symbol": cpu / len(symbols) * 1000,
+        "rss_mb": rss_mb(),
+        "errors": len(timings) - len(ok),
+        "orders": sum(t["orders"] for t in ok),
+        "mean_fetch_s": stage_mean["fetch"],
+        "mean_features_s": stage_mean["features"],
+        "mean_order_s": stage_mean["order"],
+    }
+
+
+def summarize(steps, last_ok):
+    sustainable = [s for s in steps if s["symbols"] <= last_ok]
+    rss = [(s["symbols"], s["rss_mb"]) for s in steps if s["rss_mb"] is not None]
+    if len(rss) >= 2:
+        mem_per_symbol = float(np.polyfit([n for n, _ in rss], [m for _, m in rss], 1)[0])
+    else:
+        mem_per_symbol = rss[0][1] / rss[0][0] if rss else None
+    return {
+        "max_sustainable_symbols": last_ok,
+        "slo_p95_s": LOAD_SLO_SECS,
+        "cpu_ms_per_symbol": sustainable[-1]["cpu_ms_per_symbol"] if sustainable else None,
+        "memory_mb_per_symbol": mem_per_symbol,
+        "quotas": "off" if LOAD_NO_QUOTAS else "broker",
+        "workers": LOAD_WORKERS,
+        "steps": steps,
+    }
+
+
+if __name__ == "__main__":
+    # python load_test.py [max_symbols]
+    max_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else LOAD_MAX_SYMBOLS
+    mock = start_mock() if LOAD_SPAWN_MOCK else None
+    if LOAD_NO_QUOTAS:
+        scheduler.set_quotas({})
+    rng = random.Random(7)
+    replay_date = datetime.date.fromisoformat(os.getenv("LOAD_DATE")) if os.getenv("LOAD_DATE") \
+        else previous_trading_day(datetime.date.today())
+    print(f"🏋️ Load test against {LOAD_MOCK_ROOT} | replay {replay_date} | SLO p95 {LOAD_SLO_SECS:.0f}s | "
+          f"{LOAD_WORKERS} workers | quotas {'off' if LOAD_NO_QUOTAS else 'on'}")
+
+    steps = []
+    last_ok = 0
+    try:
+        obj, _ = livebot.create_session()
+        symbols = []
+        n = LOAD_START_SYMBOLS
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+            while n <= max_symbols:
+                new = [make_symbol(i) for i in range(len(symbols), n)]
+                list(pool.map(lambda s: warm_up(obj, s, replay_date), new))
+                symbols.extend(new)
+                step = run_step(pool, obj, symbols, replay_date, rng)
+                steps.append(step)
+                breached = step["p95_decision_s"] > LOAD_SLO_SECS
+                print(f"  {n:>5} symbols | p95 {step['p95_decision_s']:7.2f}s | max {step['max_decision_s']:7.2f}s | "
+                      f"cpu {step['cpu_ms_per_symbol']:6.1f}ms/sym | rss {step['rss_mb'] or float('nan'):7.1f}MB | "
+                      f"errors {step['errors']} {'❌' if breached else '✅'}")
+                if breached:
+                    break
+                last_ok = n
+                n = max(n + 1, int(n * LOAD_GROWTH))
+    finally:
+        if mock is not None:
+            mock.terminate()
+
+    report = summarize(steps, last_ok)
+    with open(LOAD_REPORT, "w") as f:
+        json.dump(report, f, indent=1)
+    scheduler.log_metrics()
+    candle_fetcher.log_metrics()
+    mem = report["memory_mb_per_symbol"]
+    print(f"📊 Max sustainable symbols/process: {last_ok}"
+          f"{' (limit not reached)' if steps and steps[-1]['p95_decision_s'] <= LOAD_SLO_SECS else ''}")
+    if report["cpu_ms_per_symbol"] is not None:
+        print(f"   CPU per symbol per bar: {report['cpu_ms_per_symbol']:.1f}ms")
+    if mem is not None:
+        print(f"   Memory per symbol: {mem:.2f}MB")
+    print(f"   Report written to {LOAD_REPORT}")
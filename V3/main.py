@@ -7,6 +7,7 @@ import sys
 from dotenv import load_dotenv, set_key
 from SmartApi import SmartConnect
 import pyotp
+from log_pipeline import read_log_tail
 
 load_dotenv()
 
@@ -14,6 +15,7 @@ API_KEY = os.getenv("API_KEY")
 USER_ID = os.getenv("USER_ID")
 PASSWORD = os.getenv("PASSWORD")
 TOTP_SECRET = os.getenv("TOTP_SECRET")
+SMARTAPI_ROOT = os.getenv("SMARTAPI_ROOT")  # e.g. http://127.0.0.1:8765 for mock_smartapi.py
 
 if 'search_results' not in st.session_state:
     st.session_state.search_results = []
@@ -34,7 +36,7 @@ def initialize_smart_connect():
     try:
         if st.session_state.smart_connect is None:
             totp = pyotp.TOTP(TOTP_SECRET).now()
-            obj = SmartConnect(api_key=API_KEY)
+            obj = SmartConnect(api_key=API_KEY, root=SMARTAPI_ROOT)
             data = obj.generateSession(USER_ID, PASSWORD, totp)
             
             if data['status']:
@@ -331,13 +333,11 @@ def update_env_file(symbol, token, quantity, paper_trade):
     st.success(f"✅ Configuration updated!", icon="💾")
 
 def read_log_file():
-    """Read the latest content from log file"""
-    try:
-        with open("live_trading_log.log", "r") as f:
-            content = f.read()
-            return content
-    except FileNotFoundError:
+    """Read the tail of the current log segment (older segments are rotated and gzipped)"""
+    content = read_log_tail("live_trading_log.log")
+    if content is None:
         return "Log file not found. Start the bot to generate logs."
+    return content
 
 def start_trading_bot():
     """Start the trading bot as a subprocess"""
@@ -0,0 +1,226 @@
+import os
+import time
+import datetime
+import logging
+import threading
+from multiprocessing.connection import Listener
+import pandas as pd
+import pyotp
+import pytz
+from SmartApi import SmartConnect
+from dotenv import load_dotenv
+from log_pipeline import setup_logging
+from trading_calendar import session_windows, is_trading_day, previous_trading_day
+from candle_store import CandleStore
+from bus_client import MARKET_DATA_BUS, MDB_AUTHKEY, parse_address, require_authkey
+from api_scheduler import scheduler
+from resilient_fetch import candle_fetcher, fetch_candle_rows
+import indicators
+
+setup_logging(os.getenv("BUS_LOG_FILE", "market_data_bus.log"))
+
+# ---- CREDENTIALS ----
+load_dotenv()
+API_KEY = os.getenv("API_KEY")
+USER_ID = os.getenv("USER_ID")
+PASSWORD = os.getenv("PASSWORD")
+TOTP_SECRET = os.getenv("TOTP_SECRET")
+SMARTAPI_ROOT = os.getenv("SMARTAPI_ROOT")  # e.g. http://127.0.0.1:8765 for mock_smartapi.py
+
+# ---- BUS CONFIG ----
+EXCHANGE = "NSE"
+INTERVAL = "FIVE_MINUTE"
+BUS_ADDRESS = MARKET_DATA_BUS or "127.0.0.1:6100"
+HISTORY_DAYS = 5                 # sessions sent to a new subscriber, same as the V3 candle buffer
+FETCH_DELAY_SECS = 2             # after the 5-minute boundary, so the broker has closed the bar
+IST = pytz.timezone("Asia/Kolkata")
+
+# Indicators every strategy process would otherwise compute for itself
+SHARED_EMAS = [5, 9, 20, 21, 50, 100, 200]
+
+
+def create_session():
+    totp = pyotp.TOTP(TOTP_SECRET).now()
+    obj = SmartConnect(api_key=API_KEY, root=SMARTAPI_ROOT)
+    session = scheduler.call('generateSession', obj.generateSession, USER_ID, PASSWORD, totp)
+    refresh_token = session['data']['refreshToken']
+    return obj, refresh_token
+
+
+def fetch_candles(obj, symbol, token, start_time, end_time):
+    """Candles between two times; None if the request failed, an empty frame if nothing traded"""
+    params = {
+        "exchange": EXCHANGE,
+        "symboltoken": token,
+        "interval": INTERVAL,
+        "fromdate": start_time.strftime("%Y-%m-%d %H:%M"),
+        "todate": end_time.strftime("%Y-%m-%d %H:%M")
+    }
+    candles = fetch_candle_rows(obj, params)
+    if candles is None:
+        logging.error(f"Error fetching {symbol} {start_time} - {end_time}")
+        return None
+    df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_convert(IST)
+    return df.set_index('timestamp')
+
+
+def add_shared_indicators(df):
+    """Indicator columns published with every bar; strategies may use or recompute them"""
+    df = df.copy()
+    close = df['close'].to_numpy(dtype=float)
+    for window in SHARED_EMAS:
+        df[f'ema{window}'] = indicators.ema(close, window)
+    df['rsi14'] = indicators.rsi(close, 14)
+    df['macd'] = indicators.macd(close)
+    df['sma10'] = indicators.sma(close, 10)
+    df['adx14'], df['di_plus'], df['di_minus'] = indicators.adx(
+        df['high'].to_numpy(dtype=float), df['low'].to_numpy(dtype=float), close, 14)
+    return df
+
+
+class MarketDataBus:
+    """Fetches each subscribed symbol once per 5-minute cycle and fans the bars out.
+
+    Strategy processes connect with BusClient over a local socket; API usage grows
+    with the number of symbols, not with the number of strategies watching them.
+    """
+
+    def __init__(self, address=BUS_ADDRESS, authkey=MDB_AUTHKEY):
+        self.listener = Listener(parse_address(address), authkey=require_authkey(authkey))
+        self.lock = threading.Lock()
+        self.subscribers = {}      # symbol -> list of connections
+        self.tokens = {}           # symbol -> token
+        self.buffers = {}          # symbol -> IST-indexed candles incl. the forming bar
+        self.store = CandleStore()
+        self.obj, self.refresh_token = create_session()
+        logging.info(f"Market-data bus listening on {address}")
+
+    # ---- BROKER ----
+    def _fetch(self, symbol, token, start_time, end_time):
+        return fetch_candles(self.obj, symbol, token, start_time, end_time)
+
+    def load_history(self, symbol, token):
+        """Closed sessions from the candle store (gaps fetched once) plus today so far"""
+        today = datetime.datetime.now(IST).date()
+        start = today - datetime.timedelta(days=HISTORY_DAYS)
+        last_closed = previous_trading_day(today)
+        self.store.fill_gaps(token, start, last_closed,
+                             lambda a, b: self._fetch(symbol, token, a, b))
+        frames = [self.store.load(token, start, last_closed)]
+        windows = session_windows(today)
+        if windows:
+            frames.append(self._fetch(symbol, token, windows[0][0], windows[-1][1]))
+        frames = [f for f in frames if f is not None and not f.empty]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames).sort_index()
+        return df[~df.index.duplicated(keep='last')]
+
+    # ---- SUBSCRIBERS ----
+    def _publish(self, conns, message):
+        dead = []
+        for conn in conns:
+            try:
+                conn.send(message)
+            except (OSError, EOFError):
+                dead.append(conn)
+        return dead
+
+    def _drop(self, conn):
+        with self.lock:
+            for conns in self.subscribers.values():
+                if conn in conns:
+                    conns.remove(conn)
+
+    def _serve_client(self, conn):
+        while True:
+            try:
+                kind, symbol, token = conn.recv()
+            except (EOFError, OSError):
+                self._drop(conn)
+                return
+            if kind != 'subscribe':
+                continue
+            with self.lock:
+                known = symbol in self.buffers
+            if not known:
+                history = self.load_history(symbol, token)
+                with self.lock:
+                    self.tokens[symbol] = token
+                    self.buffers.setdefault(symbol, history)
+            with self.lock:
+                self.subscribers.setdefault(symbol, []).append(conn)
+                frame = self.buffers[symbol]
+            self._publish([conn], ('history', symbol, self._frame_to_send(frame)))
+            logging.info(f"Client subscribed to {symbol} ({len(self.subscribers[symbol])} subscriber(s))")
+
+    def accept_loop(self):
+        while True:
+            conn = self.listener.accept()
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    # ---- PUBLISHING ----
+    def _frame_to_send(self, df):
+        if df.empty:
+            return df
+        now = datetime.datetime.now(IST)
+        df = add_shared_indicators(df)
+        df['closed'] = df.index + datetime.timedelta(minutes=5) <= now
+        return df
+
+    def publish_cycle(self):
+        """One broker request per subscribed symbol, then the same frame to every subscriber"""
+        now = datetime.datetime.now(IST)
+        windows = session_windows(now.date())
+        if not windows or now < windows[0][0] or now > windows[-1][1] + datetime.timedelta(minutes=5):
+            return
+        with self.lock:
+            symbols = [s for s, conns in self.subscribers.items() if conns]
+        for symbol in symbols:
+            new_df = self._fetch(symbol, self.tokens[symbol], windows[0][0], windows[-1][1])
+            if new_df is None or new_df.empty:
+                continue
+            with self.lock:
+                buffer = pd.concat([self.buffers[symbol], new_df]).sort_index()
+                buffer = buffer[~buffer.index.duplicated(keep='last')]
+                cutoff = now.date() - datetime.timedelta(days=HISTORY_DAYS)
+                self.buffers[symbol] = buffer[buffer.index.date >= cutoff]
+                conns = list(self.subscribers[symbol])
+            # Indicators need the full buffer; only today's rows go over the wire
+            frame = self._frame_to_send(self.buffers[symbol])
+            frame = frame[frame.index.date == now.date()]
+            for conn in self._publish(conns, ('bars', symbol, frame)):
+                self._drop(conn)
+        logging.info(f"Published {len(symbols)} symbol(s) in {(datetime.datetime.now(IST) - now).total_seconds():.1f}s")
+        scheduler.log_metrics()
+        candle_fetcher.log_metrics()
+
+    def keep_session_alive(self):
+        try:
+            scheduler.call('getProfile', self.obj.getProfile, self.refresh_token)
+        except Exception:
+            logging.warning("🔁 Session expired. Renewing...")
+            try:
+                scheduler.call('renewAccessToken', self.obj.renewAccessToken, self.refresh_token)
+            except Exception as e:
+                logging.error(f"Could not renew session: {e}")
+                self.obj, self.refresh_token = create_session()
+
+    def run(self):
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        while True:
+            now = datetime.datetime.now(IST)
+            next_bar = now.replace(second=0, microsecond=0) + datetime.timedelta(minutes=5 - now.minute % 5)
+            time.sleep((next_bar - now).total_seconds() + FETCH_DELAY_SECS)
+            if not is_trading_day(next_bar.date()):
+                continue
+            self.keep_session_alive()
+            try:
+                self.publish_cycle()
+            except Exception as e:
+                logging.error(f"Bus publish cycle failed: {e}")
+
+
+if __name__ == "__main__":
+    MarketDataBus().run()
@@ -0,0 +1,423 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import random
+import datetime
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+from trading_calendar import IST, expected_timestamps, trading_days
+from candle_store import CandleStore, CANDLE_STORE_DIR
+from api_scheduler import ENDPOINT_QUOTAS
+from log_pipeline import setup_logging
+
+# Offline stand-in for the SmartAPI REST endpoints the bots use. Point SmartConnect at it with
+# SMARTAPI_ROOT=http://127.0.0.1:8765 (any user id / password and a base32 TOTP_SECRET work).
+# Candles come from the local candle store; tokens it does not hold get a deterministic
+# synthetic random walk, so hundreds of symbols can be served without any downloads.
+
+# ---- MOCK CONFIG ----
+MOCK_ADDRESS = os.getenv("MOCK_SMARTAPI_ADDRESS", "127.0.0.1:8765")
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "80"))
+MOCK_LATENCY_JITTER_MS = float(os.getenv("MOCK_LATENCY_JITTER_MS", "40"))
+MOCK_SLOW_RATE = float(os.getenv("MOCK_SLOW_RATE", "0.02"))      # share of calls that hit the slow tail
+MOCK_SLOW_MS = float(os.getenv("MOCK_SLOW_MS", "2500"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))       # share of calls answered with AB1004
+MOCK_RATE_LIMITS = os.getenv("MOCK_RATE_LIMITS", "1") == "1"     # enforce the real per-endpoint quotas
+MOCK_SYMBOLS = int(os.getenv("MOCK_SYMBOLS", "500"))             # synthetic instruments for searchScrip
+MOCK_CASH = float(os.getenv("MOCK_CASH", "100000"))
+SYNTHETIC_TOKEN_BASE = 900000
+
+# Paths as called by smartapi-python's SmartConnect
+ROUTES = {
+    "/rest/auth/angelbroking/user/v1/loginByPassword": "generateSession",
+    "/rest/auth/angelbroking/jwt/v1/generateTokens": "renewAccessToken",
+    "/rest/secure/angelbroking/user/v1/getProfile": "getProfile",
+    "/rest/secure/angelbroking/user/v1/getRMS": "getRMS",
+    "/rest/secure/angelbroking/user/v1/logout": "terminateSession",
+    "/rest/secure/angelbroking/historical/v1/getCandleData": "getCandleData",
+    "/rest/secure/angelbroking/order/v1/searchScrip": "searchScrip",
+    "/rest/secure/angelbroking/order/v1/getLtpData": "ltpData",
+    "/rest/secure/angelbroking/market/v1/quote": "getMarketData",
+    "/rest/secure/angelbroking/order/v1/placeOrder": "placeOrder",
+    "/rest/secure/angelbroking/order/v1/modifyOrder": "modifyOrder",
+    "/rest/secure/angelbroking/order/v1/cancelOrder": "cancelOrder",
+    "/rest/secure/angelbroking/order/v1/getOrderBook": "orderBook",
+}
+PUBLIC_ENDPOINTS = {"generateSession", "renewAccessToken"}
+RATE_LIMIT_TEXT = "Access denied because of exceeding access rate"
+RESTING_ORDER_TYPES = {"LIMIT", "STOPLOSS_LIMIT", "STOPLOSS_MARKET"}
+OPEN_STATUSES = {"open", "trigger pending"}
+
+
+def ok(data, message="SUCCESS"):
+    return {"status": True, "message": message, "errorcode": "", "data": data}
+
+
+def error(message, errorcode):
+    return {"status": False, "message": message, "errorcode": errorcode, "data": None}
+
+
+def _synthetic_columns(seed, date, n):
+    rng = np.random.default_rng([seed, date.toordinal()])
+    base = 100 + seed % 4900
+    level = base * np.exp(np.random.default_rng([seed, date.toordinal() // 7]).normal(0, 0.05))
+    close = level * np.exp(np.cumsum(rng.normal(0, 0.0015, n)))
+    open_ = np.concatenate([[level], close[:-1]])
+    high = np.maximum(open_, close) * (1 + rng.random(n) * 0.001)
+    low = np.minimum(open_, close) * (1 - rng.random(n) * 0.001)
+    volume = rng.integers(1_000, 50_000, n)
+    return open_, high, low, close, volume
+
+
+def synthetic_day(token, date):
+    """Deterministic 5-minute OHLCV for a token the store does not hold"""
+    index = expected_timestamps(date)
+    if index.empty:
+        return pd.DataFrame()
+    columns = _synthetic_columns(zlib.crc32(str(token).encode()), date, len(index))
+    return pd.DataFrame(dict(zip(['open', 'high', 'low', 'close', 'volume'], columns)), index=index).round(2)
+
+
+def synthetic_range(token, start, end):
+    """synthetic_day for every session in [start, end] as one frame, built without a per-day concat"""
+    seed = zlib.crc32(str(token).encode())
+    indexes, parts = [], []
+    for date in trading_days(start, end):
+        index = expected_timestamps(date)
+        indexes.append(index)
+        parts.append(_synthetic_columns(seed, date, len(index)))
+    if not parts:
+        return pd.DataFrame()
+    columns = [np.concatenate(c) for c in zip(*parts)]
+    index = pd.DatetimeIndex(np.concatenate([i.asi8 for i in indexes]), name='timestamp').tz_localize('UTC').tz_convert(IST)
+    return pd.DataFrame(dict(zip(['open', 'high', 'low', 'close', 'volume'], columns)), index=index).round(2)
+
+
+class MockBroker:
+    """State behind the mock endpoints: sessions, instruments, orders, cash and call counters"""
+
+    def __init__(self, store_dir=CANDLE_STORE_DIR):
+        self.store = CandleStore(store_dir)
+        self.lock = threading.Lock()
+        self.sessions = {}       # jwt -> clientcode
+        self.refresh_tokens = {} # refresh token -> clientcode
+        self.calls = {}          # (api key, endpoint) -> deque of call times
+        self.orders = []
+        self.cash = MOCK_CASH
+        self.stats = {}          # endpoint -> {"calls", "errors", "rate_limited"}
+        self.instruments = self._instruments()
+
+    def _instruments(self):
+        stored = sorted(d for d in os.listdir(self.store.root)
+                        if os.path.isdir(os.path.join(self.store.root, d))) if os.path.isdir(self.store.root) else []
+        instruments = [{"exchange": "NSE", "tradingsymbol": f"{token}-EQ", "symboltoken": token} for token in stored]
+        instruments += [{"exchange": "NSE", "tradingsymbol": f"MOCK{i:03d}-EQ", "symboltoken": str(SYNTHETIC_TOKEN_BASE + i)}
+                        for i in range(MOCK_SYMBOLS)]
+        return instruments
+
+    # ---- MARKET DATA ----
+    def candles(self, token, start, end):
+        """Bars starting in [start, end] that have started by now, like the real endpoint"""
+        end = min(end, datetime.datetime.now(IST))
+        frames = []
+        for date in trading_days(start.date(), end.date()):
+            df = self.store.load_day(token, date)
+            frames.append(df if not df.empty else synthetic_day(token, date))
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames).sort_index()
+        return df[(df.index >= start) & (df.index <= end)]
+
+    def last_price(self, token):
+        now = datetime.datetime.now(IST)
+        df = self.candles(token, now - datetime.timedelta(days=7), now)
+        return float(df['close'].iloc[-1]) if not df.empty else 0.0
+
+    # ---- PLUMBING ----
+    def _count(self, endpoint, key):
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, {"calls": 0, "errors": 0, "rate_limited": 0})
+            stats[key] += 1
+
+    def _rate_limited(self, api_key, endpoint):
+        quotas = ENDPOINT_QUOTAS.get(endpoint)
+        if not MOCK_RATE_LIMITS or not quotas:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            calls = self.calls.setdefault((api_key, endpoint), deque())
+            longest = max(seconds for _, seconds in quotas)
+            while calls and now - calls[0] >= longest:
+                calls.popleft()
+            for limit, seconds in quotas:
+                if sum(1 for t in calls if now - t < seconds) >= limit:
+                    return True
+            calls.append(now)
+        return False
+
+    def handle(self, endpoint, body, headers):
+        """(http status, payload) for one request; payload is a dict or plain text"""
+        delay = MOCK_LATENCY_MS + random.uniform(-1, 1) * MOCK_LATENCY_JITTER_MS
+        if random.random() < MOCK_SLOW_RATE:
+            delay = MOCK_SLOW_MS
+        time.sleep(max(0.0, delay) / 1000)
+        self._count(endpoint, "calls")
+
+        if self._rate_limited(headers.get("X-PrivateKey", ""), endpoint):
+            self._count(endpoint, "rate_limited")
+            return 403, RATE_LIMIT_TEXT
+        if random.random() < MOCK_ERROR_RATE:
+            self._count(endpoint, "errors")
+            return 200, error("Something Went Wrong, Please Try After Sometime", "AB1004")
+        if endpoint not in PUBLIC_ENDPOINTS:
+            jwt = headers.get("Authorization", "").replace("Bearer ", "")
+            with self.lock:
+                client = self.sessions.get(jwt)
+            if client is None:
+                self._count(endpoint, "errors")
+                return 200, error("Invalid Token", "AG8001")
+        return 200, getattr(self, f"_{endpoint}")(body)
+
+    def _new_tokens(self, client):
+        tokens = {"jwtToken": f"mock-jwt-{uuid.uuid4().hex}", "refreshToken": f"mock-refresh-{uuid.uuid4().hex}",
+                  "feedToken": f"mock-feed-{uuid.uuid4().hex}"}
+        with self.lock:
+            self.sessions[tokens["jwtToken"]] = client
+            self.refresh_tokens[tokens["refreshToken"]] = client
+        return tokens
+
+    # ---- ENDPOINTS ----
+    def _generateSession(self, body):
+        if not body.get("clientcode") or not body.get("password"):
+            return error("Invalid clientcode or password", "AB1007")
+        return ok(self._new_tokens(body["clientcode"]))
+
+    def _renewAccessToken(self, body):
+        with self.lock:
+            client = self.refresh_tokens.get(body.get("refreshToken"))
+        if client is None:
+            return error("Invalid refresh token", "AB8051")
+        return ok(self._new_tokens(client))
+
+    def _getProfile(self, body):
+        return ok({"clientcode": "MOCK", "name": "Mock Trader", "email": "", "mobileno": "",
+                   "exchanges": ["NSE", "BSE", "MCX"], "products": ["MIS", "CNC", "NRML"],
+                   "lastlogintime": "", "brokerid": "B2C"})
+
+    def _terminateSession(self, body):
+        return ok("Logout Successfully")
+
+    def _getRMS(self, body):
+        with self.lock:
+            cash = self.cash
+        return ok({"net": f"{cash:.2f}", "availablecash": f"{cash:.2f}", "availableintradaypayin": "0",
+                   "availablelimitmargin": "0", "collateral": "0", "m2munrealized": "0",
+                   "m2mrealized": "0", "utiliseddebits": f"{MOCK_CASH - cash:.2f}"})
+
+    def _getCandleData(self, body):
+        try:
+            start = IST.localize(datetime.datetime.strptime(body["fromdate"], "%Y-%m-%d %H:%M"))
+            end = IST.localize(datetime.datetime.strptime(body["todate"], "%Y-%m-%d %H:%M"))
+        except (KeyError, ValueError):
+            return error("Invalid date or time format", "AB13000")
+        if body.get("interval", "FIVE_MINUTE") != "FIVE_MINUTE":
+            return error(f"Interval {body.get('interval')} not served by the mock", "AB13000")
+        df = self.candles(str(body.get("symboltoken")), start, end)
+        rows = [[ts.isoformat(), o, h, l, c, int(v)]
+                for ts, o, h, l, c, v in zip(df.index, df['open'], df['high'], df['low'], df['close'], df['volume'])]
+        return ok(rows)
+
+    def _searchScrip(self, body):
+        term = str(body.get("searchscrip", "")).upper()
+        matches = [i for i in self.instruments if term in i["tradingsymbol"]]
+        if not matches:
+            return ok([], "No matching trading symbols found")
+        return ok(matches)
+
+    def _ltpData(self, body):
+        token = str(body.get("symboltoken"))
+        now = datetime.datetime.now(IST)
+        df = self.candles(token, now - datetime.timedelta(days=7), now)
+        if df.empty:
+            return error("No data", "AB4003")
+        today = df[df.index.date == df.index[-1].date()]
+        return ok({"exchange": body.get("exchange", "NSE"), "tradingsymbol": body.get("tradingsymbol"),
+                   "symboltoken": token, "open": float(today['open'].iloc[0]), "high": float(today['high'].max()),
+                   "low": float(today['low'].min()), "close": float(df['close'].iloc[-1]),
+                   "ltp": float(df['close'].iloc[-1])})
+
+    def _getMarketData(self, body):
+        if body.get("mode") != "LTP":
+            return error(f"Mode {body.get('mode')} not served by the mock", "AB13000")
+        fetched, unfetched = [], []
+        for exchange, tokens in (body.get("exchangeTokens") or {}).items():
+            for token in tokens:
+                price = self.last_price(str(token))
+                if not price:
+                    unfetched.append({"exchange": exchange, "symbolToken": str(token), "message": "No data"})
+                    continue
+                fetched.append({"exchange": exchange, "tradingSymbol": next((i["tradingsymbol"] for i in self.instruments
+                                                                 if i["symboltoken"] == str(token)), ""),
+                                "symbolToken": str(token), "ltp": price})
+        return ok({"fetched": fetched, "unfetched": unfetched})
+
+    def _placeOrder(self, body):
+        try:
+            qty = int(body["quantity"])
+            side = body["transactiontype"]
+            token = str(body["symboltoken"])
+        except (KeyError, ValueError):
+            return error("Invalid order parameters", "AB4008")
+        order_type = body.get("ordertype", "MARKET")
+        order_id = f"{datetime.datetime.now(IST):%y%m%d}{uuid.uuid4().int % 10**9:09d}"
+        order = {"orderid": order_id, "variety": body.get("variety", "NORMAL"), "tradingsymbol": body.get("tradingsymbol"),
+                 "symboltoken": token, "transactiontype": side, "quantity": str(qty), "ordertype": order_type,
+                 "producttype": body.get("producttype"), "price": float(body.get("price") or 0),
+                 "triggerprice": float(body.get("triggerprice") or 0), "averageprice": 0.0, "text": ""}
+        if order_type in RESTING_ORDER_TYPES:
+            self._set_status(order, "trigger pending" if order_type.startswith("STOPLOSS") else "open")
+            with self.lock:
+                self.orders.append(order)
+            self._match_resting()
+        else:
+            self._fill(order, self.last_price(token))
+            with self.lock:
+                self.orders.append(order)
+        return ok({"script": body.get("tradingsymbol"), "orderid": order_id, "uniqueorderid": str(uuid.uuid4())})
+
+    def _modifyOrder(self, body):
+        with self.lock:
+            order = next((o for o in self.orders if o["orderid"] == str(body.get("orderid"))), None)
+            if order is None or order["status"] not in OPEN_STATUSES:
+                return error("Order not found or not open", "AB4009")
+            for key in ("price", "triggerprice"):
+                if key in body:
+                    order[key] = float(body[key] or 0)
+            if "quantity" in body:
+                order["quantity"] = str(int(body["quantity"]))
+            order["ordertype"] = body.get("ordertype", order["ordertype"])
+        self._match_resting()
+        return ok({"orderid": order["orderid"]})
+
+    def _cancelOrder(self, body):
+        with self.lock:
+            order = next((o for o in self.orders if o["orderid"] == str(body.get("orderid"))), None)
+            if order is None or order["status"] not in OPEN_STATUSES:
+                return error("Order not found or not open", "AB4009")
+            self._set_status(order, "cancelled")
+        return ok({"orderid": order["orderid"]})
+
+    def _orderBook(self, body):
+        self._match_resting()
+        with self.lock:
+            return ok([dict(o) for o in self.orders])
+
+    # ---- ORDER MATCHING ----
+    @staticmethod
+    def _set_status(order, status):
+        order["status"] = order["orderstatus"] = status
+        order["updatetime"] = datetime.datetime.now(IST).strftime("%d-%b-%Y %H:%M:%S")
+
+    def _fill(self, order, price):
+        """Mark order complete at price; the caller holds the lock or owns the order"""
+        self.cash += (-1 if order["transactiontype"] == "BUY" else 1) * int(order["quantity"]) * price
+        order["averageprice"] = price
+        order["filledshares"] = order["quantity"]
+        self._set_status(order, "complete")
+
+    def _match_resting(self):
+        """Fill open limit / stop orders the last price has reached"""
+        with self.lock:
+            resting = [o for o in self.orders if o["status"] in OPEN_STATUSES]
+        prices = {token: self.last_price(token) for token in {o["symboltoken"] for o in resting}}
+        with self.lock:
+            for order in resting:
+                if order["status"] not in OPEN_STATUSES:
+                    continue
+                ltp = prices[order["symboltoken"]]
+                buy = order["transactiontype"] == "BUY"
+                if order["ordertype"].startswith("STOPLOSS"):
+                    trigger = order["triggerprice"]
+                    if not ltp or (ltp < trigger if buy else ltp > trigger):
+                        continue
+                    fill = ltp if order["ordertype"] == "STOPLOSS_MARKET" else order["price"]
+                elif order["ordertype"] == "LIMIT":
+                    if not ltp or (ltp > order["price"] if buy else ltp < order["price"]):
+                        continue
+                    fill = order["price"]
+                else:
+                    fill = ltp
+                self._fill(order, fill)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256     # hundreds of simulated clients connect at once
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def log_message(self, fmt, *args):
+        logging.debug(fmt % args)
+
+    def _dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        path = urlparse(self.path).path
+        if path == "/mock/stats":
+            return self._send(200, self.server.broker.stats)
+        endpoint = ROUTES.get(path)
+        if endpoint is None:
+            return self._send(404, error(f"Unknown route {path}", "AB404"))
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            return self._send(400, error("Invalid JSON body", "AB400"))
+        status, payload = self.server.broker.handle(endpoint, body, self.headers)
+        self._send(status, payload)
+
+    def _send(self, status, payload):
+        if isinstance(payload, str):
+            data, content_type = payload.encode(), "text/plain"
+        else:
+            data, content_type = json.dumps(payload).encode(), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(address=MOCK_ADDRESS, broker=None):
+    """Build the server; call serve_forever() on it (or run it in a thread for tests)"""
+    host, port = address.rsplit(":", 1)
+    server = MockServer((host, int(port)), MockHandler)
+    server.broker = broker or MockBroker()
+    return server
+
+
+if __name__ == "__main__":
+    setup_logging(os.getenv("MOCK_LOG_FILE", "mock_smartapi.log"))
+    server = serve()
+    print(f"🧪 Mock SmartAPI on http://{MOCK_ADDRESS} "
+          f"(latency {MOCK_LATENCY_MS:.0f}±{MOCK_LATENCY_JITTER_MS:.0f}ms, errors {MOCK_ERROR_RATE:.1%}, "
+          f"rate limits {'on' if MOCK_RATE_LIMITS else 'off'}, {len(server.broker.instruments)} instruments)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,257 @@
+import os
+import sys
+import time
+import math
+import logging
+import datetime
+import numpy as np
+import pandas as pd
+from trading_calendar import IST, BAR_MINUTES
+from results_store import load_run
+
+# ---- FILL MODEL CONFIG ----
+PAPER_LATENCY_MS = float(os.getenv("PAPER_LATENCY_MS", "350"))         # signal -> exchange arrival
+PAPER_LATENCY_JITTER_MS = float(os.getenv("PAPER_LATENCY_JITTER_MS", "150"))
+PAPER_SPREAD_BPS = float(os.getenv("PAPER_SPREAD_BPS", "3"))           # full quoted spread, half is paid per fill
+PAPER_SLIPPAGE_BPS = float(os.getenv("PAPER_SLIPPAGE_BPS", "1"))       # fixed adverse slippage
+PAPER_IMPACT_BPS = float(os.getenv("PAPER_IMPACT_BPS", "25"))          # x sqrt(fill qty / bar volume)
+PAPER_MAX_VOLUME_PCT = float(os.getenv("PAPER_MAX_VOLUME_PCT", "10"))  # share of a bar's volume one order can take
+PAPER_FILLS_FILE = os.getenv("PAPER_FILLS_FILE", "paper_fills.csv")
+
+# ---- NSE INTRADAY EQUITY CHARGES ----
+BROKERAGE_PCT = 0.03          # per order, capped at BROKERAGE_CAP
+BROKERAGE_CAP = 20.0
+STT_SELL_PCT = 0.025
+EXCHANGE_TXN_PCT = 0.00297
+SEBI_FEE_PCT = 0.0001
+STAMP_DUTY_BUY_PCT = 0.003
+GST_PCT = 18.0
+
+
+def trade_charges(side, qty, price):
+    """Brokerage plus statutory charges for one intraday equity fill"""
+    turnover = qty * price
+    brokerage = min(BROKERAGE_CAP, turnover * BROKERAGE_PCT / 100)
+    exchange = turnover * EXCHANGE_TXN_PCT / 100
+    sebi = turnover * SEBI_FEE_PCT / 100
+    stt = turnover * STT_SELL_PCT / 100 if side == "SELL" else 0.0
+    stamp = turnover * STAMP_DUTY_BUY_PCT / 100 if side == "BUY" else 0.0
+    gst = (brokerage + exchange + sebi) * GST_PCT / 100
+    return brokerage + exchange + sebi + stt + stamp + gst
+
+
+class PaperBroker:
+    """Fills paper orders against the bars (or ticks) that follow the signal.
+
+    An order reaches the exchange latency after it is submitted and is filled from the
+    first bar that is still open at that moment: at the bar open if it arrived before the
+    bar started, otherwise at the open-to-close interpolation for its arrival time. Half
+    the spread, fixed slippage and square-root market impact are charged against the
+    order, and no single bar fills more than PAPER_MAX_VOLUME_PCT of its volume; the
+    remainder waits for the next bar.
+    """
+
+    def __init__(self, latency_ms=PAPER_LATENCY_MS, jitter_ms=PAPER_LATENCY_JITTER_MS,
+                 spread_bps=PAPER_SPREAD_BPS, slippage_bps=PAPER_SLIPPAGE_BPS,
+                 impact_bps=PAPER_IMPACT_BPS, max_volume_pct=PAPER_MAX_VOLUME_PCT,
+                 bar_minutes=BAR_MINUTES, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.spread_bps = spread_bps
+        self.slippage_bps = slippage_bps
+        self.impact_bps = impact_bps
+        self.max_volume_pct = max_volume_pct
+        self.bar = datetime.timedelta(minutes=bar_minutes)
+        self.rng = np.random.default_rng(seed)
+        self.pending = []
+        self.fills = []
+        self.last_close = None
+        self.last_time = None
+        self.next_id = 1
+
+    # ---- ORDERS ----
+    def submit(self, side, qty, submit_time=None, signal_price=None, symbol=None):
+        """Queue a market order; signal_price defaults to the close of the last bar seen"""
+        submit_time = submit_time or datetime.datetime.now(IST)
+        latency = max(0.0, self.latency_ms + self.rng.normal(0.0, self.jitter_ms)) if self.jitter_ms else self.latency_ms
+        order = {
+            'order_id': f"PAPER-{self.next_id}",
+            'symbol': symbol,
+            'side': side,
+            'qty': int(qty),
+            'remaining': int(qty),
+            'submit_time': submit_time,
+            'arrival_time': submit_time + datetime.timedelta(milliseconds=latency),
+            'signal_price': signal_price if signal_price is not None else self.last_close,
+        }
+        self.next_id += 1
+        self.pending.append(order)
+        return {"status": "simulated", "action": side, "orderid": order['order_id']}
+
+    def _fill_price(self, side, base_price, qty, volume):
+        participation = qty / volume if volume else 0.0
+        cost_bps = self.spread_bps / 2 + self.slippage_bps + self.impact_bps * math.sqrt(participation)
+        direction = 1 if side == "BUY" else -1
+        return base_price * (1 + direction * cost_bps / 10_000)
+
+    def _record_fill(self, order, qty, price, fill_time, source):
+        order['remaining'] -= qty
+        signal = order['signal_price']
+        direction = 1 if order['side'] == "BUY" else -1
+        fill = {
+            'order_id': order['order_id'],
+            'symbol': order['symbol'],
+            'side': order['side'],
+            'qty': qty,
+            'price': price,
+            'fill_time': fill_time,
+            'submit_time': order['submit_time'],
+            'signal_price': signal,
+            # Positive = the fill was worse than the price the strategy decided on
+            'slippage_bps': direction * (price - signal) / signal * 10_000 if signal else np.nan,
+            'charges': trade_charges(order['side'], qty, price),
+            'source': source,
+        }
+        self.fills.append(fill)
+        logging.info(f"[PAPER FILL] {fill['side']} {qty} @ {price:.2f} | signal {signal} | "
+                     f"slippage {fill['slippage_bps']:.1f} bps | charges ₹{fill['charges']:.2f}")
+        return fill
+
+    # ---- MARKET DATA ----
+    def on_bar(self, start, open_, high, low, close, volume):
+        """Fill pending orders from one closed bar that starts at start"""
+        end = start + self.bar
+        new_fills = []
+        for order in self.pending:
+            if order['arrival_time'] >= end:
+                continue
+            if order['arrival_time'] <= start:
+                base = open_
+            else:
+                # Assume the price moved linearly from open to close through the bar
+                frac = (order['arrival_time'] - start) / self.bar
+                base = open_ + (close - open_) * frac
+            cap = int(volume * self.max_volume_pct / 100) if volume else order['remaining']
+            qty = min(order['remaining'], max(cap, 0))
+            if qty <= 0:
+                continue
+            price = self._fill_price(order['side'], base, qty, volume)
+            new_fills.append(self._record_fill(order, qty, price, max(start, order['arrival_time']), 'bar'))
+        self.pending = [o for o in self.pending if o['remaining'] > 0]
+        self.last_close = close
+        self.last_time = end
+        return new_fills
+
+    def on_tick(self, ts, price, volume=None):
+        """Fill pending orders that have reached the exchange from a recorded trade tick"""
+        new_fills = []
+        for order in self.pending:
+            if order['arrival_time'] > ts:
+                continue
+            cap = int(volume * self.max_volume_pct / 100) if volume else order['remaining']
+            qty = min(order['remaining'], cap)
+            if qty <= 0:
+                continue
+            fill_price = self._fill_price(order['side'], price, qty, volume)
+            new_fills.append(self._record_fill(order, qty, fill_price, ts, 'tick'))
+        self.pending = [o for o in self.pending if o['remaining'] > 0]
+        self.last_close = price
+        self.last_time = ts
+        return new_fills
+
+    def square_off(self, price=None, ts=None):
+        """Fill whatever is still pending at the last seen price (end of session auto square-off)"""
+        price = price if price is not None else self.last_close
+        ts = ts or self.last_time or datetime.datetime.now(IST)
+        new_fills = [self._record_fill(o, o['remaining'], self._fill_price(o['side'], price, 0, 0), ts, 'square_off')
+                     for o in self.pending]
+        self.pending = []
+        return new_fills
+
+    # ---- REPORTING ----
+    def fills_frame(self):
+        return pd.DataFrame(self.fills)
+
+    def summary(self):
+        """Signal-vs-fill gap and cost totals over every fill so far"""
+        fills = self.fills_frame()
+        if fills.empty:
+            return {'fills': 0}
+        notional = fills['qty'] * fills['signal_price']
+        gap = (fills['slippage_bps'] * notional).sum() / notional.sum()
+        return {
+            'fills': len(fills),
+            'orders': fills['order_id'].nunique(),
+            'partial_orders': int((fills.groupby('order_id').size() > 1).sum()),
+            'avg_slippage_bps': round(float(gap), 2),
+            'max_slippage_bps': round(float(fills['slippage_bps'].max()), 2),
+            'slippage_cost': round(float((fills['slippage_bps'] / 10_000 * notional).sum()), 2),
+            'charges': round(float(fills['charges'].sum()), 2),
+            'avg_fill_delay_s': round(float((fills['fill_time'] - fills['submit_time']).dt.total_seconds().mean()), 1),
+        }
+
+    def save_fills(self, path=PAPER_FILLS_FILE):
+        """Append fills to a CSV and clear them from memory"""
+        fills = self.fills_frame()
+        if fills.empty:
+            return
+        fills.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        self.fills = []
+
+
+def replay(orders, bars, broker=None):
+    """Fill a batch of orders against an IST-indexed OHLCV frame.
+
+    orders is a frame with submit_time, side, qty and signal_price columns. Bars are
+    visited only from each order's arrival onwards, so months of sessions replay in
+    time proportional to the number of orders rather than the number of bars.
+    """
+    broker = broker or PaperBroker()
+    starts = bars.index.asi8
+    opens, highs, lows, closes = (bars[c].to_numpy(dtype=np.float64) for c in ('open', 'high', 'low', 'close'))
+    volumes = bars['volume'].to_numpy(dtype=np.float64)
+    bar_ns = int(broker.bar.total_seconds() * 1e9)
+
+    for row in orders.itertuples(index=False):
+        broker.submit(row.side, row.qty, row.submit_time, row.signal_price, getattr(row, 'symbol', None))
+        arrival = pd.Timestamp(broker.pending[-1]['arrival_time']).value
+        # First bar that is still open when the order arrives
+        i = int(np.searchsorted(starts, arrival - bar_ns, side='right'))
+        while broker.pending and i < len(starts):
+            broker.on_bar(bars.index[i], opens[i], highs[i], lows[i], closes[i], volumes[i])
+            i += 1
+        if broker.pending:
+            # Ran out of data: fill at the last known price
+            broker.square_off(closes[-1], bars.index[-1] + broker.bar)
+    return broker
+
+
+def orders_from_trade_log(path, qty, bar_minutes=BAR_MINUTES):
+    """Orders the backtest would have sent: each signal fires when its candle closes"""
+    log = load_run(path, columns=['timestamp', 'action', 'price'])
+    submit_time = pd.to_datetime(log['timestamp'], format='ISO8601').dt.tz_convert(IST) + pd.Timedelta(minutes=bar_minutes)
+    return pd.DataFrame({
+        'submit_time': submit_time,
+        'side': log['action'],
+        'qty': qty,
+        'signal_price': log['price'],
+    })
+
+
+if __name__ == "__main__":
+    # python paper_broker.py <trade_log.csv> <token> [qty]
+    from candle_store import CandleStore
+
+    path, token = sys.argv[1], sys.argv[2]
+    qty = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    orders = orders_from_trade_log(path, qty)
+    bars = CandleStore().load(token, orders['submit_time'].min().date(), orders['submit_time'].max().date())
+    if bars.empty:
+        print(f"❌ No stored candles for token {token}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    broker = replay(orders, bars)
+    print(f"📄 Replayed {len(orders)} orders over {len(bars)} bars in {time.perf_counter() - start:.2f}s")
+    for key, value in broker.summary().items():
+        print(f"  {key:<18} {value}")
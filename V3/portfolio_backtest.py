@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import heapq
+import time
+import datetime
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from strategy_dsl import EMA_RSI_STRATEGY, load_strategy, compile_strategy
+from analytics import IST_OFFSET_NS, trades_from_frame, compute_metrics, print_report
+from candle_store import CandleStore, CANDLE_STORE_DIR
+from trading_calendar import IST
+
+# ---- PORTFOLIO CONFIG ----
+PORTFOLIO_CAPITAL = float(os.getenv("PORTFOLIO_CAPITAL", "1000000"))
+PORTFOLIO_ALLOCATION_PCT = float(os.getenv("PORTFOLIO_ALLOCATION_PCT", "10"))   # margin per position, % of realized equity
+PORTFOLIO_QTY = int(os.getenv("PORTFOLIO_QTY", "0"))                            # fixed shares per trade instead (0 = size by allocation)
+PORTFOLIO_LEVERAGE = float(os.getenv("PORTFOLIO_LEVERAGE", "1"))                # intraday (MIS) margin multiplier
+PORTFOLIO_MAX_POSITIONS = int(os.getenv("PORTFOLIO_MAX_POSITIONS", "10"))       # open at once across the book
+PORTFOLIO_MAX_DAILY_TRADES = int(os.getenv("PORTFOLIO_MAX_DAILY_TRADES", "20")) # entries per day across the book
+PORTFOLIO_BROKERAGE = float(os.getenv("PORTFOLIO_BROKERAGE", "20"))             # per round trip
+PORTFOLIO_WORKERS = int(os.getenv("PORTFOLIO_WORKERS", "0")) or os.cpu_count() or 1
+PORTFOLIO_SYNTHETIC = int(os.getenv("PORTFOLIO_SYNTHETIC", "0"))                # N mock-broker symbols instead of stored candles
+CHUNKS_PER_WORKER = 4           # smaller chunks keep every worker busy when symbols differ in history
+DAY_NS = np.int64(86_400 * 10**9)
+
+# ---- STAGE 1: CANDIDATES PER SYMBOL (parallel) ----
+# Each worker loads its symbols' bars, adds indicators and finds every entry the rules
+# allow with the exit it would get (Strategy.candidate_trades). Only those compact
+# arrays travel back; the bars never leave the worker.
+
+
+def load_bars(token, start, end, synthetic=False, store_root=CANDLE_STORE_DIR):
+    if synthetic:
+        from mock_smartapi import synthetic_range
+        return synthetic_range(token, start, end)
+    return CandleStore(store_root).load(token, start, end)
+
+
+def _evaluate_chunk(definition, tokens, start, end, synthetic, store_root):
+    """Worker: (token, candidate arrays, bar count) for each token of the chunk"""
+    strategy = compile_strategy(definition)
+    out = []
+    for token in tokens:
+        bars = load_bars(token, start, end, synthetic, store_root)
+        if bars.empty:
+            out.append((token, None, 0))
+            continue
+        found = strategy.candidate_trades(strategy.add_indicators(bars))
+        stamps = bars.index.asi8
+        close = bars['close'].to_numpy(dtype=np.float64)
+        out.append((token, {
+            'entry_time': stamps[found['entry']],
+            'exit_time': stamps[found['exit']],
+            'entry_price': close[found['entry']],
+            'exit_price': close[found['exit']],
+            'reason': found['reason'],
+        }, len(bars)))
+    return out
+
+
+def collect_candidates(definition, tokens, start, end, workers=PORTFOLIO_WORKERS, synthetic=False,
+                       store_root=CANDLE_STORE_DIR):
+    """Candidates of every token merged into one set of arrays sorted by entry time.
+
+    Same-time entries keep the order of tokens, so the earlier-listed symbol gets
+    capital first. Also returns the number of bars evaluated.
+    """
+    n_chunks = max(1, min(len(tokens), workers * CHUNKS_PER_WORKER))
+    chunks = [list(c) for c in np.array_split(np.array(tokens, dtype=object), n_chunks) if len(c)]
+    args = [(definition, c, start, end, synthetic, store_root) for c in chunks]
+    if workers == 1 or len(chunks) == 1:
+        results = [_evaluate_chunk(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(_evaluate_chunk, *zip(*args)))
+
+    rank = {token: i for i, token in enumerate(tokens)}
+    parts, bars = [{'entry_time': np.array([], dtype=np.int64), 'exit_time': np.array([], dtype=np.int64),
+                    'entry_price': np.array([]), 'exit_price': np.array([]), 'reason': np.array([], dtype=np.int8),
+                    'symbol': np.array([], dtype=np.int32)}], 0
+    for token, found, n_bars in (item for chunk in results for item in chunk):
+        bars += n_bars
+        if found is not None and len(found['entry_time']):
+            parts.append(dict(found, symbol=np.full(len(found['entry_time']), rank[token], dtype=np.int32)))
+    keys = ['entry_time', 'exit_time', 'entry_price', 'exit_price', 'reason', 'symbol']
+    candidates = {k: np.concatenate([p[k] for p in parts]) for k in keys}
+    order = np.lexsort((candidates['symbol'], candidates['entry_time']))
+    candidates = {k: v[order] for k, v in candidates.items()}
+    return candidates, bars
+
+
+# ---- STAGE 2: SHARED-CAPITAL MERGE ----
+def simulate(candidates, n_symbols, max_symbol_daily_trades, capital=PORTFOLIO_CAPITAL,
+             allocation_pct=PORTFOLIO_ALLOCATION_PCT, qty=PORTFOLIO_QTY, leverage=PORTFOLIO_LEVERAGE,
+             max_positions=PORTFOLIO_MAX_POSITIONS, max_daily_trades=PORTFOLIO_MAX_DAILY_TRADES,
+             brokerage=PORTFOLIO_BROKERAGE):
+    """Walk the candidates in time order as one book; returns (taken positions, qty, pnl, stats).
+
+    Exits are released (margin and P&L back to cash) before any entry at or after their
+    bar, so a position closing on a bar frees capital for an entry on that same bar. A
+    symbol already in a trade or at the strategy's own daily limit passes on its signal
+    exactly as the single-symbol backtest does; signals refused for the book's daily
+    limit, open-position cap or cash are counted in the stats.
+    """
+    # Plain lists: the loop touches one element at a time, where numpy scalars are slow
+    entry_time, exit_time = candidates['entry_time'].tolist(), candidates['exit_time'].tolist()
+    entry_price, exit_price = candidates['entry_price'].tolist(), candidates['exit_price'].tolist()
+    symbol = candidates['symbol'].tolist()
+    day = ((candidates['entry_time'] + IST_OFFSET_NS) // DAY_NS).tolist()
+
+    cash, equity = capital, capital
+    busy_until = [None] * n_symbols
+    symbol_trades = [0] * n_symbols
+    open_heap = []                  # (exit_time, candidate, margin, pnl)
+    taken, taken_qty, taken_pnl = [], [], []
+    current_day, book_trades = None, 0
+    stats = {'skipped_daily_limit': 0, 'skipped_max_positions': 0, 'skipped_capital': 0,
+             'peak_positions': 0, 'min_cash': capital}
+
+    for k in range(len(entry_time)):
+        t = entry_time[k]
+        while open_heap and open_heap[0][0] <= t:
+            _, _, margin, pnl = heapq.heappop(open_heap)
+            cash += margin + pnl
+            equity += pnl
+        s = symbol[k]
+        if busy_until[s] is not None and t <= busy_until[s]:
+            continue
+        if day[k] != current_day:
+            current_day, book_trades = day[k], 0
+            symbol_trades = [0] * n_symbols
+        if symbol_trades[s] >= max_symbol_daily_trades:
+            continue
+        if book_trades >= max_daily_trades:
+            stats['skipped_daily_limit'] += 1
+            continue
+        if len(open_heap) >= max_positions:
+            stats['skipped_max_positions'] += 1
+            continue
+
+        price = entry_price[k]
+        affordable = int(max(cash, 0.0) * leverage // price)
+        shares = qty if qty else min(int(equity * allocation_pct / 100 * leverage // price), affordable)
+        if shares < 1 or shares > affordable:
+            stats['skipped_capital'] += 1
+            continue
+        margin = shares * price / leverage
+        pnl = (exit_price[k] - price) * shares - brokerage
+        cash -= margin
+        heapq.heappush(open_heap, (exit_time[k], k, margin, pnl))
+        busy_until[s] = exit_time[k]
+        symbol_trades[s] += 1
+        book_trades += 1
+        taken.append(k)
+        taken_qty.append(shares)
+        taken_pnl.append(pnl)
+        stats['peak_positions'] = max(stats['peak_positions'], len(open_heap))
+        stats['min_cash'] = min(stats['min_cash'], cash)
+
+    for _, _, margin, pnl in open_heap:
+        cash += margin + pnl
+        equity += pnl
+    stats['final_equity'] = round(float(equity), 2)
+    stats['return_pct'] = round(float((equity - capital) / capital * 100), 2)
+    stats['min_cash'] = round(float(stats['min_cash']), 2)
+    return np.array(taken, dtype=np.int64), np.array(taken_qty, dtype=np.int64), np.array(taken_pnl), stats
+
+
+def trade_log(candidates, taken, qty, pnl, reasons, tokens):
+    """BUY then SELL row per trade (timestamp, symbol, action, price, qty, pnl, reason), in entry order"""
+    n = len(taken)
+    symbols = np.array(tokens, dtype=object)[candidates['symbol'][taken]]
+    stamps = np.empty(2 * n, dtype=np.int64)
+    stamps[0::2], stamps[1::2] = candidates['entry_time'][taken], candidates['exit_time'][taken]
+    prices = np.empty(2 * n)
+    prices[0::2], prices[1::2] = candidates['entry_price'][taken], candidates['exit_price'][taken]
+    row_pnl = np.zeros(2 * n)
+    row_pnl[1::2] = pnl
+    row_reason = np.full(2 * n, '', dtype=object)
+    row_reason[1::2] = np.array(reasons, dtype=object)[candidates['reason'][taken]]
+    return pd.DataFrame({
+        'timestamp': pd.DatetimeIndex(stamps, tz='UTC').tz_convert(IST),
+        'symbol': np.repeat(symbols, 2),
+        'action': np.tile(np.array(['BUY', 'SELL'], dtype=object), n),
+        'price': prices,
+        'qty': np.repeat(qty, 2),
+        'pnl': row_pnl,
+        'reason': row_reason,
+    })
+
+
+def run_portfolio(definition, tokens, start, end, workers=PORTFOLIO_WORKERS, synthetic=False, **limits):
+    """Portfolio trade log, book stats and stage timings for tokens traded together"""
+    strategy = compile_strategy(definition)
+    started = time.perf_counter()
+    candidates, bars = collect_candidates(definition, tokens, start, end, workers, synthetic)
+    evaluated = time.perf_counter()
+    taken, qty, pnl, stats = simulate(candidates, len(tokens), strategy.max_daily_trades, **limits)
+    log = trade_log(candidates, taken, qty, pnl, strategy.exit_reason_names(), tokens)
+    merged = time.perf_counter()
+    stats.update(symbols=len(tokens), bars=bars, candidates=len(candidates['entry_time']), trades=len(taken),
+                 evaluate_secs=round(evaluated - started, 2), merge_secs=round(merged - evaluated, 2))
+    return log, stats
+
+
+if __name__ == "__main__":
+    # python portfolio_backtest.py <start YYYY-MM-DD> <end YYYY-MM-DD> [token ...] [--strategy strategy.json]
+    # With no tokens every token in the candle store is traded; PORTFOLIO_SYNTHETIC=N uses
+    # N mock-broker symbols instead (no stored data needed, e.g. for timing runs).
+    from results_store import write_run
+
+    args = sys.argv[1:]
+    definition = EMA_RSI_STRATEGY
+    if "--strategy" in args:
+        i = args.index("--strategy")
+        definition = load_strategy(args[i + 1])
+        del args[i:i + 2]
+    start, end = (datetime.date.fromisoformat(d) for d in args[:2])
+    tokens = args[2:]
+    synthetic = PORTFOLIO_SYNTHETIC > 0
+    if synthetic:
+        from mock_smartapi import SYNTHETIC_TOKEN_BASE
+        tokens = tokens or [str(SYNTHETIC_TOKEN_BASE + i) for i in range(PORTFOLIO_SYNTHETIC)]
+    elif not tokens and os.path.isdir(CANDLE_STORE_DIR):
+        tokens = sorted(d for d in os.listdir(CANDLE_STORE_DIR) if os.path.isdir(os.path.join(CANDLE_STORE_DIR, d)))
+    if not tokens:
+        print(f"❌ No tokens given and none stored in {CANDLE_STORE_DIR}")
+        sys.exit(1)
+
+    print(f"📚 Portfolio backtest: {len(tokens)} symbols | {start} -> {end} | capital INR {PORTFOLIO_CAPITAL:,.0f} | "
+          f"max {PORTFOLIO_MAX_POSITIONS} positions, {PORTFOLIO_MAX_DAILY_TRADES} trades/day | {PORTFOLIO_WORKERS} workers")
+    log, stats = run_portfolio(definition, tokens, start, end, synthetic=synthetic)
+    if log.empty:
+        print("❌ No trades")
+        sys.exit(1)
+    print_report(*compute_metrics(trades_from_frame(log)))
+    print("\n  PORTFOLIO:")
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+
+    params = dict(definition, tokens=tokens, capital=PORTFOLIO_CAPITAL, allocation_pct=PORTFOLIO_ALLOCATION_PCT,
+                  qty=PORTFOLIO_QTY, leverage=PORTFOLIO_LEVERAGE, max_positions=PORTFOLIO_MAX_POSITIONS,
+                  book_max_daily_trades=PORTFOLIO_MAX_DAILY_TRADES, brokerage=PORTFOLIO_BROKERAGE)
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:8]
+    path = write_run(log, "portfolio", f"{len(tokens)}sym_{start:%Y%m%d}_{end:%Y%m%d}_{digest}",
+                     params=dict(params, stats=stats), start=start, end=end)
+    print(f"💾 Trade log written to {path}")
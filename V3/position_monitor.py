@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import threading
+from api_scheduler import scheduler, SESSION, ENDPOINT_QUOTAS
+
+
+def min_poll_secs(endpoint, calls_per_poll=1, quotas=None):
+    """Shortest poll interval that keeps calls_per_poll calls of endpoint inside every quota window"""
+    quotas = scheduler.quotas if quotas is None else quotas
+    return max((seconds * calls_per_poll / limit for limit, seconds in quotas.get(endpoint, [])), default=0.0)
+
+
+# ---- MONITOR CONFIG ----
+# Polling faster than the hourly getMarketData quota allows (3600s / 5000 = 0.72s) exhausts it
+# within the hour and the scheduler then stalls the monitor until old calls age out
+MIN_POLL_SECS = min_poll_secs("getMarketData", quotas=ENDPOINT_QUOTAS)
+POSITION_POLL_SECS = float(os.getenv("POSITION_POLL_SECS", "0.75"))  # LTP cadence between candles
+QUOTE_ERROR_LOG_SECS = 30        # repeated quote failures are logged at most this often
+
+
+def fetch_ltp(obj, positions, exchange="NSE"):
+    """{token: ltp} for every watched position; one getMarketData call covers all of them"""
+    tokens = [p['token'] for p in positions]
+    if hasattr(obj, "getMarketData"):
+        response = scheduler.call('getMarketData', obj.getMarketData, "LTP", {exchange: tokens}, priority=SESSION)
+        if not response or not response.get('data'):
+            raise RuntimeError(response.get('message') if response else "empty response")
+        return {str(q['symbolToken']): float(q['ltp']) for q in response['data'].get('fetched', [])}
+    # Older smartapi-python releases only have the single-instrument endpoint
+    prices = {}
+    for p in positions:
+        response = scheduler.call('ltpData', obj.ltpData, exchange, p['symbol'], p['token'], priority=SESSION)
+        if response and response.get('data'):
+            prices[p['token']] = float(response['data']['ltp'])
+    return prices
+
+
+def ltp_min_interval(obj, positions):
+    """Shortest sustainable interval between fetch_ltp polls of positions"""
+    if hasattr(obj, "getMarketData"):
+        return min_poll_secs("getMarketData")
+    return min_poll_secs("ltpData", len(positions))
+
+
+class PositionMonitor:
+    """Fires stop-loss / target exits on the live price instead of waiting for the candle to close.
+
+    quote_fn(positions) -> {token: ltp} is polled every poll_secs by one daemon thread for
+    all open positions; on_tick(token, ltp) can also be fed directly from a tick stream.
+    A position is dropped before on_exit(symbol, token, ltp, reason) runs, so each exit
+    fires once however many quotes cross the level. min_interval(positions) stretches the
+    cadence when a poll costs more than one quota-counted call.
+    """
+
+    def __init__(self, quote_fn, on_exit, poll_secs=POSITION_POLL_SECS, min_interval=None):
+        if poll_secs < MIN_POLL_SECS:
+            raise ValueError(f"poll_secs={poll_secs} is faster than the getMarketData quota allows "
+                             f"(minimum {MIN_POLL_SECS:.2f}s)")
+        self.quote_fn = quote_fn
+        self.on_exit = on_exit
+        self.poll_secs = poll_secs
+        self.min_interval = min_interval or (lambda positions: MIN_POLL_SECS)
+        self.lock = threading.Lock()
+        self.positions = {}      # token -> {symbol, token, entry, stop, target}
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_error_log = 0.0
+        self.stats = {"polls": 0, "quote_errors": 0, "exits": 0}
+
+    # ---- POSITIONS ----
+    def watch(self, symbol, token, entry_price, stop_pct, target_pct):
+        """Start (or re-arm) watching token; stop_pct / target_pct are percentages of entry_price"""
+        position = {
+            'symbol': symbol, 'token': str(token), 'entry': entry_price,
+            'stop': entry_price * (1 - stop_pct / 100), 'target': entry_price * (1 + target_pct / 100),
+        }
+        with self.lock:
+            current = self.positions.get(position['token'])
+            if current is not None and current['entry'] == entry_price:
+                return
+            self.positions[position['token']] = position
+        logging.info(f"Watching {symbol} on LTP | Entry: INR {entry_price:.2f} | "
+                     f"Stop: INR {position['stop']:.2f} | Target: INR {position['target']:.2f}")
+
+    def unwatch(self, token):
+        with self.lock:
+            return self.positions.pop(str(token), None)
+
+    def on_tick(self, token, ltp):
+        """Check one price against its position's levels; returns the exit reason, if any"""
+        token = str(token)
+        with self.lock:
+            position = self.positions.get(token)
+            if position is None:
+                return None
+            if ltp <= position['stop']:
+                reason = "Stop Loss (LTP)"
+            elif ltp >= position['target']:
+                reason = "Target Hit (LTP)"
+            else:
+                return None
+            del self.positions[token]
+            self.stats["exits"] += 1
+        try:
+            self.on_exit(position['symbol'], token, ltp, reason)
+        except Exception as e:
+            logging.error(f"LTP exit failed for {position['symbol']}: {e}")
+        return reason
+
+    # ---- POLLING ----
+    def poll_once(self):
+        """Quote every watched position once; returns the positions polled"""
+        with self.lock:
+            positions = list(self.positions.values())
+        if not positions:
+            return positions
+        self.stats["polls"] += 1
+        try:
+            prices = self.quote_fn(positions)
+        except Exception as e:
+            self.stats["quote_errors"] += 1
+            now = time.monotonic()
+            if now - self.last_error_log >= QUOTE_ERROR_LOG_SECS:
+                self.last_error_log = now
+                logging.warning(f"LTP poll failed ({self.stats['quote_errors']} so far): {e}")
+            return positions
+        for token, ltp in prices.items():
+            self.on_tick(token, ltp)
+        return positions
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            positions = self.poll_once()
+            interval = max(self.poll_secs, self.min_interval(positions)) if positions else self.poll_secs
+            self.stop_event.wait(max(0.0, interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="position-monitor", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.poll_secs + 1)
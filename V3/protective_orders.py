@@ -0,0 +1,280 @@
+import os
+import time
+import logging
+import threading
+from api_scheduler import scheduler, SESSION
+from position_monitor import fetch_ltp
+
+# ---- PROTECTIVE ORDER CONFIG ----
+PROTECTIVE_ORDERS = os.getenv("PROTECTIVE_ORDERS", "SL").upper()   # SL: stop (SL-M) + target (LIMIT) rest at the exchange, OFF: bot-side exits only
+RECONCILE_SECS = float(os.getenv("RECONCILE_SECS", "5"))          # order-book poll for leg fills
+ENTRY_FILL_TIMEOUT_SECS = float(os.getenv("ENTRY_FILL_TIMEOUT_SECS", "30"))   # wait for the BUY fill before the legs go up
+ENTRY_FILL_POLL_SECS = 1.0       # orderBook allows one call a second
+TICK_SIZE = 0.05
+FILLED_STATUS = "complete"
+DEAD_STATUSES = {"cancelled", "rejected"}
+LEG_REASONS = {'stop': "Stop Loss (exchange)", 'target': "Target Hit (exchange)"}
+
+
+class LegsUnconfirmed(RuntimeError):
+    """The order book could not be read after cancelling the legs, so a fill cannot be ruled out"""
+
+
+class EntryNotFilled(RuntimeError):
+    """The broker cancelled or rejected the entry order; there is no position to protect"""
+
+
+def round_to_tick(price, tick=TICK_SIZE):
+    return round(round(price / tick) * tick, 2)
+
+
+def order_book(obj):
+    """{order id: order} for today's orders"""
+    response = scheduler.call('orderBook', obj.orderBook, priority=SESSION)
+    return {str(o['orderid']): o for o in (response or {}).get('data') or []}
+
+
+def order_status(order):
+    return str(order.get('status') or order.get('orderstatus') or "").lower()
+
+
+def wait_for_fill(obj, order_id, timeout=ENTRY_FILL_TIMEOUT_SECS, poll_secs=ENTRY_FILL_POLL_SECS):
+    """The entry order once it is complete, None if it is still working after timeout.
+
+    Raises EntryNotFilled when the broker cancels or rejects it.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            order = order_book(obj).get(str(order_id))
+        except Exception as e:
+            logging.warning(f"Could not read entry order {order_id}: {e}")
+            order = None
+        if order is not None:
+            status = order_status(order)
+            if status == FILLED_STATUS:
+                return order
+            if status in DEAD_STATUSES:
+                raise EntryNotFilled(f"entry order {order_id} {status}: {order.get('text', '')}")
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll_secs)
+
+
+class ProtectiveOrders:
+    """Stop-loss and target SELLs resting at the exchange for the open position.
+
+    The legs are one-cancels-other: a background thread reconciles them against the order
+    book every reconcile_secs, cancels the survivor when one fills and reports the exit
+    through on_filled(reason, price). release() takes both legs down before the bot sells
+    on its own signal, and tells the caller if the exchange already closed the position.
+    on_entry_failed() runs if an entry the legs were still waiting on is cancelled or rejected.
+    """
+
+    def __init__(self, get_obj, symbol, token, exchange, quantity, on_filled, on_entry_failed=None,
+                 reconcile_secs=RECONCILE_SECS):
+        self.get_obj = get_obj
+        self.symbol = symbol
+        self.token = str(token)
+        self.exchange = exchange
+        self.quantity = quantity
+        self.on_filled = on_filled
+        self.on_entry_failed = on_entry_failed
+        self.reconcile_secs = reconcile_secs
+        self.lock = threading.RLock()
+        self.orders = {}         # 'stop' / 'target' -> order id
+        self.levels = {}         # 'stop' / 'target' -> price, kept so release() can be undone
+        self.pending_entry = None  # (order id, stop %, target %, price) of an entry not yet seen filled
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # ---- LEGS ----
+    def _params(self, leg, price):
+        params = {
+            "tradingsymbol": self.symbol,
+            "symboltoken": self.token,
+            "transactiontype": "SELL",
+            "exchange": self.exchange,
+            "producttype": "MIS",
+            "duration": "DAY",
+            "quantity": self.quantity,
+        }
+        if leg == 'stop':
+            params.update(variety="STOPLOSS", ordertype="STOPLOSS_MARKET", triggerprice=price, price=0)
+        else:
+            params.update(variety="NORMAL", ordertype="LIMIT", price=price)
+        return params
+
+    def _fill_of(self, order):
+        """(average price, filled quantity) of a complete entry order"""
+        price = float(order.get('averageprice') or 0) or None
+        quantity = int(float(order.get('filledshares') or 0)) or int(float(order.get('quantity') or self.quantity))
+        return price, quantity
+
+    def _place_legs(self, obj):
+        for leg, price in self.levels.items():
+            try:
+                order_id = scheduler.call('placeOrder', obj.placeOrder, self._params(leg, price))
+                self.orders[leg] = str(order_id)
+                logging.info(f"Protective {leg} placed at exchange: SELL {self.quantity} {self.symbol} @ {price:.2f} | ID: {order_id}")
+            except Exception as e:
+                logging.error(f"Could not place protective {leg} for {self.symbol}: {e} - bot-side exits only")
+
+    def attach(self, stop_pct, target_pct, entry_order_id=None, entry_price=None):
+        """Place the stop and target legs once the entry has filled; returns the entry price used.
+
+        With entry_order_id the legs wait for that order to complete and are sized to its
+        filled quantity; EntryNotFilled is raised if the broker kills it. An entry still
+        working after ENTRY_FILL_TIMEOUT_SECS is left to the reconcile thread, which arms
+        the legs when it fills. Without an order id (a restored position) entry_price, or
+        failing that the LTP, is used.
+        """
+        obj = self.get_obj()
+        quantity = self.quantity
+        if entry_order_id is not None:
+            order = wait_for_fill(obj, entry_order_id)
+            if order is None:
+                with self.lock:
+                    self.pending_entry = (str(entry_order_id), stop_pct, target_pct, entry_price)
+                logging.error(f"Entry {entry_order_id} for {self.symbol} not filled after {ENTRY_FILL_TIMEOUT_SECS:.0f}s; "
+                              f"protective orders wait for the fill")
+                return None
+            filled_price, quantity = self._fill_of(order)
+            entry_price = filled_price or entry_price
+        if entry_price is None:
+            entry_price = fetch_ltp(obj, [{'symbol': self.symbol, 'token': self.token}], self.exchange).get(self.token)
+        if entry_price is None:
+            logging.error(f"No entry price for {self.symbol}; protective orders not placed")
+            return None
+        self._arm(obj, entry_price, quantity, stop_pct, target_pct)
+        return entry_price
+
+    def _arm(self, obj, entry, quantity, stop_pct, target_pct):
+        with self.lock:
+            self.pending_entry = None
+            self.quantity = quantity
+            self.levels = {'stop': round_to_tick(entry * (1 - stop_pct / 100)),
+                           'target': round_to_tick(entry * (1 + target_pct / 100))}
+            self._place_legs(obj)
+        logging.info(f"🛡️ Exchange stop {self.levels['stop']:.2f} / target {self.levels['target']:.2f} "
+                     f"for {quantity} {self.symbol} filled at {entry:.2f}")
+
+    def _check_pending_entry(self, obj, book):
+        """Arm the legs for an entry that filled after attach() stopped waiting"""
+        order_id, stop_pct, target_pct, entry_price = self.pending_entry
+        order = book.get(order_id)
+        if order is None:
+            return
+        status = order_status(order)
+        if status == FILLED_STATUS:
+            filled_price, quantity = self._fill_of(order)
+            self._arm(obj, filled_price or entry_price, quantity, stop_pct, target_pct)
+        elif status in DEAD_STATUSES:
+            self.pending_entry = None
+            logging.error(f"Entry {order_id} for {self.symbol} was {status} at the exchange: {order.get('text', '')}")
+            if self.on_entry_failed is not None:
+                self.on_entry_failed()
+
+    def rearm(self):
+        """Put the last levels back after a release whose SELL did not go through"""
+        with self.lock:
+            if self.levels and not self.orders:
+                self._place_legs(self.get_obj())
+
+    def _cancel(self, obj, legs):
+        for leg in legs:
+            try:
+                variety = "STOPLOSS" if leg == 'stop' else "NORMAL"
+                scheduler.call('cancelOrder', obj.cancelOrder, self.orders[leg], variety)
+            except Exception as e:
+                logging.warning(f"Cancel of protective {leg} {self.orders[leg]} failed: {e}")
+
+    def _filled_leg(self, book):
+        for leg, order_id in self.orders.items():
+            order = book.get(order_id)
+            if order and order_status(order) == FILLED_STATUS:
+                price = float(order.get('averageprice') or 0) or self.levels.get(leg)
+                return leg, price
+        return None
+
+    def release(self):
+        """Cancel both legs before a bot-side exit; (reason, price) if the exchange already sold.
+
+        Raises LegsUnconfirmed, keeping the legs on record, when the order book cannot be
+        read: the caller must not sell, and the next reconcile pass settles the position.
+        """
+        with self.lock:
+            if self.pending_entry is not None:
+                # Selling before the entry is seen filled could leave a short if it never fills
+                raise LegsUnconfirmed(f"entry {self.pending_entry[0]} of {self.symbol} not confirmed filled - SELL withheld")
+            if not self.orders:
+                return None
+            obj = self.get_obj()
+            self._cancel(obj, list(self.orders))
+            book = None
+            for attempt in range(2):
+                try:
+                    book = order_book(obj)
+                    break
+                except Exception as e:
+                    logging.warning(f"Could not confirm protective legs after cancel (attempt {attempt + 1}): {e}")
+                    time.sleep(1)
+            if book is None:
+                # A leg may have filled; selling now could open a short
+                raise LegsUnconfirmed(f"protective legs of {self.symbol} unconfirmed after cancel - SELL withheld")
+            filled = self._filled_leg(book)
+            self.orders = {}
+            if filled is not None:
+                self.levels = {}
+        if filled is None:
+            return None
+        leg, price = filled
+        return LEG_REASONS[leg], price
+
+    # ---- RECONCILIATION ----
+    def reconcile(self):
+        """One order-book pass: handle a filled leg, drop legs the exchange cancelled or rejected"""
+        with self.lock:
+            if not self.orders and self.pending_entry is None:
+                return None
+            obj = self.get_obj()
+            book = order_book(obj)
+            if self.pending_entry is not None:
+                self._check_pending_entry(obj, book)
+                return None
+            filled = self._filled_leg(book)
+            if filled is not None:
+                leg, price = filled
+                self._cancel(obj, [other for other in self.orders if other != leg])
+                self.orders = {}
+                self.levels = {}
+            else:
+                for leg, order_id in list(self.orders.items()):
+                    order = book.get(order_id)
+                    if order and order_status(order) in DEAD_STATUSES:
+                        logging.warning(f"Protective {leg} {order_id} is {order_status(order)} at the exchange: "
+                                        f"{order.get('text', '')} - bot-side exits only")
+                        del self.orders[leg]
+                return None
+        logging.info(f"{LEG_REASONS[leg]} filled for {self.symbol} at {price:.2f}")
+        self.on_filled(LEG_REASONS[leg], price)
+        return leg
+
+    def _run(self):
+        while not self.stop_event.wait(self.reconcile_secs):
+            try:
+                self.reconcile()
+            except Exception as e:
+                logging.warning(f"Protective order reconcile failed: {e}")
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="protective-orders", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.reconcile_secs + 1)
@@ -0,0 +1,85 @@
+import datetime
+from collections import deque
+import pandas as pd
+
+BASE_INTERVAL = datetime.timedelta(minutes=5)
+SESSION_OPEN = datetime.time(9, 15)
+SESSION_CLOSE = datetime.time(15, 30)
+DEFAULT_TIMEFRAMES = (10, 15, 30, 60, 'D')
+BAR_FIELDS = ['end', 'open', 'high', 'low', 'close', 'volume']
+
+
+class BarResampler:
+    """Builds 10/15/30/60-minute and daily bars incrementally from closed 5-minute bars.
+
+    Intraday buckets are anchored at the 9:15 session open, like the broker's own
+    candles, so the last hourly bar of a session is the short 15:15-15:30 bar.
+    Each update costs O(number of timeframes); nothing is re-aggregated or re-fetched.
+    """
+
+    def __init__(self, timeframes=DEFAULT_TIMEFRAMES, max_bars=500):
+        self.timeframes = tuple(timeframes)
+        self.bars = {tf: deque(maxlen=max_bars) for tf in self.timeframes}
+        self.partial = {tf: None for tf in self.timeframes}
+        self.last_ts = None
+
+    def _bucket(self, ts, tf):
+        """(start, end) of the bucket containing the 5-minute bar starting at ts"""
+        session_open = ts.replace(hour=SESSION_OPEN.hour, minute=SESSION_OPEN.minute, second=0, microsecond=0)
+        session_close = ts.replace(hour=SESSION_CLOSE.hour, minute=SESSION_CLOSE.minute, second=0, microsecond=0)
+        if tf == 'D':
+            return session_open, session_close
+        width = datetime.timedelta(minutes=tf)
+        start = session_open + ((ts - session_open) // width) * width
+        return start, min(start + width, session_close)
+
+    def update(self, ts, open_, high, low, close, volume):
+        """Fold one closed 5-minute bar into every timeframe"""
+        if self.last_ts is not None and ts <= self.last_ts:
+            return
+        for tf in self.timeframes:
+            start, end = self._bucket(ts, tf)
+            bar = self.partial[tf]
+            if bar is not None and bar[0] != start:
+                # A gap (missing candles) closed the previous bucket early
+                self.bars[tf].append(tuple(bar))
+                bar = None
+            if bar is None:
+                bar = [start, end, open_, high, low, close, volume]
+            else:
+                bar[3] = max(bar[3], high)
+                bar[4] = min(bar[4], low)
+                bar[5] = close
+                bar[6] += volume
+            if ts + BASE_INTERVAL >= end:
+                self.bars[tf].append(tuple(bar))
+                bar = None
+            self.partial[tf] = bar
+        self.last_ts = ts
+
+    def update_from_frame(self, df):
+        """Feed the closed 5-minute bars of df that are newer than the last one seen"""
+        if self.last_ts is not None:
+            df = df[df.index > self.last_ts]
+        for row in df.itertuples():
+            self.update(row.Index, row.open, row.high, row.low, row.close, row.volume)
+
+    def frame(self, tf, include_partial=False):
+        """Completed bars of one timeframe as an OHLCV frame indexed by bar start"""
+        rows = list(self.bars[tf])
+        if include_partial and self.partial[tf] is not None:
+            rows.append(tuple(self.partial[tf]))
+        if not rows:
+            return pd.DataFrame(columns=BAR_FIELDS)
+        df = pd.DataFrame([r[1:] for r in rows], columns=BAR_FIELDS,
+                          index=pd.DatetimeIndex([r[0] for r in rows], name='timestamp'))
+        return df
+
+
+def align_to_base(htf_series, htf_end, base_index):
+    """Forward-fill a higher-timeframe series onto 5-minute bars, visible only once its bar has closed"""
+    # A completed bar is first usable on the 5-minute bar that closes it
+    available_at = pd.DatetimeIndex(htf_end) - BASE_INTERVAL
+    series = pd.Series(htf_series.to_numpy(), index=available_at)
+    series = series[~series.index.duplicated(keep='last')]
+    return series.reindex(base_index, method='ffill')
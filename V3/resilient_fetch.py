@@ -0,0 +1,186 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from api_scheduler import scheduler
+
+# ---- FETCH CONFIG ----
+FETCH_DEADLINE_SECS = float(os.getenv("FETCH_DEADLINE_SECS", "8"))   # per attempt, hedge included
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+FETCH_BACKOFF_SECS = 0.5         # base of the jittered exponential backoff between attempts
+HEDGE_PERCENTILE = 0.95          # a second request goes out once the first outlives this latency
+HEDGE_MIN_SAMPLES = 20           # no hedging until the latency estimate means something
+LATENCY_WINDOW = 200
+CACHE_ENTRIES = 256              # last good responses kept for failover
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))           # consecutive failed attempts
+CIRCUIT_RESET_SECS = float(os.getenv("CIRCUIT_RESET_SECS", "60"))    # open time before one probe is let through
+
+
+class CircuitBreaker:
+    """closed -> open after `failures` failures in a row; after reset_secs one probe (half-open) decides"""
+
+    def __init__(self, failures=CIRCUIT_FAILURES, reset_secs=CIRCUIT_RESET_SECS):
+        self.failures = failures
+        self.reset_secs = reset_secs
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+
+    def allow(self):
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_secs:
+                self.state = "half-open"
+                logging.info("Circuit half-open: probing the broker")
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != "closed":
+                logging.info("✅ Circuit closed: broker responding again")
+            self.state = "closed"
+            self.consecutive = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive += 1
+            if self.state == "half-open" or (self.state == "closed" and self.consecutive >= self.failures):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                logging.warning(f"⚡ Circuit open after {self.consecutive} failures; serving cached data for {self.reset_secs:.0f}s")
+
+
+class ResilientFetcher:
+    """Deadlines, jittered retries, p95 hedging and a circuit breaker around one kind of request.
+
+    fetch(key, fn, *args) returns fn's result, or the last good result for key when the
+    broker keeps failing (None if there is none). fn should raise on a bad response.
+    """
+
+    def __init__(self, deadline=FETCH_DEADLINE_SECS, retries=FETCH_RETRIES, max_workers=8):
+        self.deadline = deadline
+        self.retries = retries
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "retries": 0, "timeouts": 0, "failovers": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def hedge_after(self):
+        """Observed p95 latency, or None while there are too few samples"""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE))]
+
+    def _timed(self, fn, args, hedge):
+        start = time.monotonic()
+        result = fn(*args)
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        return result, hedge
+
+    def _attempt(self, fn, args):
+        """One logical request: the primary, plus a hedge if it outlives the observed p95"""
+        start = time.monotonic()
+        deadline = start + self.deadline
+        hedge_at = self.hedge_after()
+        futures = {self.pool.submit(self._timed, fn, args, False)}
+        self._count("requests")
+        hedged = False
+        error = None
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if not hedged and hedge_at is not None:
+                timeout = min(timeout, max(0.0, start + hedge_at - now))
+            done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result, was_hedge = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if was_hedge:
+                    self._count("hedge_wins")
+                return result
+            if not done and not hedged and hedge_at is not None and time.monotonic() < deadline:
+                # Late responses from the loser are simply dropped
+                futures.add(self.pool.submit(self._timed, fn, args, True))
+                hedged = True
+                self._count("hedges")
+        if futures:
+            self._count("timeouts")
+            raise TimeoutError(f"no response within {self.deadline:.1f}s")
+        raise error
+
+    def _failover(self, key, reason):
+        self._count("failovers")
+        cached = self.cache.get(key)
+        logging.warning(f"Fetch failed ({reason}); {'serving cached data' if cached is not None else 'no cached data'} for {key}")
+        return cached
+
+    def fetch(self, key, fn, *args):
+        if not self.breaker.allow():
+            return self._failover(key, "circuit open")
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(FETCH_BACKOFF_SECS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                result = self._attempt(fn, args)
+            except Exception as e:
+                error = e
+                self.breaker.record_failure()
+                if not self.breaker.allow():
+                    break
+                continue
+            self.breaker.record_success()
+            self.cache.pop(key, None)
+            self.cache[key] = result
+            if len(self.cache) > CACHE_ENTRIES:
+                self.cache.pop(next(iter(self.cache)))
+            return result
+        return self._failover(key, error)
+
+    def log_metrics(self):
+        with self.lock:
+            stats = dict(self.stats)
+        p95 = self.hedge_after()
+        logging.info(
+            f"Fetch layer | {stats['requests']} requests, p95 {f'{p95:.2f}s' if p95 is not None else 'n/a'}, "
+            f"hedges {stats['hedges']} (won {stats['hedge_wins']}), retries {stats['retries']}, "
+            f"timeouts {stats['timeouts']}, failovers {stats['failovers']}, circuit {self.breaker.state}"
+        )
+
+
+def _candle_request(obj, params):
+    response = scheduler.call('getCandleData', obj.getCandleData, params)
+    if not response or response.get('data') is None:
+        raise RuntimeError(response.get('message') if response else "empty response")
+    return response['data']
+
+
+# Shared by every candle fetch in the process so latency samples and the breaker are pooled
+candle_fetcher = ResilientFetcher()
+
+
+def fetch_candle_rows(obj, params):
+    """getCandleData rows for params, the last good rows for the same range on failure, else None"""
+    key = (params['symboltoken'], params['interval'], params['fromdate'], params['todate'])
+    return candle_fetcher.fetch(key, _candle_request, obj, params)
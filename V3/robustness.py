@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from analytics import load_trade_log, daily_pnl_array, TRADING_DAYS_PER_YEAR
+
+# ---- CONFIG ----
+N_RESAMPLES = 20000
+BATCH_SIZE = 500        # resamples held in memory at once per worker
+BLOCK_LENGTH = 5        # days per block for the daily-returns block bootstrap
+CONFIDENCE = 95
+SEED = 42
+
+
+def _path_stats(paths, annualize=False):
+    """Total P&L, max drawdown and Sharpe of each row of a (resamples x steps) P&L matrix"""
+    equity = np.cumsum(paths, axis=1)
+    peaks = np.maximum.accumulate(np.maximum(equity, 0.0), axis=1)
+    max_dd = (equity - peaks).min(axis=1)
+    std = paths.std(axis=1, ddof=1)
+    sharpe = np.divide(paths.mean(axis=1), std, out=np.zeros(len(paths)), where=std > 0)
+    if annualize:
+        sharpe *= np.sqrt(TRADING_DAYS_PER_YEAR)
+    return np.column_stack((equity[:, -1], max_dd, sharpe))
+
+
+def _run_chunk(method, values, n_resamples, seed, block_length):
+    """Worker: run n_resamples of one method in memory-bounded batches"""
+    rng = np.random.default_rng(seed)
+    n = len(values)
+    out = []
+    for start in range(0, n_resamples, BATCH_SIZE):
+        size = min(BATCH_SIZE, n_resamples - start)
+        if method == 'bootstrap':
+            paths = values[rng.integers(0, n, size=(size, n))]
+        elif method == 'shuffle':
+            paths = rng.permuted(np.broadcast_to(values, (size, n)), axis=1)
+        elif method == 'block':
+            # Circular block bootstrap keeps short-range autocorrelation of daily P&L
+            n_blocks = -(-n // block_length)
+            starts = rng.integers(0, n, size=(size, n_blocks, 1))
+            idx = (starts + np.arange(block_length)) % n
+            paths = values[idx.reshape(size, -1)[:, :n]]
+        else:
+            raise ValueError(f"Unknown resampling method: {method}")
+        out.append(_path_stats(paths, annualize=(method == 'block')))
+    return np.concatenate(out)
+
+
+def resample(method, values, n_resamples=N_RESAMPLES, workers=None, seed=SEED, block_length=BLOCK_LENGTH):
+    """Run n_resamples of method across a process pool; returns (n_resamples x 3) stats"""
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    workers = workers or os.cpu_count() or 1
+    chunks = [len(c) for c in np.array_split(np.arange(n_resamples), workers) if len(c)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    if len(chunks) == 1:
+        return _run_chunk(method, values, chunks[0], seeds[0], block_length)
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        results = pool.map(_run_chunk, [method] * len(chunks), [values] * len(chunks),
+                           chunks, seeds, [block_length] * len(chunks))
+        return np.concatenate(list(results))
+
+
+def confidence_table(stats, observed, confidence=CONFIDENCE):
+    """Percentile confidence intervals plus where the observed value falls"""
+    tail = (100 - confidence) / 2
+    low, median, high = np.percentile(stats, [tail, 50, 100 - tail], axis=0)
+    return pd.DataFrame({
+        'observed': observed,
+        f'ci_low_{confidence}': low,
+        'median': median,
+        f'ci_high_{confidence}': high,
+        'p_le_zero': (stats <= 0).mean(axis=0),
+        'observed_pctile': (stats <= observed).mean(axis=0) * 100,
+    }, index=['total_pnl', 'max_drawdown', 'sharpe']).round(4)
+
+
+def run_robustness(trades, n_resamples=N_RESAMPLES, workers=None, seed=SEED):
+    """Bootstrap, trade-order shuffle and daily block bootstrap confidence tables"""
+    pnl = trades['pnl']
+    daily = daily_pnl_array(trades['exit_time'], pnl)
+    observed_trades = _path_stats(pnl[None, :])[0]
+    observed_daily = _path_stats(daily[None, :], annualize=True)[0]
+
+    return {
+        'trade_bootstrap': confidence_table(resample('bootstrap', pnl, n_resamples, workers, seed), observed_trades),
+        'trade_shuffle': confidence_table(resample('shuffle', pnl, n_resamples, workers, seed + 1), observed_trades),
+        'daily_block_bootstrap': confidence_table(resample('block', daily, n_resamples, workers, seed + 2), observed_daily),
+    }
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "backtest_results_20200101_20250101.csv"
+    n_resamples = int(sys.argv[2]) if len(sys.argv) > 2 else N_RESAMPLES
+    trades = load_trade_log(path)
+
+    start = time.perf_counter()
+    tables = run_robustness(trades, n_resamples)
+    print(f"🎲 {n_resamples} resamples x 3 methods on {len(trades['pnl'])} trades "
+          f"in {time.perf_counter() - start:.1f}s")
+    for name, table in tables.items():
+        print(f"\n  {name.upper()}:")
+        print(table.to_string())
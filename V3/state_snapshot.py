@@ -0,0 +1,64 @@
+import os
+import pickle
+import datetime
+import logging
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_VERSION = 1
+CANDLE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def candles_to_arrays(df):
+    """Pack an OHLCV frame into an int64 timestamp array and a float64 value matrix"""
+    if df is None or df.empty:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(CANDLE_COLUMNS)), dtype=np.float64)
+    timestamps = df.index.tz_convert('UTC').asi8 if df.index.tz is not None else df.index.asi8
+    values = df[CANDLE_COLUMNS].to_numpy(dtype=np.float64)
+    return np.ascontiguousarray(timestamps, dtype=np.int64), np.ascontiguousarray(values)
+
+
+def arrays_to_candles(timestamps, values):
+    """Rebuild the IST-indexed OHLCV frame written by candles_to_arrays"""
+    index = pd.to_datetime(timestamps, utc=True).tz_convert('Asia/Kolkata')
+    index.name = 'timestamp'
+    return pd.DataFrame(values, index=index, columns=CANDLE_COLUMNS)
+
+
+def save_snapshot(path, state, candles):
+    """Atomically write bot state and the recent candle buffer to a binary file"""
+    timestamps, values = candles_to_arrays(candles)
+    payload = {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': datetime.datetime.now(datetime.timezone.utc),
+        'state': state,
+        'timestamps': timestamps,
+        'values': values,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    # os.replace is atomic, so a crash mid-write leaves the previous snapshot intact
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    """Return (state, candles) from a snapshot file, or (None, empty frame) if unusable"""
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except FileNotFoundError:
+        return None, pd.DataFrame()
+    except Exception as e:
+        logging.error(f"Could not read snapshot {path}: {e}")
+        return None, pd.DataFrame()
+
+    if payload.get('version') != SNAPSHOT_VERSION:
+        logging.warning(f"Ignoring snapshot {path} with version {payload.get('version')}")
+        return None, pd.DataFrame()
+
+    candles = arrays_to_candles(payload['timestamps'], payload['values'])
+    logging.info(f"Loaded snapshot saved at {payload['saved_at']} with {len(candles)} candles")
+    return payload['state'], candles
@@ -0,0 +1,488 @@
+import ast
+import sys
+import json
+import datetime
+from collections import deque
+import numpy as np
+import pandas as pd
+import indicators
+
+BAR_MINUTES = 5
+
+# ---- STRATEGY DEFINITIONS ----
+# A strategy is plain data: indicators, an entry condition, ordered exit rules and
+# time/trade limits. Conditions are Python-like expressions over bar columns,
+# indicators and params; exit rules may also use profit_pct. Times refer to the
+# moment a bar closes, which is when the live loop acts on it.
+EMA_RSI_STRATEGY = {
+    'name': 'ema_rsi',
+    'indicators': {
+        'ema5': 'ema(close, 5)',
+        'ema20': 'ema(close, 20)',
+        'ema50': 'ema(close, 50)',
+        'rsi14': 'rsi(close, 14)',
+    },
+    'entry': '(20 < rsi14 <= 30 or cross_above(close, ema20)) and ema5 > ema20 and close > ema50',
+    'target_pct': 1.8,
+    'stop_pct': 0.5,
+    'exits': [
+        ['EMA Cross Down', 'cross_below(ema5, ema20) and profit_pct > 0'],
+        ['RSI 70+', 'rsi14 >= rsi_exit'],
+    ],
+    'params': {'rsi_exit': 70},
+    'entry_until': '14:30',
+    'eod_exit': '15:00',
+    'max_daily_trades': 2,
+}
+
+
+def load_strategy(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+# ---- EXPRESSIONS ----
+_BINOPS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide,
+    ast.BitAnd: np.logical_and, ast.BitOr: np.logical_or,
+}
+_CMPOPS = {
+    ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less,
+    ast.LtE: np.less_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+
+
+def _compile(node, params, allow_prev=True):
+    """Turn an expression AST into f(cur, prev); cur/prev map names to scalars or arrays.
+
+    The same closure serves the vectorized backtest (arrays) and the live loop (scalars).
+    """
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, params, allow_prev)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        value = node.value
+        return lambda cur, prev: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in params:
+            value = params[name]
+            return lambda cur, prev: value
+        return lambda cur, prev: cur[name]
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v, params, allow_prev) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+        def bool_op(cur, prev):
+            result = parts[0](cur, prev)
+            for part in parts[1:]:
+                result = combine(result, part(cur, prev))
+            return result
+        return bool_op
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub, ast.Invert)):
+        operand = _compile(node.operand, params, allow_prev)
+        if isinstance(node.op, ast.USub):
+            return lambda cur, prev: np.negative(operand(cur, prev))
+        return lambda cur, prev: np.logical_not(operand(cur, prev))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+        op = _BINOPS[type(node.op)]
+        left, right = _compile(node.left, params, allow_prev), _compile(node.right, params, allow_prev)
+        return lambda cur, prev: op(left(cur, prev), right(cur, prev))
+    if isinstance(node, ast.Compare):
+        # Chained comparisons (20 < rsi14 <= 30) are and-ed pairwise, as in Python
+        terms = [_compile(n, params, allow_prev) for n in [node.left] + node.comparators]
+        ops = [_CMPOPS[type(op)] for op in node.ops]
+
+        def compare(cur, prev):
+            values = [t(cur, prev) for t in terms]
+            result = ops[0](values[0], values[1])
+            for i in range(1, len(ops)):
+                result = np.logical_and(result, ops[i](values[i], values[i + 1]))
+            return result
+        return compare
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return _compile_call(node.func.id, node.args, params, allow_prev)
+    raise ValueError(f"Unsupported expression: {ast.dump(node)}")
+
+
+def _compile_call(name, args, params, allow_prev):
+    if name in ('prev', 'cross_above', 'cross_below') and not allow_prev:
+        raise ValueError(f"{name}() cannot be nested inside prev()")
+    if name == 'prev':
+        inner = _compile(args[0], params, allow_prev=False)
+        return lambda cur, prev: inner(prev, None)
+    if name in ('cross_above', 'cross_below'):
+        a = _compile(args[0], params, allow_prev=False)
+        b = _compile(args[1], params, allow_prev=False)
+        now_op, then_op = (np.greater, np.less_equal) if name == 'cross_above' else (np.less, np.greater_equal)
+        return lambda cur, prev: np.logical_and(now_op(a(cur, prev), b(cur, prev)),
+                                                then_op(a(prev, None), b(prev, None)))
+    if name == 'abs':
+        inner = _compile(args[0], params, allow_prev)
+        return lambda cur, prev: np.abs(inner(cur, prev))
+    raise ValueError(f"Unknown function {name}()")
+
+
+def compile_expression(expr, params=None):
+    return _compile(ast.parse(expr, mode='eval'), params or {})
+
+
+# ---- INDICATORS ----
+def _parse_indicator(expr):
+    """'ema(close, 5)' -> ('ema', 'close', 5)"""
+    call = ast.parse(expr, mode='eval').body
+    if not (isinstance(call, ast.Call) and call.func.id in INDICATORS and len(call.args) == 2):
+        raise ValueError(f"Bad indicator definition: {expr}")
+    return call.func.id, call.args[0].id, int(call.args[1].value)
+
+
+class StreamingEMA:
+    """EMA updated one value at a time; same recursion and warm-up as ta's EMAIndicator"""
+
+    def __init__(self, window):
+        self.window = window
+        self.alpha = 2.0 / (window + 1)
+        self.value = None
+        self.count = 0
+
+    def update(self, x):
+        self.value = x if self.value is None else self.alpha * x + (1 - self.alpha) * self.value
+        self.count += 1
+        return self.value if self.count >= self.window else float('nan')
+
+
+class StreamingSMA:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+
+    def update(self, x):
+        self.values.append(x)
+        self.total += x
+        if len(self.values) > self.window:
+            self.total -= self.values.popleft()
+        return self.total / self.window if len(self.values) == self.window else float('nan')
+
+
+class StreamingRSI:
+    """Wilder RSI updated one value at a time; same smoothing and warm-up as ta's RSIIndicator"""
+
+    def __init__(self, window):
+        self.window = window
+        self.alpha = 1.0 / window
+        self.last = None
+        self.up = None
+        self.down = None
+        self.count = 0
+
+    def update(self, x):
+        diff = 0.0 if self.last is None else x - self.last
+        self.last = x
+        up, down = max(diff, 0.0), max(-diff, 0.0)
+        if self.up is None:
+            self.up, self.down = up, down
+        else:
+            self.up = self.alpha * up + (1 - self.alpha) * self.up
+            self.down = self.alpha * down + (1 - self.alpha) * self.down
+        self.count += 1
+        if self.count < self.window:
+            return float('nan')
+        if self.down == 0:
+            return 100.0
+        return 100 - 100 / (1 + self.up / self.down)
+
+
+INDICATORS = {
+    'ema': (indicators.ema, StreamingEMA),
+    'sma': (indicators.sma, StreamingSMA),
+    'rsi': (indicators.rsi, StreamingRSI),
+}
+
+
+# ---- COMPILED STRATEGY ----
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class _Shifted:
+    """Lazy one-bar lag of a column mapping (NaN on the first bar)"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.cache = {}
+
+    def __getitem__(self, name):
+        if name not in self.cache:
+            values = np.asarray(self.columns[name], dtype=np.float64)
+            self.cache[name] = np.concatenate(([np.nan], values[:-1]))
+        return self.cache[name]
+
+
+class _Env:
+    """Column mapping with a few extra names (profit_pct) layered on top"""
+
+    def __init__(self, base, **extra):
+        self.base = base
+        self.extra = extra
+
+    def __getitem__(self, name):
+        if name in self.extra:
+            return self.extra[name]
+        return self.base[name]
+
+
+class Strategy:
+    """A strategy definition compiled once into its entry and exit conditions"""
+
+    def __init__(self, definition, **overrides):
+        # Overrides replace top-level keys (target_pct, ...) or, failing that, params
+        params = {**definition.get('params', {}), **{k: v for k, v in overrides.items() if k not in definition}}
+        definition = {**definition, **{k: v for k, v in overrides.items() if k in definition}, 'params': params}
+        self.definition = definition
+        self.name = definition.get('name', 'strategy')
+        self.params = params
+        self.indicators = {name: _parse_indicator(expr) for name, expr in definition.get('indicators', {}).items()}
+        self.target_pct = definition.get('target_pct')
+        self.stop_pct = definition.get('stop_pct')
+        self.entry = compile_expression(definition['entry'], self.params)
+        self.exits = [(reason, compile_expression(expr, self.params)) for reason, expr in definition.get('exits', [])]
+        self.entry_until = _minutes(definition.get('entry_until', '15:30'))
+        self.eod_exit = _minutes(definition.get('eod_exit', '15:30'))
+        self.max_daily_trades = definition.get('max_daily_trades', 10**9)
+
+    # ---- per-bar rules (live loop) ----
+    def entry_signal(self, row, prev_row):
+        if prev_row is None:
+            return False
+        return bool(self.entry(row, prev_row))
+
+    def exit_reasons(self, row, prev_row, entry_price, decision_time):
+        """First matching exit reason (as a one-element list) and the position P&L %"""
+        profit_pct = (row['close'] - entry_price) / entry_price * 100
+        if self.target_pct is not None and profit_pct >= self.target_pct:
+            return [f"{self.target_pct}% Profit Target"], profit_pct
+        if self.stop_pct is not None and profit_pct <= -self.stop_pct:
+            return ["Stop Loss"], profit_pct
+        if prev_row is not None:
+            cur, prev = _Env(row, profit_pct=profit_pct), _Env(prev_row, profit_pct=np.nan)
+            for reason, rule in self.exits:
+                if bool(rule(cur, prev)):
+                    return [reason], profit_pct
+        if decision_time.hour * 60 + decision_time.minute >= self.eod_exit:
+            return ["EOD Exit"], profit_pct
+        return [], profit_pct
+
+    # ---- vectorized (backtests and sweeps) ----
+    def add_indicators(self, df):
+        df = df.copy()
+        for name, (kind, source, window) in self.indicators.items():
+            df[name] = INDICATORS[kind][0](df[source].to_numpy(dtype=float), window)
+        return df
+
+    def entry_mask(self, columns):
+        mask = np.asarray(self.entry(columns, _Shifted(columns)), dtype=bool)
+        mask[0] = False
+        return mask
+
+    def backtest(self, df, qty=1, brokerage=0.0):
+        """Trade log (timestamp, action, price, pnl, reason) for an IST-indexed OHLCV frame.
+
+        Entries are found for every bar at once; each trade's exit is then searched
+        vectorized over the rest of its session only, since exits depend on the entry price.
+        """
+        df = self.add_indicators(df)
+        columns = {c: df[c].to_numpy(dtype=np.float64) for c in df.columns}
+        shifted = _Shifted(columns)
+        close = columns['close']
+
+        index = df.index
+        minute, day, day_end = _session_arrays(index)
+
+        entry_ok = self.entry_mask(columns) & (minute < self.entry_until)
+        candidates = np.flatnonzero(entry_ok)
+
+        rows = []
+        trades_today, current_day = 0, None
+        i = 0
+        while True:
+            k = int(np.searchsorted(candidates, i))
+            if k == len(candidates):
+                break
+            entry = candidates[k]
+            if day[entry] != current_day:
+                current_day, trades_today = day[entry], 0
+            if trades_today >= self.max_daily_trades:
+                i = day_end[entry] + 1
+                continue
+            trades_today += 1
+            entry_price = close[entry]
+
+            lo, hi = entry + 1, day_end[entry] + 1
+            exit_idx, reason = day_end[entry], "Market Close"
+            if lo < hi:
+                sl = slice(lo, hi)
+                profit_pct = (close[sl] - entry_price) / entry_price * 100
+                cur = _Env(_SliceView(columns, sl), profit_pct=profit_pct)
+                prev = _Env(_SliceView(shifted, sl), profit_pct=np.nan)
+                checks = []
+                if self.target_pct is not None:
+                    checks.append((f"{self.target_pct}% Profit Target", profit_pct >= self.target_pct))
+                if self.stop_pct is not None:
+                    checks.append(("Stop Loss", profit_pct <= -self.stop_pct))
+                checks += [(r, np.broadcast_to(rule(cur, prev), profit_pct.shape)) for r, rule in self.exits]
+                checks.append(("EOD Exit", minute[sl] >= self.eod_exit))
+                hits = np.vstack([mask for _, mask in checks])
+                any_hit = hits.any(axis=0)
+                if any_hit.any():
+                    j = int(np.argmax(any_hit))
+                    exit_idx = lo + j
+                    reason = checks[int(np.argmax(hits[:, j]))][0]
+
+            pnl = (close[exit_idx] - entry_price) * qty - brokerage
+            rows.append((index[entry], 'BUY', entry_price, 0.0, ''))
+            rows.append((index[exit_idx], 'SELL', close[exit_idx], pnl, reason))
+            i = exit_idx + 1
+        return pd.DataFrame(rows, columns=['timestamp', 'action', 'price', 'pnl', 'reason'])
+
+    def exit_reason_names(self):
+        """Every reason a trade can close with, in the order exits are checked"""
+        reasons = []
+        if self.target_pct is not None:
+            reasons.append(f"{self.target_pct}% Profit Target")
+        if self.stop_pct is not None:
+            reasons.append("Stop Loss")
+        return reasons + [r for r, _ in self.exits] + ["EOD Exit", "Market Close"]
+
+    def candidate_trades(self, df, block=4096):
+        """Every entry the rules allow in an indicator-carrying frame (add_indicators), each with its exit.
+
+        Position and daily-trade limits are not applied, so a caller sharing capital across
+        symbols can pick from the candidates itself. Exits of a block of candidates are
+        searched together on an (entries x bars) gather of their sessions, with the same
+        check order as backtest. Returns arrays of entry and exit bar positions plus a
+        reason code indexing the 'reasons' list.
+        """
+        reasons = self.exit_reason_names()
+        if df.empty:
+            empty = np.array([], dtype=np.int64)
+            return {'entry': empty, 'exit': empty, 'reason': np.array([], dtype=np.int8), 'reasons': reasons}
+
+        columns = {c: df[c].to_numpy(dtype=np.float64) for c in df.columns}
+        shifted = _Shifted(columns)
+        close = columns['close']
+        minute, _, day_end = _session_arrays(df.index)
+        entries = np.flatnonzero(self.entry_mask(columns) & (minute < self.entry_until))
+        exits = day_end[entries].copy()
+        codes = np.full(len(entries), len(reasons) - 1, dtype=np.int8)
+        width = int((exits - entries).max()) if len(entries) else 0
+
+        for start in range(0, len(entries) if width else 0, block):
+            entry = entries[start:start + block]
+            idx = entry[:, None] + 1 + np.arange(width)
+            valid = idx <= day_end[entry][:, None]
+            idx = np.minimum(idx, len(close) - 1)
+            entry_price = close[entry][:, None]
+            profit_pct = (close[idx] - entry_price) / entry_price * 100
+            cur = _Env(_SliceView(columns, idx), profit_pct=profit_pct)
+            prev = _Env(_SliceView(shifted, idx), profit_pct=np.nan)
+            checks = []
+            if self.target_pct is not None:
+                checks.append(profit_pct >= self.target_pct)
+            if self.stop_pct is not None:
+                checks.append(profit_pct <= -self.stop_pct)
+            checks += [np.broadcast_to(rule(cur, prev), idx.shape) for _, rule in self.exits]
+            checks.append(minute[idx] >= self.eod_exit)
+            hits = np.stack(checks) & valid
+            any_hit = hits.any(axis=0)
+            found = any_hit.any(axis=1)
+            j = np.argmax(any_hit, axis=1)
+            code = np.argmax(hits[:, np.arange(len(entry)), j], axis=0)
+            exits[start:start + block][found] = entry[found] + 1 + j[found]
+            codes[start:start + block][found] = code[found]
+        return {'entry': entries, 'exit': exits, 'reason': codes, 'reasons': reasons}
+
+
+def _session_arrays(index):
+    """Decision minute of each bar, its session day and the position of its session's last bar"""
+    decision = index + pd.Timedelta(minutes=BAR_MINUTES)
+    minute = decision.hour.to_numpy() * 60 + decision.minute.to_numpy()
+    day = index.normalize().asi8
+    day_end = np.searchsorted(day, day, side='right') - 1   # last bar of each bar's session
+    return minute, day, day_end
+
+
+class _SliceView:
+    def __init__(self, columns, sl):
+        self.columns = columns
+        self.sl = sl
+
+    def __getitem__(self, name):
+        return self.columns[name][self.sl]
+
+
+class StreamingStrategy:
+    """Incremental evaluator: feed closed bars one at a time, get BUY/SELL decisions back.
+
+    Indicators are updated in O(1) per bar and the rules are the compiled ones the
+    vectorized backtest uses, so both paths trade the same definition identically.
+    """
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.states = {name: INDICATORS[kind][1](window) for name, (kind, _, window) in strategy.indicators.items()}
+        self.prev_row = None
+        self.in_position = False
+        self.entry_price = None
+        self.trades_today = 0
+        self.day = None
+
+    def update(self, ts, bar):
+        """Process one closed bar starting at ts; returns (action, price, reason) or None"""
+        row = dict(bar)
+        for name, (kind, source, window) in self.strategy.indicators.items():
+            row[name] = self.states[name].update(float(row[source]))
+        prev_row, self.prev_row = self.prev_row, row
+        if ts.date() != self.day:
+            self.day, self.trades_today = ts.date(), 0
+
+        decision_time = ts + datetime.timedelta(minutes=BAR_MINUTES)
+        if self.in_position:
+            reasons, _ = self.strategy.exit_reasons(row, prev_row, self.entry_price, decision_time)
+            if reasons:
+                self.in_position, self.entry_price = False, None
+                return ('SELL', row['close'], reasons[0])
+        elif (self.trades_today < self.strategy.max_daily_trades
+              and decision_time.hour * 60 + decision_time.minute < self.strategy.entry_until
+              and self.strategy.entry_signal(row, prev_row)):
+            self.in_position, self.entry_price = True, row['close']
+            self.trades_today += 1
+            return ('BUY', row['close'], '')
+        return None
+
+
+def compile_strategy(definition, **overrides):
+    return Strategy(definition, **overrides)
+
+
+if __name__ == "__main__":
+    # python strategy_dsl.py <token> <start YYYY-MM-DD> <end YYYY-MM-DD> [strategy.json]
+    from candle_store import CandleStore
+    from analytics import trades_from_frame, compute_metrics, print_report
+    from results_store import write_run
+    import hashlib
+
+    token = sys.argv[1]
+    start, end = (datetime.date.fromisoformat(d) for d in sys.argv[2:4])
+    definition = load_strategy(sys.argv[4]) if len(sys.argv) > 4 else EMA_RSI_STRATEGY
+    bars = CandleStore().load(token, start, end)
+    if bars.empty:
+        print(f"❌ No stored candles for token {token}")
+        sys.exit(1)
+    log = compile_strategy(definition).backtest(bars, qty=30, brokerage=20)
+    print_report(*compute_metrics(trades_from_frame(log)))
+    # Sweeps of the same token/range differ by definition, so its digest is part of the name
+    digest = hashlib.sha1(json.dumps(definition, sort_keys=True).encode()).hexdigest()[:8]
+    path = write_run(log, "backtest", f"{token}_{start:%Y%m%d}_{end:%Y%m%d}_{digest}",
+                     params=dict(definition, token=token, qty=30, brokerage=20), start=start, end=end)
+    print(f"💾 Trade log written to {path}")